@@ -34,7 +34,8 @@ import ast
 import pika
 import time
 import threading
-import copy
+import functools
+import signal
 from time import sleep
 
 # --------------------------------
@@ -51,6 +52,10 @@ except Exception as e:
     python_module = "/usr/bin/python3"
     log_level = "NORMAL"
 
+# 未ACKで受け取るメッセージの上限(0は無制限)、1プロセスあたりのコンシューマー数
+prefetch_count = int(os.environ.get('ACCEPT_PREFETCH_COUNT', 200))
+consumer_count = max(int(os.environ.get('ACCEPT_CONSUMER_COUNT', 1)), 1)
+
 # --------------------------------
 # パス追加
 # --------------------------------
@@ -66,25 +71,25 @@ from django.shortcuts import render, redirect
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from libs.backyardlibs.backyard_common import disconnect
+from django.db import transaction, connection as db_connection
+from django.db import IntegrityError, DataError
 from libs.commonlibs.oase_logger import OaseLogger
 logger = OaseLogger.get_instance() # ロガー初期化
 
 from web_app.models.models import User, EventsRequest, RuleType
-from web_app.serializers.events_request import EventsRequestSerializer
+from web_app.serializers.events_request import EventsRequestValidator
 from libs.commonlibs import define as defs
 from libs.commonlibs.rabbitmq import RabbitMQ
 
-from libs.webcommonlibs.events_request import EventsRequestCommon
+from libs.webcommonlibs.events_request import EventsRequestCommon, RuleTypeNameCache
 from libs.webcommonlibs.common import TimeConversion
 
 
 # MAX件数
 MAX_COUNT = 100
 
-THREAD_LOCK = threading.Lock()
-
-data_obj_list = []
+# 受付から登録までの最大待ち時間(秒)
+MAX_AGE = 0.1
 
 
 ################################################################
@@ -169,21 +174,21 @@ def make_evinfo_str(json_str):
 
 
 ################################################
-def data_list(body, user, rule_type_id_list, label_count_list):
+def data_list(body, user):
     """ 
     [メソッド概要]
-      DB登録するデータをリストにする。
+      DB登録するデータを作成する。
+      ルール種別情報はキャッシュから取得し、DB接続は使い回す。
+    [戻り値]
+      EventsRequest : 正常時は登録するデータ、異常時はFalse
     """
 
-    global data_obj_list
     now = datetime.datetime.now(pytz.timezone('UTC'))
     evinfo_length = 0
     ruletypeid = 0
     msg = ''
     event_dt = '----/--/-- --:--:--'
 
-    disconnect()
-
     try:
         # フォーマットのチェック
         try:
@@ -202,21 +207,9 @@ def data_list(body, user, rule_type_id_list, label_count_list):
         reqtypeid = json_str[EventsRequestCommon.KEY_REQTYPE]
         ruletablename = json_str[EventsRequestCommon.KEY_RULETYPE]
 
-        if True:
-            rule_type_id_list.update({ruletablename: 0})
-            label_count_list.update({ruletablename: 0})
-
-            rset = RuleType.objects.filter(rule_type_name=ruletablename).values(
-                'rule_type_id', 'rule_type_name', 'label_count')
-            for rs in rset:
-                rule_type_id_list.update(
-                    {rs['rule_type_name']: rs['rule_type_id']})
-                label_count_list.update(
-                    {rs['rule_type_name']: rs['label_count']})
-
-        if ruletablename in rule_type_id_list:
-            ruletypeid = rule_type_id_list[ruletablename]
-            evinfo_length = label_count_list[ruletablename]
+        ruletype_info = RuleTypeNameCache.get(ruletablename)
+        if ruletype_info:
+            ruletypeid, evinfo_length = ruletype_info
 
         # イベント情報のチェック
         check_evinfo_error(trace_id, json_str, ruletypeid, evinfo_length)
@@ -246,35 +239,18 @@ def data_list(body, user, rule_type_id_list, label_count_list):
         }
 
         # バリデーションチェック
-        oters = EventsRequestSerializer(data=json_data)
-        result_valid = oters.is_valid()
+        validated_data, errors = EventsRequestValidator.validate(json_data)
 
         # バリデーションエラー
-        if result_valid == False:
-            msg = '%s' % oters.errors
+        if errors:
+            msg = '%s' % errors
             logger.user_log('LOSM22003', trace_id, msg)
             return False
 
-        # 正常の場合はリスト登録
-        else:
-            data_object = EventsRequest(
-                trace_id=trace_id,
-                request_type_id=reqtypeid,
-                rule_type_id=ruletypeid,
-                request_reception_time=now,
-                request_user='OASE Web User',
-                request_server='OASE Web',
-                event_to_time=event_dt,
-                event_info=evinfo_str,
-                status=defs.UNPROCESS,
-                status_update_id='',
-                retry_cnt=0,
-                last_update_timestamp=now,
-                last_update_user=user.user_name
-            )
-            data_obj_list.append(data_object)
-
-            return True
+        # 正常の場合は登録データを返す
+        validated_data['retry_cnt'] = 0
+
+        return EventsRequest(**validated_data)
 
     except Exception as e:
         logger.system_log('LOSM22004', traceback.format_exc())
@@ -282,107 +258,254 @@ def data_list(body, user, rule_type_id_list, label_count_list):
 
 
 ################################################
-def bulk_create():
+class EventsRequestWriter:
     """
-    [メソッド概要]
-      EventsRequestテーブルに登録
+    [クラス概要]
+      EventsRequestテーブルへの一括登録処理
+      受付バッファと登録中バッファを入れ替えながら、専用スレッドで一括登録する。
+      受付件数が MAX_COUNT に達するか、最古の受付から MAX_AGE 秒経過したら登録する。
+      登録をコミットしたメッセージのみ on_commit で通知する(ACKは登録後に行う)。
+      登録データが None のメッセージは登録せずに受付順のまま on_commit で通知する。
     """
 
-    global data_obj_list
-    global thread_flg
+    def __init__(self, on_commit, on_error, max_count=MAX_COUNT, max_age=MAX_AGE):
+        """
+        [引数]
+          on_commit : 登録済み(再送不要)のデリバリータグのリストを受け取る関数
+          on_error  : 登録に失敗した(再送が必要な)デリバリータグのリストを受け取る関数
+        """
+
+        self.on_commit  = on_commit
+        self.on_error   = on_error
+        self.max_count  = max(max_count, 1)
+        self.max_age    = max_age
+        self.cond       = threading.Condition()
+        self.buffer     = []
+        self.first_time = None
+        self.stop_flag  = False
+        self.thread     = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+
+        self.thread.start()
+
+    def add(self, data_object, delivery_tag):
+        """
+        [メソッド概要]
+          登録データを受付バッファに追加する
+        """
+
+        with self.cond:
+            self.buffer.append((data_object, delivery_tag))
+            if self.first_time is None:
+                self.first_time = time.monotonic()
+
+            if len(self.buffer) >= self.max_count:
+                self.cond.notify()
+
+    def stop(self):
+        """
+        [メソッド概要]
+          受付済みのデータを登録してから停止する
+        """
+
+        with self.cond:
+            self.stop_flag = True
+            self.cond.notify()
+
+        self.thread.join()
+
+    def _wait_time(self):
+        """
+        [メソッド概要]
+          登録を開始するまでの待ち時間を返す(0以下は登録開始、Noneは受付待ち)
+        """
+
+        if not self.buffer:
+            return None
+
+        if self.stop_flag or len(self.buffer) >= self.max_count:
+            return 0
+
+        return self.max_age - (time.monotonic() - self.first_time)
+
+    def _run(self):
+        """
+        [メソッド概要]
+          登録スレッド
+        """
+
+        while True:
+            with self.cond:
+                wait_time = self._wait_time()
+                while not (wait_time is not None and wait_time <= 0):
+                    if self.stop_flag and not self.buffer:
+                        return
+
+                    self.cond.wait(wait_time)
+                    wait_time = self._wait_time()
+
+                # 受付バッファと登録中バッファを入れ替え
+                flush_list, self.buffer = self.buffer, []
+                self.first_time = None
+
+            self.flush(flush_list)
+
+    def flush(self, flush_list):
+        """
+        [メソッド概要]
+          登録中バッファのデータを一括登録する
+          一括登録に失敗した場合は1件ずつ登録し、不正データのみ破棄する
+        """
 
-    try:
-        thread_flg = False
-        with THREAD_LOCK:
-            data_obj_len = len(data_obj_list)
+        try:
+            with transaction.atomic():
+                EventsRequest.objects.bulk_create([d for d, t in flush_list if d is not None])
 
-            if data_obj_len <= 0:
-                return
+            self.on_commit([t for d, t in flush_list])
+            return
 
-            # 登録用配列にコピー
-            tmp_data = copy.deepcopy(data_obj_list)
-            data_obj_list = []
+        except Exception as e:
+            logger.system_log('LOSM22005', traceback.format_exc())
 
-        # 一括DB登録
-        EventsRequest.objects.bulk_create(tmp_data)
+        commit_list = []
+        error_list  = []
+        for data_object, delivery_tag in flush_list:
+            if data_object is None:
+                commit_list.append(delivery_tag)
+                continue
 
-        # 登録用配列初期化
-        tmp_data = []
+            try:
+                with transaction.atomic():
+                    data_object.save(force_insert=True)
 
-    except Exception as e:
-        logger.system_log('LOSM22005', traceback.format_exc())
+                commit_list.append(delivery_tag)
 
+            # 登録できないデータは再送しても登録できないため破棄
+            except (IntegrityError, DataError) as e:
+                logger.system_log('LOSM22005', traceback.format_exc())
+                commit_list.append(delivery_tag)
 
-################################################
-def load_ruletype():
-    """
-    [メソッド概要]
-      ルール種別管理テーブル情報を読み込む
-    """
+            except Exception as e:
+                logger.system_log('LOSM22005', traceback.format_exc())
+                error_list.append(delivery_tag)
 
-    rule_type_id_list = {}
-    label_count_list = {}
+        # DB切断等の場合は次回の登録時に再接続する
+        if error_list:
+            db_connection.close()
 
-    ruletype = list(RuleType.objects.all().values(
-        'rule_type_id', 'rule_type_name', 'label_count'))
-    for rt in ruletype:
+        # 再送分を先にキューへ戻してから、登録済み分をまとめてACKする
+        self.on_error(error_list)
+        self.on_commit(commit_list)
 
-        rule_type_id = {}
-        label_count = {}
 
-        rule_type_id[rt['rule_type_name']] = rt['rule_type_id']
-        label_count[rt['rule_type_name']] = rt['label_count']
-        rule_type_id_list.update(rule_type_id)
-        label_count_list.update(label_count)
+################################################
+def ack_messages(channel, delivery_tags):
+    """
+    [メソッド概要]
+      登録済みのメッセージを消費する
+      登録スレッドは受付順に処理するため、最大のデリバリータグまでを一括でACKする
+    """
 
-    return rule_type_id_list, label_count_list
+    if delivery_tags:
+        channel.basic_ack(max(delivery_tags), multiple=True)
 
 
 ################################################
-if __name__ == '__main__':
+def nack_messages(channel, delivery_tags):
+    """
+    [メソッド概要]
+      登録に失敗したメッセージをキューに戻す
+    """
 
-    # 初期化
-    loop_count = 0
-    thread_flg = False
+    for delivery_tag in delivery_tags:
+        channel.basic_nack(delivery_tag, requeue=True)
 
-    # データ読み込み
-    rule_type_id_list, label_count_list = load_ruletype()
 
-    # 起動時設定情報取得
-    user = User.objects.get(user_id=1)
-    accept_settings = RabbitMQ.settings()
+################################################
+def consume(accept_settings, user, stop_event):
+    """
+    [メソッド概要]
+      コンシューマー処理
+      コンシューマー毎にRabbitMQ接続と登録スレッドを持つ
+    """
 
     # rabbitMQ接続
     channel, connection = RabbitMQ.connect(accept_settings)
 
     # キューに接続
     channel.queue_declare(queue=accept_settings['queuename'], durable=True)
+    channel.basic_qos(prefetch_count=prefetch_count)
+
+    # 登録スレッド起動(ACK/NACKはチャネルを操作するスレッドで行う)
+    max_count = min(MAX_COUNT, prefetch_count) if prefetch_count > 0 else MAX_COUNT
+    writer = EventsRequestWriter(
+        lambda tags: connection.add_callback_threadsafe(functools.partial(ack_messages, channel, tags)),
+        lambda tags: connection.add_callback_threadsafe(functools.partial(nack_messages, channel, tags)),
+        max_count=max_count,
+    )
+    writer.start()
+
+    try:
+        # ループ
+        for method_frame, properties, body in channel.consume(accept_settings['queuename'], inactivity_timeout=1):
+
+            if stop_event.is_set():
+                break
 
-    # ループ
-    for method_frame, properties, body in channel.consume(accept_settings['queuename']):
+            if not method_frame:
+                continue
 
-        if method_frame:
+            # DB登録データを作成
+            data_object = data_list(body, user)
 
-            # DB登録リストを作成
-            _ = data_list(body, user, rule_type_id_list, label_count_list)
+            # 登録スレッドに渡す(登録後に消費、登録不可のメッセージも受付順にまとめて消費)
+            writer.add(data_object if data_object else None, method_frame.delivery_tag)
 
-            # RabbitMQから取得データを消費
-            channel.basic_ack(method_frame.delivery_tag)
+    finally:
+        # 受付済みのデータを登録し、ACK/NACKを送信してから終了
+        writer.stop()
+        connection.process_data_events(time_limit=0)
 
-            # ループカウントアップ
-            loop_count = len(data_obj_list)
+        channel.cancel()
+        channel.close()
+        connection.close()
+        db_connection.close()
 
-        # コミット件数の場合、DB登録
-        if loop_count >= MAX_COUNT:
-            thread_flg = True
-            thrd = threading.Thread(target=bulk_create())
-            thrd.start()
 
-        elif not thread_flg:
-            thread_flg = True
-            thrd = threading.Timer(0.1, bulk_create)
-            thrd.start()
+################################################
+if __name__ == '__main__':
+
+    # 初期化
+    stop_event = threading.Event()
+
+    def _on_sigterm(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    # データ読み込み
+    RuleTypeNameCache.refresh(force=True)
+
+    # 起動時設定情報取得
+    user = User.objects.get(user_id=1)
+    accept_settings = RabbitMQ.settings()
 
-    # 念のためclose処理
-    channel.close()
-    connection.close()
+    # コンシューマー起動
+    th_list = []
+    for i in range(consumer_count):
+        th = threading.Thread(
+            target=consume,
+            args=(accept_settings, user, stop_event),
+            daemon=True
+        )
+        th.start()
+        th_list.append(th)
+
+    # 停止要求、または、いずれかのコンシューマーが終了するまで待機
+    while not stop_event.is_set() and all(th.is_alive() for th in th_list):
+        stop_event.wait(1)
+
+    stop_event.set()
+    for th in th_list:
+        th.join()
@@ -19,11 +19,16 @@
 """
 import os
 import sys
+import signal
+import datetime
 from time import sleep
 from subprocess import Popen
+from collections import deque
+import multiprocessing
 import traceback
 import django
 from socket import gethostname
+from importlib import import_module
 
 # OASE モジュール importパス追加
 my_path = os.path.dirname(os.path.abspath(__file__))
@@ -37,6 +42,8 @@ django.setup()
 
 from django.conf import settings
 from django.db import transaction
+from django.db import connections
+from django.db import close_old_connections
 from django.db.models import Q
 
 #################################################
@@ -55,8 +62,17 @@ try:
     root_dir_path = os.environ['OASE_ROOT_DIR']
     run_interval  = os.environ['RUN_INTERVAL']
     python_module = os.environ['PYTHON_MODULE']
-    log_dir       = os.environ['LOG_DIR']
+    # 常駐モードはky_loopcallを経由しないため、子プロセス(oase_action_sub)にも既定値を引き継ぐ
+    log_dir       = os.environ.setdefault('LOG_DIR', root_dir_path + '/logs/backyardlogs/oase_action')
     log_level     = os.environ['LOG_LEVEL']
+
+    # ワーカープール設定(ACTION_WORKER未指定、または、0の場合はアクション毎に子プロセスを起動する)
+    action_worker_num = int(os.environ.get('ACTION_WORKER', 0))
+    action_queue_max  = int(os.environ.get('ACTION_QUEUE_MAX', 100))
+    action_max_tasks  = int(os.environ.get('ACTION_WORKER_MAX_TASKS', 100))
+
+    # 他ホストが処理中のまま更新が途絶えたルールマッチング結果を強制処理済みとするまでの時間(秒)
+    action_lease_sec = int(os.environ.get('ACTION_LEASE_SECONDS', 3600))
 except Exception as ex:
     print(str(ex))
     sys.exit(2)
@@ -77,13 +93,249 @@ from libs.backyardlibs.oase_action_common_libs import ActionDriverCommonModules
 from libs.backyardlibs.oase_action_common_libs import ConstantModules as Cstobj
 
 
+def action_worker(conn, max_tasks):
+    """
+    [概要]
+      ワーカープロセスのメイン処理
+      親プロセスから受け取ったアクション実行要求を順次処理する
+      ドライバーモジュールやDBコネクションはジョブをまたいで再利用する
+    [引数]
+      conn      : 親プロセスとの通信用コネクション
+      max_tasks : 1プロセスで処理するジョブの上限数(0の場合は無制限)
+    """
+
+    # 親プロセスのログ出力スレッドは引き継がれないため、同期出力に戻す
+    logger.reset_after_fork()
+
+    oase_action_sub = import_module('backyards.action_driver.oase_action_sub')
+
+    task_count = 0
+    while True:
+        try:
+            args = conn.recv()
+
+        except EOFError:
+            break
+
+        # 終了要求
+        if args is None:
+            break
+
+        returncode = 0
+        try:
+            close_old_connections()
+            oase_action_sub.execute(*args)
+
+        except Exception as e:
+            logger.system_log('LOSE01119', traceback.format_exc())
+            returncode = 1
+
+        # 上限数に達したプロセスは入れ替える
+        task_count += 1
+        retire = max_tasks > 0 and task_count >= max_tasks
+
+        conn.send((returncode, retire))
+        if retire:
+            break
+
+    conn.close()
+
+
+class ActionJob:
+    """
+    [クラス概要]
+        ワーカープールに投入したアクション実行要求
+        Popenと同様にpoll(), wait()で終了を確認できる
+    """
+
+    def __init__(self, pool, args):
+
+        self.pool = pool
+        self.args = args
+        self.returncode = None
+
+    def poll(self):
+
+        if self.returncode is None:
+            self.pool.dispatch()
+
+        return self.returncode
+
+    def wait(self):
+
+        while self.poll() is None:
+            sleep(self.pool.POLL_INTERVAL)
+
+        return self.returncode
+
+
+class ActionWorkerPool:
+    """
+    [クラス概要]
+        アクション実行用ワーカープール
+        起動済みのワーカープロセスにアクション実行要求を振り分ける
+        待ち行列が上限に達した場合は、空きができるまで投入を待機する
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, size, queue_max, max_tasks=0):
+        """
+        [概要]
+          コンストラクタ
+        """
+
+        self.size = max(size, 1)
+        self.queue_max = max(queue_max, 1)
+        self.max_tasks = max(max_tasks, 0)
+        self.ctx = multiprocessing.get_context('fork')
+        self.workers = [None] * self.size
+        self.pending = deque()
+
+        # fork前に読み込んでおき、ワーカー間でモジュールを共有する
+        import_module('backyards.action_driver.oase_action_sub')
+
+        logger.logic_log('LOSI01010', self.size, self.queue_max, self.max_tasks)
+
+    def _spawn(self, idx):
+        """
+        [概要]
+          ワーカープロセスを起動する
+        """
+
+        # DBコネクションを子プロセスと共有しないよう、fork前に切断する
+        connections.close_all()
+
+        parent_conn, child_conn = self.ctx.Pipe()
+        proc = self.ctx.Process(target=action_worker, args=(child_conn, self.max_tasks), daemon=True)
+        proc.start()
+        child_conn.close()
+
+        self.workers[idx] = {'proc': proc, 'conn': parent_conn, 'job': None}
+
+    def _discard(self, idx):
+        """
+        [概要]
+          ワーカープロセスを破棄する
+        """
+
+        worker = self.workers[idx]
+        self.workers[idx] = None
+
+        worker['conn'].close()
+        worker['proc'].join(timeout=self.POLL_INTERVAL)
+        if worker['proc'].is_alive():
+            worker['proc'].terminate()
+            worker['proc'].join()
+
+    def _collect(self, idx):
+        """
+        [概要]
+          ワーカープロセスの処理結果を回収する
+          異常終了したプロセスは実行中のジョブを終了扱いにして破棄する
+        """
+
+        worker = self.workers[idx]
+
+        try:
+            if worker['conn'].poll():
+                returncode, retire = worker['conn'].recv()
+                worker['job'].returncode = returncode
+                worker['job'] = None
+
+                if retire:
+                    self._discard(idx)
+
+                return
+
+        except (EOFError, OSError):
+            pass
+
+        if worker['proc'].is_alive():
+            return
+
+        job = worker['job']
+        if job is not None:
+            job.returncode = worker['proc'].exitcode if worker['proc'].exitcode else -1
+            logger.system_log('LOSM01018', job.args[2], worker['proc'].exitcode)
+
+        self._discard(idx)
+
+    def dispatch(self):
+        """
+        [概要]
+          処理結果を回収し、空いているワーカーへ待ち行列のジョブを割り当てる
+        """
+
+        for idx in range(self.size):
+            if self.workers[idx] is not None:
+                self._collect(idx)
+
+            if not self.pending:
+                continue
+
+            if self.workers[idx] is None:
+                self._spawn(idx)
+
+            worker = self.workers[idx]
+            if worker['job'] is not None:
+                continue
+
+            job = self.pending.popleft()
+            try:
+                worker['conn'].send(job.args)
+                worker['job'] = job
+
+            except (EOFError, OSError):
+                self.pending.appendleft(job)
+                self._discard(idx)
+
+    def submit(self, exec_type, response_id, trace_id, resume_order, action_history_id=0):
+        """
+        [概要]
+          アクション実行要求を待ち行列に追加する
+        """
+
+        while len(self.pending) >= self.queue_max:
+            self.dispatch()
+            if len(self.pending) >= self.queue_max:
+                sleep(self.POLL_INTERVAL)
+
+        job = ActionJob(self, (exec_type, response_id, trace_id, resume_order, action_history_id))
+        self.pending.append(job)
+        self.dispatch()
+
+        return job
+
+    def shutdown(self):
+        """
+        [概要]
+          全ワーカープロセスを終了する
+        """
+
+        for idx in range(self.size):
+            worker = self.workers[idx]
+            if worker is None:
+                continue
+
+            try:
+                worker['conn'].send(None)
+
+            except (EOFError, OSError):
+                pass
+
+            worker['proc'].join(timeout=int(run_interval))
+            self._discard(idx)
+
+
+
 class ActionDriverMainModules:
     """
     [クラス概要]
         アクションドライバメイン処理クラス
     """
 
-    def __init__(self, log_file_path):
+    def __init__(self, log_file_path, pool=None):
         """
         [概要]
           コンストラクタ
@@ -92,8 +344,10 @@ class ActionDriverMainModules:
 
         # クラス生成
         self.LogFilePath = log_file_path
+        self.pool = pool
         self.last_update_user = User.objects.get(user_id=Cstobj.DB_OASE_USER).user_name
         self.hostname = gethostname()
+        self.lease_refresh_time = datetime.datetime.now()
 
     def OASE_T_RHDM_RESPONSE_update(self, rhdm_response):
         """
@@ -114,25 +368,123 @@ class ActionDriverMainModules:
             logger.logic_log('LOSM01001', traceback.format_exc())
             return False
 
+    def claim_rhdm_response(self, rhdm_response, status):
+        """
+        [概要]
+          ルールマッチング結果を自ホストの処理対象として占有する
+          読み込み時から状態、ステータス更新ID、最終更新日時が変わっていない場合のみ更新するため、
+          複数ホストから同時に実行しても、占有できるのは1ホストのみとなる
+        [戻り値]
+          True:占有成功 False:他ホストが占有済み None:異常
+        """
+        logger.logic_log('LOSI00001', 'response_id: %s, status: %s' % (rhdm_response.response_id, status))
+
+        try:
+            with transaction.atomic():
+                rcnt = RhdmResponse.objects.filter(
+                    response_id           = rhdm_response.response_id,
+                    status                = rhdm_response.status,
+                    status_update_id      = rhdm_response.status_update_id,
+                    last_update_timestamp = rhdm_response.last_update_timestamp,
+                ).update(
+                    status                = status,
+                    status_update_id      = self.hostname,
+                    last_update_user      = self.last_update_user,
+                    last_update_timestamp = ActCommon.getStringNowDateTime(),
+                )
+
+        except Exception as ex:
+            logger.logic_log('LOSM01001', traceback.format_exc())
+            return None
+
+        logger.logic_log('LOSI00002', 'rcnt: %s' % (rcnt))
+        return rcnt > 0
+
+    def claim_action_history(self, act_his):
+        """
+        [概要]
+          Exastro連携中のアクション履歴を自ホストの処理対象として占有する
+          読み込み時からステータス更新ID、最終更新日時が変わっていない場合のみ更新するため、
+          複数ホストから同時に実行しても、占有できるのは1ホストのみとなる
+          (最終更新日時の更新により、自ホストの占有期限も延長する)
+        [引数]
+          act_his : dict アクション履歴(action_history_id, status_update_id, last_update_timestamp)
+        [戻り値]
+          True:占有成功 False:他ホストが占有済み None:異常
+        """
+        logger.logic_log('LOSI00001', 'action_history_id: %s' % (act_his['action_history_id']))
+
+        try:
+            with transaction.atomic():
+                rcnt = ActionHistory.objects.filter(
+                    action_history_id     = act_his['action_history_id'],
+                    status_update_id      = act_his['status_update_id'],
+                    last_update_timestamp = act_his['last_update_timestamp'],
+                ).update(
+                    status_update_id      = self.hostname,
+                    last_update_user      = self.last_update_user,
+                    last_update_timestamp = ActCommon.getStringNowDateTime(),
+                )
+
+        except Exception as ex:
+            logger.logic_log('LOSM01001', traceback.format_exc())
+            return None
+
+        logger.logic_log('LOSI00002', 'rcnt: %s' % (rcnt))
+        return rcnt > 0
+
+    def refresh_lease(self, aryPCB):
+        """
+        [概要]
+          実行中のルールマッチング結果の最終更新日時を更新し、占有期限を延長する
+          (長時間のアクション実行中に、他ホストから強制処理済みにされないようにする)
+          更新は占有期限の1/3の間隔で行う
+        """
+
+        now = datetime.datetime.now()
+        if len(aryPCB) == 0 or now < self.lease_refresh_time:
+            return
+
+        self.lease_refresh_time = now + datetime.timedelta(seconds=max(action_lease_sec // 3, 1))
+
+        try:
+            rcnt = RhdmResponse.objects.filter(
+                trace_id__in     = list(aryPCB),
+                status           = PROCESSING,
+                status_update_id = self.hostname,
+            ).update(
+                last_update_timestamp = ActCommon.getStringNowDateTime(),
+            )
+
+            logger.logic_log('LOSI01012', rcnt)
+
+        except Exception as ex:
+            logger.logic_log('LOSM01001', traceback.format_exc())
+
     def UpdateActionHistoryToRetry(self, action_history):
         """
         [概要]
           再実行させるようにアクション履歴を更新する
+          再実行要求が残っている場合のみ更新し、他ホストが受け付け済みであればNoneを返す
         """
 
         logger.logic_log('LOSI00001', 'action_history_id: %s' % (action_history.pk))
         try:
             with transaction.atomic():
-                action_history.retry_status = PROCESSING
-                action_history.retry_flag = False
-                action_history.status_update_id = gethostname()
-                action_history.last_update_user = self.last_update_user
-                action_history.last_update_timestamp = ActCommon.getStringNowDateTime()
-                action_history.save(force_update=True)
+                rcnt = ActionHistory.objects.filter(
+                    action_history_id = action_history.pk,
+                    retry_flag        = True,
+                ).update(
+                    retry_status          = PROCESSING,
+                    retry_flag            = False,
+                    status_update_id      = self.hostname,
+                    last_update_user      = self.last_update_user,
+                    last_update_timestamp = ActCommon.getStringNowDateTime(),
+                )
 
-                logger.logic_log('LOSI00002', 'None')
+                logger.logic_log('LOSI00002', 'rcnt: %s' % (rcnt))
 
-                return True
+                return True if rcnt > 0 else None
 
         except Exception as e:
             logger.logic_log('LOSM01001', traceback.format_exc())
@@ -143,6 +495,7 @@ class ActionDriverMainModules:
         [概要]
           ルールマッチング結果を処理する子プロセスと
           再実行要求を処理する子プロセスを起動するメソッド
+          ワーカープールが有効な場合は、子プロセスの代わりにプールへ投入する
 
         """
         logger.logic_log(
@@ -150,6 +503,12 @@ class ActionDriverMainModules:
             (aryPCB, exec_type, ResponseID, TraceID, resume_order, action_history_id))
 
         try:
+            # ワーカープールが有効な場合はプールで実行する
+            if self.pool:
+                aryPCB[TraceID] = self.pool.submit(exec_type, ResponseID, TraceID, resume_order, action_history_id)
+                logger.logic_log('LOSI00002', 'None')
+                return True
+
             devnull = open(os.devnull, "wb")
             logfile = open(self.LogFilePath, "ab")
             file_path = os.path.dirname(os.path.abspath(__file__)) + '/oase_action_sub.py'
@@ -219,14 +578,18 @@ class ActionDriverMainModules:
                 logger.logic_log('LOSI01001', trace_id)
 
                 # 待機中以外はステータスを処理中に更新
-                if rhdm_res.status != WAITING:
-                    rhdm_res.status = PROCESSING
-                result = self.OASE_T_RHDM_RESPONSE_update(rhdm_res)
+                status = rhdm_res.status if rhdm_res.status == WAITING else PROCESSING
+                result = self.claim_rhdm_response(rhdm_res, status)
 
-                if not result:
+                if result is None:
                     logger.logic_log('LOSM01005', trace_id)
                     return False
 
+                # 他ホストが処理中
+                if not result:
+                    logger.logic_log('LOSI01011', trace_id)
+                    continue
+
                 # 子プロセス起動
                 ret = self.ExecuteSubProcess(aryPCB, 'normal', response_id, trace_id, resume_order)
                 if not ret:
@@ -245,6 +608,10 @@ class ActionDriverMainModules:
                 trace_id = act_his.trace_id
 
                 result = self.UpdateActionHistoryToRetry(act_his)
+                if result is None:
+                    logger.logic_log('LOSI01011', trace_id)
+                    continue
+
                 if not result:
                     logger.logic_log('LOSM01005', trace_id)
                     return False
@@ -269,10 +636,16 @@ class ActionDriverMainModules:
         Exastro実行中
         """
         # アクション履歴管理:Exastroリクエスト/Exastro実行中/Exastro未実行状態をアクション履歴IDの昇順で取得
+        # (自ホストが更新したもの、または、他ホストの占有期限を過ぎたもののみ)
+        lease_expire = ActCommon.getStringNowDateTime() - datetime.timedelta(seconds=action_lease_sec)
         act_his_list = ActionHistory.objects.filter(
             Q(status__in=ACTION_HISTORY_STATUS.EXASTRO_CHECK_LIST)
             | Q(retry_status__in=ACTION_HISTORY_STATUS.EXASTRO_CHECK_LIST),
-        ).order_by('action_history_id').values('action_history_id', 'trace_id', 'response_id', 'execution_order')
+        ).filter(
+            Q(status_update_id=self.hostname) | Q(last_update_timestamp__lt=lease_expire)
+        ).order_by('action_history_id').values(
+            'action_history_id', 'trace_id', 'response_id', 'execution_order', 'status_update_id', 'last_update_timestamp'
+        )
 
         logger.logic_log('LOSI01100', str(len(act_his_list)), None)
 
@@ -282,6 +655,16 @@ class ActionDriverMainModules:
             response_id  = act_his['response_id']
             resume_order = act_his['execution_order']
 
+            # 他ホストと同じアクション履歴を重複して処理しないよう占有する
+            result = self.claim_action_history(act_his)
+            if result is None:
+                logger.logic_log('LOSM01005', trace_id)
+                return False
+
+            if not result:
+                logger.logic_log('LOSI01011', trace_id)
+                continue
+
             # 子プロセス起動
             ret = self.ExecuteSubProcess(aryPCB, 'exastro', response_id, trace_id, resume_order, act_his_id)
             if not ret:
@@ -295,10 +678,16 @@ class ActionDriverMainModules:
         exastroにデータの登録確認をする。登録状況に応じてアクションする。
         """
         # アクション履歴管理:Exastroリクエスト/Exastro実行中/Exastro未実行状態をアクション履歴IDの昇順で取得
+        # (自ホストが更新したもの、または、他ホストの占有期限を過ぎたもののみ)
+        lease_expire = ActCommon.getStringNowDateTime() - datetime.timedelta(seconds=action_lease_sec)
         act_his_list = ActionHistory.objects.filter(
             Q(status__in=ACTION_HISTORY_STATUS.EXASTRO_REGIST_LIST)
             | Q(retry_status__in=ACTION_HISTORY_STATUS.EXASTRO_REGIST_LIST),
-        ).order_by('action_history_id').values('action_history_id', 'trace_id', 'response_id', 'execution_order')
+        ).filter(
+            Q(status_update_id=self.hostname) | Q(last_update_timestamp__lt=lease_expire)
+        ).order_by('action_history_id').values(
+            'action_history_id', 'trace_id', 'response_id', 'execution_order', 'status_update_id', 'last_update_timestamp'
+        )
 
         logger.logic_log('LOSI01100', str(len(act_his_list)), None)
 
@@ -308,6 +697,16 @@ class ActionDriverMainModules:
             response_id = act_his['response_id']
             resume_order = act_his['execution_order']
 
+            # 他ホストと同じアクション履歴を重複して処理しないよう占有する
+            result = self.claim_action_history(act_his)
+            if result is None:
+                logger.logic_log('LOSM01005', trace_id)
+                return False
+
+            if not result:
+                logger.logic_log('LOSI01011', trace_id)
+                continue
+
             ret = self.ExecuteSubProcess(arypcb, 'regist_exastro', response_id, trace_id, resume_order, act_his_id)
             if not ret:
                 logger.logic_log('LOSM01006', trace_id)
@@ -356,15 +755,18 @@ class ActionDriverMainModules:
           ルールマッチング結果管理のステータスが処理中のまま
           子プロセスが終了しているレコードのステータスを
           強制処理済みに設定する。
+          他ホストが処理中のまま占有期限を過ぎたレコードも同様とする。
+          (読み込み後に他ホストが更新したレコードは更新しない)
         """
 
         logger.logic_log('LOSI00001', 'None')
 
         # ルールマッチング結果管理:処理中データ取得
         TraceID = '-' * 40
+        lease_expire = ActCommon.getStringNowDateTime() - datetime.timedelta(seconds=action_lease_sec)
         rhdm_response_list = RhdmResponse.objects.filter(
+            Q(status_update_id=self.hostname) | Q(last_update_timestamp__lt=lease_expire),
             status=PROCESSING,
-            status_update_id=self.hostname,
         )
 
         logger.logic_log('LOSI01000', str(len(rhdm_response_list)), TraceID)
@@ -376,25 +778,25 @@ class ActionDriverMainModules:
                 logger.logic_log('LOSI01001', TraceID)
 
                 # ステータスを強制処理済みに更新
-                rhdm_res.status = FORCE_PROCESSED
-                result = self.OASE_T_RHDM_RESPONSE_update(rhdm_res)
-                # 多重更新を判定しない
-                if result == False:
+                result = self.claim_rhdm_response(rhdm_res, FORCE_PROCESSED)
+                if result is None:
                     logger.logic_log('LOSM01005', TraceID)
                     # エラーでも先に進む
-                else:
-                    logger.logic_log('LOSI00002', 'None')
 
+                # 他ホストが占有期限を延長、または、処理済み
+                elif not result:
+                    logger.logic_log('LOSI01011', TraceID)
 
-if __name__ == '__main__':
+                else:
+                    logger.logic_log('LOSI00002', 'None')
 
-    # 実行ファイル名取得
-    filename, ext = os.path.splitext(os.path.basename(__file__))
-    # ログファイルのパスを生成
-    log_file_path = log_dir + '/' + filename + '_err.log'
 
-    ADobj = ActionDriverMainModules(log_file_path)
-    aryPCB = {}
+def run_cycle(ADobj, aryPCB, pool=None):
+    """
+    [概要]
+      ルールマッチング結果管理からアクションを取得して実行し、全ての終了を待つ
+      終了後、処理中のまま残ったレコードを強制処理済みにする
+    """
 
     logger.logic_log('LOSI01003', Cstobj.UnsetTraceID)
 
@@ -410,8 +812,11 @@ if __name__ == '__main__':
             logger.logic_log('LOSI01004', Cstobj.UnsetTraceID)
             break
 
+        # 実行中のルールマッチング結果の占有期限を延長
+        ADobj.refresh_lease(aryPCB)
+
         # 処理中プロセスがある場合はsleep
-        sleep(int(run_interval))
+        sleep(ActionWorkerPool.POLL_INTERVAL if pool else int(run_interval))
 
     logger.logic_log('LOSI01005', Cstobj.UnsetTraceID)
 
@@ -419,4 +824,87 @@ if __name__ == '__main__':
 
     logger.logic_log('LOSI01006', Cstobj.UnsetTraceID)
 
-    sys.exit(0)
+
+class ActionDaemon:
+    """
+    [クラス概要]
+        アクションドライバ常駐処理
+        ワーカープールを起動したまま、RUN_INTERVAL毎にアクションを取得して実行する
+        SIGTERM/SIGINT受信時は、実行中の周期が終わってから停止する
+    """
+
+    def __init__(self, ADobj, pool=None):
+        """
+        [概要]
+          コンストラクタ
+        """
+
+        self.ADobj = ADobj
+        self.pool = pool
+        self.stop_flag = False
+
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+        signal.signal(signal.SIGINT,  self._on_sigterm)
+
+    def _on_sigterm(self, signum, frame):
+
+        self.stop_flag = True
+
+    def run(self):
+        """
+        [概要]
+          停止要求を受けるまでアクションの取得、実行を繰り返す
+        """
+
+        while not self.stop_flag:
+            try:
+                # 無通信によるDB切断対策
+                close_old_connections()
+
+                run_cycle(self.ADobj, {}, self.pool)
+
+            except Exception as e:
+                logger.logic_log('LOSM01011', Cstobj.UnsetTraceID, traceback.format_exc())
+
+            # 停止要求を待ちながらインターバル分待機
+            wait_until = datetime.datetime.now() + datetime.timedelta(seconds=int(run_interval))
+            while not self.stop_flag and datetime.datetime.now() < wait_until:
+                sleep(ActionWorkerPool.POLL_INTERVAL)
+
+
+def main(argv):
+    """
+    [概要]
+      アクションドライバのメイン処理
+      --daemon指定時は常駐し、ワーカープールを周期をまたいで使い続ける
+      未指定時は1周期だけ実行して終了する
+    """
+
+    # 実行ファイル名取得
+    filename, ext = os.path.splitext(os.path.basename(__file__))
+    # ログファイルのパスを生成
+    log_file_path = log_dir + '/' + filename + '_err.log'
+
+    pool = None
+    if action_worker_num > 0:
+        pool = ActionWorkerPool(action_worker_num, action_queue_max, action_max_tasks)
+
+    try:
+        ADobj = ActionDriverMainModules(log_file_path, pool)
+
+        if '--daemon' in argv:
+            ActionDaemon(ADobj, pool).run()
+
+        else:
+            run_cycle(ADobj, {}, pool)
+
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv))
@@ -48,7 +48,7 @@ django.setup()
 from django.conf import settings
 from django.urls import reverse
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Q, Count
 
 #################################################
 # デバック用
@@ -65,7 +65,7 @@ try:
     root_dir_path = os.environ['OASE_ROOT_DIR']
     run_interval  = os.environ['RUN_INTERVAL']
     python_module = os.environ['PYTHON_MODULE']
-    log_dir       = os.environ['LOG_DIR']
+    log_dir       = os.environ.setdefault('LOG_DIR', root_dir_path + '/logs/backyardlogs/oase_action')
     log_level     = os.environ['LOG_LEVEL']
 except Exception as ex:
     print(str(ex))
@@ -110,6 +110,27 @@ from importlib import import_module
 
 from collections import defaultdict
 
+# ドライバーマネージャークラスのキャッシュ
+# (ワーカープールで実行する場合、プロセス内でジョブをまたいで再利用する)
+_driver_class_cache = {}
+
+
+def get_driver_class(driver_name):
+    """
+    [概要]
+      ドライバー名に対応するマネージャークラスを取得する
+      読み込み済みのクラスはキャッシュから返す
+    """
+
+    drv_class = _driver_class_cache.get(driver_name)
+    if drv_class is None:
+        drv_module = import_module('libs.backyardlibs.action_driver.%s.%s_driver' % (driver_name, driver_name))
+        drv_class  = getattr(drv_module, '%sManager' % (driver_name))
+        _driver_class_cache[driver_name] = drv_class
+
+    return drv_class
+
+
 #-----------------------------------------------
 # todo db操作系外だし　ライブラリに移動するか？
 #-----------------------------------------------
@@ -439,8 +460,7 @@ class ActionDriverSubModules:
         class_name  = '%sManager' % (driver_name)
 
         try:
-            drv_module = import_module(module_name)
-            drv_class  = getattr(drv_module, class_name)
+            drv_class = get_driver_class(driver_name)
             self.driver_manager = drv_class(self.trace_id, self.response_id, self.user)
 
         except ModuleNotFoundError:
@@ -761,35 +781,38 @@ class ActionDriverSubModules:
         True : 抑止する, False : 抑止しない
         """
         logger.logic_log('LOSI00001', 'trace_id: {}'.format(self.trace_id))
-        # ルール種別IDを取得 
-        rule_type_id = EventsRequest.objects.get(trace_id=trace_id).rule_type_id
+        # ルール種別IDを取得(アクション履歴にリクエストのルール種別IDを保持している)
+        rule_type_id = self.action_history.rule_type_id
 
         # アクション抑止間隔からアクション履歴を検索する日時を求める
         time_from = self.action_history.last_update_timestamp - datetime.timedelta(seconds=rhdm_res_act.action_stop_interval)
         
-        # 抑止対象となるアクション履歴を検索 承認待ちと、停止されたデータは除外
-        history_status_list = ActionHistory.objects.filter(
+        # 抑止対象となるアクション履歴の件数と、成否が出ていない件数を1回の集計で求める
+        # (ルール種別ID、ルール名、最終更新日時のインデックスにより、抑止間隔内の履歴のみを参照する)
+        # 承認待ちと、停止されたデータは除外
+        counts = ActionHistory.objects.filter(
             rule_type_id = rule_type_id,
             rule_name = rhdm_res_act.rule_name,
             last_update_timestamp__gt = time_from,
             pk__lt = act_his_pk,
         ).exclude(
             status__in = [ACTION_HISTORY_STATUS.PENDING, ACTION_HISTORY_STATUS.STOP]
-        ).values_list('status', flat=True)
-
+        ).aggregate(
+            history_count = Count('pk'),
+            waiting_count = Count('pk', filter=Q(status__in=[
+                ACTION_HISTORY_STATUS.RETRY,
+                ACTION_HISTORY_STATUS.EXASTRO_REQUEST,
+                ACTION_HISTORY_STATUS.PROCESSING,
+            ])),
+        )
 
         # 成否が出ていないものがあれば待機中
-        for s in history_status_list:
-            if s in (
-                     ACTION_HISTORY_STATUS.RETRY,
-                     ACTION_HISTORY_STATUS.EXASTRO_REQUEST,
-                     ACTION_HISTORY_STATUS.PROCESSING,
-                ):
-                logger.logic_log('LOSI01124', self.trace_id, act_his_pk)
-                return WAITING 
+        if counts['waiting_count'] > 0:
+            logger.logic_log('LOSI01124', self.trace_id, act_his_pk)
+            return WAITING 
 
         # 抑止判定
-        history_count = history_status_list.count()
+        history_count = counts['history_count']
         result = PREVENT if 0 < history_count <= rhdm_res_act.action_stop_count else False
         
         logger.logic_log('LOSI00002', 'trace_id: {}, return: {}'.format(self.trace_id, result))
@@ -976,8 +999,7 @@ class ActionDriverSubModules:
                 if v['name'] != 'mail':
                     continue
 
-                drv_module = import_module('libs.backyardlibs.action_driver.%s.%s_driver' % (v['name'], v['name']))
-                drv_class  = getattr(drv_module, '%sManager' % (v['name']))
+                drv_class = get_driver_class(v['name'])
                 self.preact_manager = drv_class(self.trace_id, self.response_id, self.user)
                 break
 
@@ -1229,36 +1251,12 @@ class ActionDriverSubModules:
         return True
 
 
-if __name__ == '__main__':
-
-    exec_type = ''
-    response_id = 0
-    trace_id = ''
-    resume_order = 0
-
-    # 起動パラメータ
-    args = sys.argv
-
-    # 引数異常
-    argc = len(args)
-    if argc < 5 or argc > 6:
-        logger.system_log('LOSE01118', args)
-        sys.exit(2)
-
-    # 引数の共通部分設定
-    if argc >= 5:
-        exec_type = args[1]
-        response_id = int(args[2])
-        trace_id = args[3]
-        resume_order = int(args[4])
-
-    if len(trace_id) == 0:
-        logger.system_log('LOSE01131', trace_id)
-        sys.exit(2)
-
-    # 引数の個数に合わせて個別設定
-    if argc >= 6:
-        action_history_id = int(args[5])
+def execute(exec_type, response_id, trace_id, resume_order, action_history_id=0):
+    """
+    [概要]
+      実行種別に応じたアクション処理を実行する
+      子プロセス起動時、および、ワーカープールの各ジョブから呼び出される
+    """
 
     if ENABLE_LOAD_TEST:
         start_time = time.time()
@@ -1292,7 +1290,42 @@ if __name__ == '__main__':
         loadtest_logger.warn('処理終了 所要時間[%s] TraceID[%s]' % (elapsed_time, trace_id))
 
     logger.logic_log('LOSI01115', str(response_id), trace_id)
+
+
+if __name__ == '__main__':
+
+    exec_type = ''
+    response_id = 0
+    trace_id = ''
+    resume_order = 0
+    action_history_id = 0
+
+    # 起動パラメータ
+    args = sys.argv
+
+    # 引数異常
+    argc = len(args)
+    if argc < 5 or argc > 6:
+        logger.system_log('LOSE01118', args)
+        sys.exit(2)
+
+    # 引数の共通部分設定
+    if argc >= 5:
+        exec_type = args[1]
+        response_id = int(args[2])
+        trace_id = args[3]
+        resume_order = int(args[4])
+
+    if len(trace_id) == 0:
+        logger.system_log('LOSE01131', trace_id)
+        sys.exit(2)
+
+    # 引数の個数に合わせて個別設定
+    if argc >= 6:
+        action_history_id = int(args[5])
+
+    execute(exec_type, response_id, trace_id, resume_order, action_history_id)
+
     logger.logic_log('LOSI00002', 'None')
 
     sys.exit(0)
-
@@ -38,7 +38,11 @@ import copy
 import django
 import traceback
 import re
-import ast
+import signal
+import queue
+import heapq
+import threading
+from socket import gethostname
 
 # --------------------------------
 # 環境変数取得
@@ -66,15 +70,16 @@ sys.path.append(oase_root_dir)
 os.environ['DJANGO_SETTINGS_MODULE'] = 'confs.frameworkconfs.settings'
 django.setup()
 
-from django.db import transaction, IntegrityError
-from django.db.models import F
+from django.db import transaction, IntegrityError, connection
+from django.db.models import F, Q, Max, Count, Sum
 from django.conf import settings
 from django.urls import reverse
 
 # --------------------------------
 # ロガー追加
 # --------------------------------
-from libs.commonlibs.oase_logger import OaseLogger
+from libs.commonlibs.oase_logger import OaseLogger, LazyLogArg
+from libs.backyardlibs.backyard_common import disconnect
 logger = OaseLogger.get_instance() # ロガー初期化
 
 # --------------------------------
@@ -82,6 +87,7 @@ logger = OaseLogger.get_instance() # ロガー初期化
 # --------------------------------
 from web_app.models.models import User, EventsRequest, RhdmResponse, RhdmResponseAction, System, RuleType
 from web_app.models.models import ActionType, DataObject, DriverType, RhdmResponseCorrelation
+from web_app.models.models import UnknownEventNotify
 from libs.commonlibs.define import *
 from libs.commonlibs.dt_component import DecisionTableComponent
 from libs.commonlibs.aes_cipher import AESCipher
@@ -94,11 +100,23 @@ ssl._create_default_https_context = ssl._create_unverified_context
 # --------------------------------
 # コンフィグファイル読み込み設定
 # --------------------------------
-rset = list(System.objects.filter(category='DMSETTINGS').values('config_id', 'value'))
-dmconf = {r['config_id']:r['value'] for r in rset}
-# パスワードを復号
-cipher = AESCipher(settings.AES_KEY)
-dmconf['DM_PASSWD'] = cipher.decrypt(dmconf['DM_PASSWD'])
+dmconf = {}
+def load_dmconf():
+    """
+    [概要]
+    DM接続設定を読み込む(常駐時は設定変更の都度、再読み込みする)
+    """
+
+    rset = list(System.objects.filter(category='DMSETTINGS').values('config_id', 'value'))
+    conf = {r['config_id']:r['value'] for r in rset}
+    # パスワードを復号
+    cipher = AESCipher(settings.AES_KEY)
+    conf['DM_PASSWD'] = cipher.decrypt(conf['DM_PASSWD'])
+
+    dmconf.clear()
+    dmconf.update(conf)
+
+load_dmconf()
 
 
 # --------------------------------
@@ -110,9 +128,19 @@ if ENABLE_LOAD_TEST:
     loadtest_logger = logging.getLogger('oase_agent')
 
 
-#ホスト名　コンフィグファイルに移動すべきか？
+# DMへの同時リクエスト数の既定値(System設定 AGENT_MAX_WORKER 未設定時)
 MAX_WORKER = 5
 
+# リクエストを1度に読み込む件数の既定値(System設定 AGENT_FETCH_CHUNK_SIZE 未設定時)
+FETCH_CHUNK_SIZE = 1000
+
+# 処理中リクエストの占有期限(秒)の既定値(System設定 AGENT_LEASE_SECONDS 未設定時)
+# 他ホストが占有したまま期限を過ぎたリクエストは再処理の対象とする
+LEASE_SECONDS = 600
+
+# リクエストの占有者として記録するホスト名
+HOSTNAME = gethostname()
+
 
 AGENT_USER_ID = -2140000002
 
@@ -143,6 +171,238 @@ class ActUtil:
     handling_summary = 'handlingSummary'
 
 
+class DMConcurrency:
+    """
+    [概要]
+    DMへの同時リクエスト数の制御、および、周期毎の計測
+    適応モードでは、直近のリクエストの応答時間とエラー率から同時リクエスト数を増減する
+    (問題がなければ1ずつ増やし、エラー率や応答時間の悪化を検知したら半減する)
+    """
+
+    # 同時リクエスト数を下げるエラー率
+    ERROR_RATE_MAX = 0.1
+
+    # 同時リクエスト数を下げる応答時間(基準応答時間に対する倍率)
+    LATENCY_RATIO_MAX = 2.0
+
+    def __init__(self, max_worker=MAX_WORKER, adaptive=False):
+
+        self.cond = threading.Condition()
+        self.max_worker = max(int(max_worker), 1)
+        self.adaptive = adaptive
+        self.limit = self.max_worker
+        self.inflight = 0
+        self.latency_base = None
+        self.window = []
+        self.reset_metrics()
+
+    def configure(self, max_worker, adaptive):
+        """
+        [概要]
+        同時リクエスト数の上限と適応モードを設定する
+        適応モードでは現在の同時リクエスト数を引き継ぐ
+        """
+
+        with self.cond:
+            self.max_worker = max(int(max_worker), 1)
+            if adaptive and self.adaptive:
+                self.limit = min(self.limit, self.max_worker)
+            elif adaptive:
+                self.limit = min(MAX_WORKER, self.max_worker)
+            else:
+                self.limit = self.max_worker
+
+            self.adaptive = adaptive
+            self.window = []
+            self.cond.notify_all()
+
+    def acquire(self):
+        """
+        [概要]
+        リクエスト枠を確保する(空きがなければ待機)
+        """
+
+        with self.cond:
+            while self.inflight >= self.limit:
+                self.cond.wait()
+
+            self.inflight += 1
+
+    def release(self, latency, error):
+        """
+        [概要]
+        リクエスト枠を解放し、応答時間とエラー有無を記録する
+        """
+
+        with self.cond:
+            self.inflight -= 1
+            self.requests += 1
+            self.errors += 1 if error else 0
+            self.latency_total += latency
+
+            if self.adaptive:
+                self.window.append((latency, error))
+                if len(self.window) >= self.limit:
+                    self._adjust()
+
+            self.cond.notify_all()
+
+    def _adjust(self):
+        """
+        [概要]
+        直近の計測結果から同時リクエスト数を増減する
+        """
+
+        count = len(self.window)
+        error_rate = sum(1 for l, e in self.window if e) / count
+        latency_avg = sum(l for l, e in self.window) / count
+        self.window = []
+
+        # 基準応答時間は最小値に追従し、緩やかに上昇させる
+        if self.latency_base is None or latency_avg < self.latency_base:
+            self.latency_base = latency_avg
+        else:
+            self.latency_base += (latency_avg - self.latency_base) * 0.1
+
+        prev_limit = self.limit
+        if error_rate > self.ERROR_RATE_MAX or latency_avg > self.latency_base * self.LATENCY_RATIO_MAX:
+            self.limit = max(self.limit // 2, 1)
+        else:
+            self.limit = min(self.limit + 1, self.max_worker)
+
+        if prev_limit != self.limit:
+            logger.logic_log('LOSI02011', prev_limit, self.limit, round(error_rate, 2), round(latency_avg, 3), round(self.latency_base, 3))
+
+    def reset_metrics(self):
+
+        self.requests = 0
+        self.errors = 0
+        self.latency_total = 0.0
+
+    def take_metrics(self):
+        """
+        [概要]
+        計測結果を取得してリセットする
+        [戻り値]
+        dict リクエスト数, エラー数, 平均応答時間, 同時リクエスト数, 上限
+        """
+
+        with self.cond:
+            metrics = {
+                'requests'    : self.requests,
+                'errors'      : self.errors,
+                'latency_avg' : self.latency_total / self.requests if self.requests > 0 else 0.0,
+                'limit'       : self.limit,
+                'max_worker'  : self.max_worker,
+            }
+            self.reset_metrics()
+
+        return metrics
+
+dm_concurrency = DMConcurrency()
+
+
+# アクションパラメータ中の予約変数
+RESERV_VAR_PATTERN = re.compile(r"{{ VAR_(\S+?) }}")
+
+# テンプレートのキャッシュ未登録を表す値(置換対象なしのNoneと区別する)
+_MISSING = object()
+
+
+def compile_reserv_var(act, var_index):
+    """
+    [概要]
+    予約変数を含むアクションパラメータを、置換用のテンプレートに変換する
+    [引数]
+    act : str アクションパラメータ
+    var_index : dict 条件名とイベント情報の位置
+    [戻り値]
+    list 固定文字列(str)とイベント情報の位置(int)の並び(置換対象の予約変数がなければNone)
+    """
+
+    parts = RESERV_VAR_PATTERN.split(act)
+    if len(parts) <= 1:
+        return None
+
+    template = [parts[0]]
+    for i in range(1, len(parts), 2):
+        if parts[i] in var_index:
+            template.append(var_index[parts[i]])
+            template.append(parts[i + 1])
+
+        # 条件名に該当しない予約変数は置換しない
+        else:
+            template[-1] += '{{ VAR_' + parts[i] + ' }}' + parts[i + 1]
+
+    if len(template) <= 1:
+        return None
+
+    return template
+
+
+class RuleTypeCache:
+    """
+    [概要]
+    ルール種別毎のメタ情報(ルール種別、挿入変数、ファクトクラス名、予約変数の置換情報)のプロセス内キャッシュ
+    ルール適用(コンテナ切替)やルール種別の変更時は最終更新日時が更新されるため、
+    周期毎に最終更新日時を比較し、変更のあったルール種別のみ破棄する
+    """
+
+    _data = {}
+
+    # ルール種別毎に保持する予約変数置換用テンプレートの上限
+    TEMPLATE_MAX = 10000
+
+    @classmethod
+    def get(cls, rule_type_id):
+        """
+        [概要]
+        メタ情報を取得する(キャッシュにない場合はDBから読み込む)
+        [戻り値]
+        dict ruletype, insert_obj, insert_vars, var_index, templates
+        """
+
+        meta = cls._data.get(rule_type_id)
+        if meta is None:
+            ruletype = RuleType.objects.get(rule_type_id=rule_type_id)
+            dataobjects = list(DataObject.objects.filter(rule_type_id=rule_type_id).order_by('data_object_id').values_list('label', 'conditional_name'))
+            labels = list(dict.fromkeys(d[0] for d in dataobjects))
+            cond_names = list(dict.fromkeys(d[1] for d in dataobjects))
+            dtcomp = DecisionTableComponent(ruletype.rule_table_name)
+
+            meta = {
+                'ruletype'    : ruletype,
+                'insert_obj'  : '%s.%s' % (dtcomp.rule_set, dtcomp.class_name),
+                'insert_vars' : labels,
+                'var_index'   : {name: i for i, name in enumerate(cond_names)},
+                'templates'   : {},
+                'version'     : ruletype.last_update_timestamp,
+            }
+            cls._data[rule_type_id] = meta
+
+        return meta
+
+    @classmethod
+    def refresh(cls):
+        """
+        [概要]
+        最終更新日時が変わったルール種別をキャッシュから破棄する
+        """
+
+        if not cls._data:
+            return
+
+        versions = dict(RuleType.objects.values_list('rule_type_id', 'last_update_timestamp'))
+        for rule_type_id in list(cls._data):
+            if cls._data[rule_type_id]['version'] != versions.get(rule_type_id):
+                cls._data.pop(rule_type_id)
+
+    @classmethod
+    def clear(cls):
+
+        cls._data.clear()
+
+
 class Driver:
     """
     [概要]
@@ -163,10 +423,8 @@ class Driver:
         self.ruletype   = None
 
         try:
-            self.ruletype = RuleType.objects.get(rule_type_id=rule_type_id)
-            dataobjects = list(DataObject.objects.filter(rule_type_id=rule_type_id).order_by('data_object_id').values_list('label', flat=True))
-            dataobjects = list(dict.fromkeys(dataobjects))
-            dtcomp = DecisionTableComponent(self.ruletype.rule_table_name)
+            meta = RuleTypeCache.get(rule_type_id)
+            self.ruletype = meta['ruletype']
 
         except RuleType.DoesNotExist as e:
             self.lost_flag = True
@@ -188,9 +446,9 @@ class Driver:
             logger.logic_log('LOSI00002', 'TraceID: %s' % trace_id)
             return None
 
-        self.__insert_obj = '%s.%s' % (dtcomp.rule_set, dtcomp.class_name)
+        self.__insert_obj = meta['insert_obj']
         self.__insert_vars = []
-        self.__insert_vars.extend(dataobjects)
+        self.__insert_vars.extend(meta['insert_vars'])
         self.__action_ins_name = 'acts'
         self._lookup = 'ksession-dtables' 
         self.__insert_vars.append(self.action_ins_name)
@@ -283,18 +541,42 @@ class Driver:
         [戻り値]
         str
         """
-        logger.logic_log('LOSI00001', 'TraceID: %s, event_to_time: %s, event_info: %s' % (self.trace_id, event_to_time, event_info))
+        logger.logic_log('LOSI00001', LazyLogArg('TraceID: {}, event_to_time: {}, event_info: {}'.format, self.trace_id, event_to_time, event_info))
+
+        commands = self.make_dm_commands(event_to_time, event_info)
+        if commands is None:
+            return None
+
         #dmに送るデータのテンプレート
-        postdata = {
-            "commands":[
-                {"insert":{"object":{},"out-identifier":"in"}},
-                {"set-global":{"identifier":"simulatedDateTime", "object":{"java.lang.String":""}}},
-                {"fire-all-rules":{}},
-                {"dispose":{}}
-             ]
-            }
+        postdata = {}
+        postdata["commands"] = commands + [{"dispose":{}}]
         postdata["lookup"] = self._lookup
 
+        logger.system_log('LOSI02002', self.trace_id, LazyLogArg(json.dumps, postdata, ensure_ascii=False, indent=4, separators=(',',':')))
+        
+        logger.logic_log('LOSI00002', 'TraceID: %s' % self.trace_id)
+        return json.dumps(postdata, ensure_ascii=False)
+
+
+    def make_dm_commands(self, event_to_time, event_info, out_identifier='in'):
+        """
+        [概要]
+        1イベント分のDM用コマンド(insert, set-global, fire-all-rules)を作成する
+        
+        [引数]
+        event_info: list イベント情報のリスト
+        event_to_time: str イベント発生日時'YYYY-MM-DDThh:mm:ss'
+        out_identifier: str DMのレスポンスからマッチング結果を取り出すための識別子
+        [戻り値]
+        list 作成できなければNone
+        """
+
+        commands = [
+            {"insert":{"object":{},"out-identifier":out_identifier}},
+            {"set-global":{"identifier":"simulatedDateTime", "object":{"java.lang.String":""}}},
+            {"fire-all-rules":{}},
+        ]
+
         j = json.loads(event_info)
 
         try:
@@ -317,15 +599,12 @@ class Driver:
         insert_dict = OrderedDict(zip(self.insert_vars, insertdata))
 
         # インプット用のオブジェクト名とその変数名を代入
-        postdata['commands'][0]['insert']['object'][self.insert_obj] = insert_dict
+        commands[0]['insert']['object'][self.insert_obj] = insert_dict
 
         # イベント発生日時をセット
-        postdata['commands'][1]['set-global']['object']['java.lang.String'] = event_to_time
-        
-        logger.system_log('LOSI02002', self.trace_id, json.dumps(postdata,ensure_ascii=False,indent=4,separators=(',',':')))
-        
-        logger.logic_log('LOSI00002', 'TraceID: %s' % self.trace_id)
-        return json.dumps(postdata, ensure_ascii=False)
+        commands[1]['set-global']['object']['java.lang.String'] = event_to_time
+
+        return commands
 
         
 class DMController:
@@ -358,7 +637,11 @@ class DMController:
         [引数]
         [戻り値]
         """
-        logger.logic_log('LOSI00001', 'TraceID: %s, postdata: %s' % (self.driver.trace_id, postdata))
+        logger.logic_log('LOSI00001', LazyLogArg('TraceID: {}, postdata: {}'.format, self.driver.trace_id, postdata))
+
+        dm_concurrency.acquire()
+        start_time = time.time()
+        error = True
         try:
             r = requests.post(
                     self.url,
@@ -369,12 +652,17 @@ class DMController:
                     )
             
             r.raise_for_status()
+            error = False
 
         except requests.exceptions.RequestException as e:
             logger.system_log('LOSI02005', self.driver.trace_id, traceback.format_exc())
             raise
 
-        logger.system_log('LOSI02003', self.driver.trace_id, str(r.status_code))
+        finally:
+            elapsed = time.time() - start_time
+            dm_concurrency.release(elapsed, error)
+
+        logger.system_log('LOSI02003', self.driver.trace_id, str(r.status_code), trace_id=self.driver.trace_id, elapsed=elapsed)
 
         logger.logic_log('LOSI00002', 'TraceID: %s' % self.driver.trace_id)
         return  r
@@ -411,7 +699,7 @@ class DMController:
         マッチング結果:
         レスポンス受信日時:
         """
-        logger.logic_log('LOSI00001', 'TraceID: %s, postdata: %s' % (self.driver.trace_id, postdata))
+        logger.logic_log('LOSI00001', LazyLogArg('TraceID: {}, postdata: {}'.format, self.driver.trace_id, postdata))
         try:
             r = self._post(postdata)
             reception_time = datetime.datetime.now(pytz.timezone('UTC')).strftime("%Y/%m/%d %H:%M:%S")
@@ -429,6 +717,22 @@ class DMController:
 
         value = decided_data['result']['execution-results']['results'][0]['value']
 
+        return self._judge(value, reception_time)
+
+    def _judge(self, value, reception_time):
+        """
+        [概要]
+        DMのレスポンスのvalue要素からマッチング結果を判定する
+
+        [引数]
+        value: dict DMのresponseのvalue要素
+        reception_time: str レスポンス受信日時
+        [戻り値]
+        ステータス:
+        マッチング結果:
+        レスポンス受信日時:
+        """
+
         #1つ以上ルールにマッチしたか確認
         if(self._is_matched(value)):
             matched_data = self._get_value(value)
@@ -439,6 +743,73 @@ class DMController:
         logger.logic_log('LOSI00002', 'TraceID: %s, status: %s, matched_data: %s, reception_time: %s' % (self.driver.trace_id, 'RULE_MATCH', matched_data, reception_time))
         return RULE_MATCH, matched_data, reception_time
 
+    @staticmethod
+    def evaluates_rules_batch(dmctl_list, event_list):
+        """
+        [概要]
+        同一コンテナ宛の複数イベントを1回のbatch-executionでDMに投げ、
+        イベント毎のマッチング結果に振り分ける
+        [引数]
+        dmctl_list : list イベント毎のDMController(コンテナIDは全て同一であること)
+        event_list : list イベント毎の(イベント発生日時, イベント情報)
+        [戻り値]
+        list イベント毎の(ステータス, マッチング結果, レスポンス受信日時)
+        """
+
+        logger.logic_log('LOSI00001', 'TraceIDs: %s' % ([d.driver.trace_id for d in dmctl_list]))
+
+        results  = [(RULE_ERROR, None, None)] * len(dmctl_list)
+        commands = []
+        out_ids  = {}
+
+        for i, (dmctl, (event_to_time, event_info)) in enumerate(zip(dmctl_list, event_list)):
+            out_id = 'in%s' % (i)
+            cmds = dmctl.driver.make_dm_commands(event_to_time, event_info, out_id)
+            if cmds is None:
+                continue
+
+            commands.extend(cmds)
+            out_ids[out_id] = i
+
+        if len(out_ids) <= 0:
+            logger.logic_log('LOSI00002', 'No valid event.')
+            return results
+
+        postdata = {}
+        postdata["commands"] = commands + [{"dispose":{}}]
+        postdata["lookup"] = dmctl_list[0].driver._lookup
+
+        rep = dmctl_list[0]
+        try:
+            r = rep._post(json.dumps(postdata, ensure_ascii=False))
+            reception_time = datetime.datetime.now(pytz.timezone('UTC')).strftime("%Y/%m/%d %H:%M:%S")
+            decided_data = json.loads(r.text)
+
+        except Exception as e:
+            logger.system_log('LOSE02005', rep.driver.trace_id, traceback.format_exc())
+            logger.logic_log('LOSI00002', 'status: %s, count: %s' % ('RULE_ERROR', len(results)))
+            return results
+
+        #postしたデータがDMで正しく処理されたか確認
+        if rep._is_failure(decided_data):
+            logger.logic_log('LOSI00002', 'status: %s, count: %s' % ('RULE_ERROR', len(results)))
+            return results
+
+        # out-identifier毎にイベントへ振り分け
+        for res in decided_data['result']['execution-results']['results']:
+            if res.get('key') not in out_ids:
+                continue
+
+            i = out_ids[res['key']]
+            try:
+                results[i] = dmctl_list[i]._judge(res['value'], reception_time)
+
+            except Exception as e:
+                logger.system_log('LOSE02005', dmctl_list[i].driver.trace_id, traceback.format_exc())
+
+        logger.logic_log('LOSI00002', 'count: %s' % (len(results)))
+        return results
+
     def make_dm_postdata(self, event_to_time, event_info):
         """
         [概要]
@@ -507,11 +878,12 @@ class Agent:
     CoreとDMの仲介役
     """
     
-    def __init__(self, dmctl=None, now=None):
+    def __init__(self, dmctl=None, now=None, user=None):
         """
         [概要]
         [引数]
         dmctl: DMControllerクラスのインスタンス
+        user : エージェントのユーザー(省略時はDBから取得)
         [戻り値]
         """
 
@@ -521,7 +893,7 @@ class Agent:
             now = datetime.datetime.now(pytz.timezone('UTC'))
 
         self.dmctl = dmctl
-        self.user = User.objects.get(user_id=AGENT_USER_ID)
+        self.user = user if user else User.objects.get(user_id=AGENT_USER_ID)
         self.oase_userid = self.user.user_id
         self.now = now
 
@@ -898,47 +1270,59 @@ class Agent:
         return correlation_info
 
 
-    def replace_reserv_var(self, events_request, data_obj_list, act_lists):
+    def replace_reserv_var(self, events_request, data_obj_list, act_lists, templates=None, event_values=None):
         """
         [概要]
         予約変数をイベント情報の値に置換する
         [引数]
+        events_request : EventsRequest リクエスト
+        data_obj_list : list 条件名のリスト(データオブジェクトID順)、または、dict 条件名とイベント情報の位置
+        act_lists : list アクションパラメータのリスト
+        templates : dict 置換用テンプレートのキャッシュ(省略時はキャッシュしない)
+        event_values : list 解析済みのイベント情報(省略時は置換が必要な場合にevent_infoを解析する)
         [戻り値]
+        list 置換後のアクションパラメータのリスト
         """
 
-        loop = 0
-        for act in act_lists:
-            conditional_name_list = re.findall(r"{{ VAR_(\S+?) }}", act)
+        if isinstance(data_obj_list, dict):
+            var_index = data_obj_list
+        else:
+            var_index = {name: i for i, name in enumerate(dict.fromkeys(data_obj_list))}
+
+        for loop, act in enumerate(act_lists):
+            # キャッシュは複数スレッドで共有するため、存在確認と取得を1回で行う
+            template = templates.get(act, _MISSING) if templates is not None else _MISSING
+
+            if template is _MISSING:
+                template = compile_reserv_var(act, var_index)
+                if templates is not None:
+                    if len(templates) >= RuleTypeCache.TEMPLATE_MAX:
+                        templates.clear()
 
-            for conditional_name in conditional_name_list:
-                i = 0
-                temp_list = []
-                for data_obj in data_obj_list:
+                    templates[act] = template
 
-                    if conditional_name == data_obj:
-                        replace = ast.literal_eval(events_request.event_info)['EVENT_INFO'][i]
-                        act = act.replace('{{ VAR_' + conditional_name + ' }}', replace)
-                        act_lists[loop] = act
-                        break
+            if template is None:
+                continue
 
-                    if data_obj not in temp_list:
-                        temp_list.append(data_obj)
-                        i = i + 1
+            if event_values is None:
+                event_values = json.loads(events_request.event_info)['EVENT_INFO']
 
-            loop = loop + 1
+            act_lists[loop] = ''.join(p if isinstance(p, str) else event_values[p] for p in template)
 
         return act_lists
 
 
-    def decide(self, event_req, mode):
+    def decide(self, event_req, mode, dm_result=None):
         """
         [概要]
         Get君から得たレコードを処理する
         [引数]
+        dm_result : tuple バッチ評価済みのマッチング結果(ステータス, マッチング結果, レスポンス受信日時)
+                    指定時はDMへのリクエスト、および、モードによる状態遷移を行わない
         [戻り値]
         """
-        logger.logic_log('LOSI00001', 'TraceID:%s, mode:%s, retry:%s' % (
-            event_req.trace_id, mode, event_req.retry_cnt))
+        logger.logic_log('LOSI00001', 'TraceID:%s, mode:%s, retry:%s, batch:%s' % (
+            event_req.trace_id, mode, event_req.retry_cnt, dm_result is not None))
 
         integrity_flag = False
 
@@ -952,54 +1336,80 @@ class Agent:
             return False
 
         # モードによってステータス変更および試行回数のカウントアップ
-        is_valid = self._check_mode(event_req, mode)
-        if not is_valid:
-            return False
+        if dm_result is None:
+            is_valid = self._check_mode(event_req, mode)
+            if not is_valid:
+                return False
+
+        notify_flag = False
 
         try:
-            with transaction.atomic():
-                #--------------------------
-                # イベント情報をdm用に加工してpostする。マッチング結果を調べる
-                #--------------------------
+            #--------------------------
+            # 通信フェーズ
+            # イベント情報をdm用に加工してpostする。マッチング結果を調べる
+            # (DMの応答待ちの間、DBのコネクションやロックを保持しないようトランザクション外で行う)
+            #--------------------------
+            if dm_result is None:
                 ett = event_req.event_to_time.strftime('%Y-%m-%dT%H:%M:%S')
                 rule_result, act_lists, reception_time = self.dmctl.evaluates_rules(
                     ett,
                     event_req.event_info,
                 )
-                #--------------------------
-                # ルール実行結果からステータスを取得する
-                #--------------------------
-                status = self._get_status(mode, rule_result)
 
+            else:
+                rule_result, act_lists, reception_time = dm_result
+
+            #--------------------------
+            # ルール実行結果からステータスを取得する
+            #--------------------------
+            status = self._get_status(mode, rule_result)
+
+            #--------------------------
+            # ルールにマッチした場合は予約変数を置換しておく
+            #--------------------------
+            if status != RULE_ERROR and status != RULE_UNMATCH:
+                dt_reception = datetime.datetime.strptime(reception_time, "%Y/%m/%d %H:%M:%S")
+
+                # 条件名とイベント情報の位置、置換用テンプレートはルール種別毎にキャッシュし、イベント情報の解析は1回のみとする
+                meta = RuleTypeCache.get(event_req.rule_type_id)
+                event_values = json.loads(event_req.event_info)['EVENT_INFO']
+
+                parame_lists = self.replace_reserv_var(
+                    event_req, meta['var_index'], act_lists['parameterInfo'], meta['templates'], event_values)
+                act_lists['parameterInfo'] = parame_lists
+
+                action_pre_lists = self.replace_reserv_var(
+                    event_req, meta['var_index'], act_lists['preInfo'], meta['templates'], event_values)
+                act_lists['preInfo'] = action_pre_lists
+
+            #--------------------------
+            # 書き込みフェーズ
+            #--------------------------
+            with transaction.atomic():
                 #--------------------------
                 # ルール実行に失敗したり、ルールにマッチしなかった場合は終了
                 #--------------------------
                 if status == RULE_ERROR or status == RULE_UNMATCH:
-                    EventsRequest.objects.filter(request_id=event_req.request_id).update(
-                        status=status, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+                    if not self._update_event_request(event_req, status):
+                        logger.logic_log('LOSI00002', 'Lost the lease. TraceID: %s' % (event_req.trace_id))
+                        return False
 
                     #--------------------------
-                    # ルールにマッチしなかった場合は未知事象通知
+                    # ルールにマッチしなかった場合は未知事象通知を送信待ちに登録(コミット後に送信)
                     #--------------------------
                     if status == RULE_UNMATCH:
-                        notify_param = {
-                            'decision_table_name' : self.dmctl.driver.ruletype.rule_type_name,
-                            'event_to_time' : event_req.event_to_time,
-                            'request_reception_time' : event_req.request_reception_time,
-                            'event_info' : event_req.event_info,
-                            'trace_id' : event_req.trace_id,
-                        }
-
-                        self._notify_unknown_event(
-                            event_req.request_type_id,
-                            notify_param
-                        )
+                        notify_flag = NotifyOutbox.register(
+                            event_req, self.dmctl.driver.ruletype, self.user.user_name)
 
                 #--------------------------
                 #ルールにマッチした場合の処理
                 #--------------------------
                 else:
-                    dt_reception = datetime.datetime.strptime(reception_time, "%Y/%m/%d %H:%M:%S")
+                    # 占有を失っている場合は、マッチング結果を登録しない
+                    if not self._update_event_request(event_req, status):
+                        logger.logic_log('LOSI00002', 'Lost the lease. TraceID: %s' % (event_req.trace_id))
+                        return False
+
                     rcnt = RhdmResponse.objects.filter(trace_id=event_req.trace_id).count()
                     if rcnt > 0:
                         logger.system_log('LOSE02001', event_req.trace_id, 1, rcnt)
@@ -1012,16 +1422,6 @@ class Agent:
                     )
                     response.save(force_insert=True)
 
-                    events_request = EventsRequest.objects.get(trace_id=event_req.trace_id)
-                    data_obj_list = DataObject.objects.filter(rule_type_id=events_request.rule_type_id).order_by(
-                        'data_object_id').values_list('conditional_name', flat=True)
-
-                    parame_lists = self.replace_reserv_var(events_request, data_obj_list, act_lists['parameterInfo'])
-                    act_lists['parameterInfo'] = parame_lists
-
-                    action_pre_lists = self.replace_reserv_var(events_request, data_obj_list, act_lists['preInfo'])
-                    act_lists['preInfo'] = action_pre_lists
-
                     # マッチング結果詳細に登録するためのリストを生成して登録
                     rhdm_res_act_data = self.make_rhdm_response_action_data(
                         act_lists,
@@ -1033,8 +1433,12 @@ class Agent:
 
                     self._create_rhdm_res_act_data(rhdm_res_act_data)
 
-                    EventsRequest.objects.filter(request_id=event_req.request_id).update(
-                        status=status, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+            #--------------------------
+            # 通知フェーズ
+            # 送信待ちに登録した未知事象通知は、別スレッドで送信する
+            #--------------------------
+            if notify_flag:
+                NotifyOutbox.wake()
 
         except IntegrityError as e:
             integrity_flag = True
@@ -1044,8 +1448,7 @@ class Agent:
             logger.system_log('LOSM02001', event_req.trace_id, traceback.format_exc())
             try:
                 with transaction.atomic():
-                    EventsRequest.objects.filter(request_id=event_req.request_id).update(
-                        status=SERVER_ERROR, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+                    self._update_event_request(event_req, SERVER_ERROR)
             except Exception as e:
                 logger.system_log('LOSE02008', event_req.trace_id, SERVER_ERROR, traceback.format_exc())
 
@@ -1054,8 +1457,7 @@ class Agent:
         if integrity_flag:
             try:
                 with transaction.atomic():
-                    EventsRequest.objects.filter(request_id=event_req.request_id).update(
-                        status=SERVER_ERROR, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+                    self._update_event_request(event_req, SERVER_ERROR)
             except Exception as e:
                 logger.system_log('LOSE02008', event_req.trace_id, SERVER_ERROR, traceback.format_exc())
 
@@ -1071,8 +1473,7 @@ class Agent:
         """
         try:
             with transaction.atomic():
-                EventsRequest.objects.filter(request_id=event_req.request_id).update(
-                    status=SERVER_ERROR, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+                self._update_event_request(event_req, SERVER_ERROR)
         except Exception as e:
             logger.system_log('LOSE02008', event_req.trace_id, SERVER_ERROR, traceback.format_exc())            
             return False
@@ -1085,17 +1486,53 @@ class Agent:
 
         return True
 
+    def _update_event_request(self, event_req, status):
+        """
+        自ホストが占有しているリクエストの状態を更新する。
+        占有時から占有者、最終更新日時が変わっていない場合のみ更新する。
+        占有期限切れにより他ホストが占有し直していた場合は更新せず、Falseを返す。
+        """
+        rcnt = EventsRequest.objects.filter(
+            request_id=event_req.request_id,
+            status_update_id=HOSTNAME,
+            last_update_timestamp=event_req.last_update_timestamp
+        ).update(
+            status=status,
+            last_update_timestamp=self.now,
+            last_update_user=self.user.user_name
+        )
+
+        # 他ホストが占有
+        if rcnt <= 0:
+            logger.logic_log('LOSI02014', event_req.trace_id, status)
+            return False
+
+        return True
+
     def _check_mode(self, event_req, mode):
         """
         modeをcheckする。
-        例外の場合はFalseを返す。
+        読み込み時から状態、占有者が変わっていない場合のみ更新し、自ホストの占有を延長する。
+        例外の場合、および、他ホストに占有された場合はFalseを返す。
         """
+        # 占有期限の判定に使用するため、周期の開始日時ではなく現在日時で更新する
+        now = datetime.datetime.now(pytz.timezone('UTC'))
+        rcnt = 0
+
         # 通常モードの場合は、「処理中」へ状態遷移
         if mode == NORMAL:
             try:
                 with transaction.atomic():
-                    EventsRequest.objects.filter(request_id=event_req.request_id, status=event_req.status).update(
-                        status=PROCESSING, last_update_timestamp=self.now, last_update_user=self.user.user_name)
+                    rcnt = EventsRequest.objects.filter(
+                        request_id=event_req.request_id,
+                        status=event_req.status,
+                        status_update_id=event_req.status_update_id
+                    ).update(
+                        status=PROCESSING,
+                        status_update_id=HOSTNAME,
+                        last_update_timestamp=now,
+                        last_update_user=self.user.user_name
+                    )
             except Exception as e:
                 logger.system_log('LOSE02008', event_req.trace_id, PROCESSING, traceback.format_exc())
                 return False
@@ -1104,17 +1541,34 @@ class Agent:
         elif mode == RECOVER:
             try:
                 with transaction.atomic():
-                    EventsRequest.objects.filter(
+                    rcnt = EventsRequest.objects.filter(
                         request_id=event_req.request_id, 
-                        status=event_req.status
+                        status=event_req.status,
+                        status_update_id=event_req.status_update_id
                     ).update(
                         retry_cnt=F('retry_cnt')+1, 
-                        last_update_timestamp=self.now, 
+                        status_update_id=HOSTNAME,
+                        last_update_timestamp=now, 
                         last_update_user=self.user.user_name
                     )
             except Exception as e:
                 logger.system_log('LOSE02008', event_req.trace_id, PROCESSING, traceback.format_exc())
                 return False
+
+        else:
+            return True
+
+        # 他ホストが処理中
+        if rcnt <= 0:
+            logger.logic_log('LOSI02012', event_req.trace_id, mode)
+            return False
+
+        # 書き込みフェーズで占有を確認するため、占有した状態を保持
+        if mode == NORMAL:
+            event_req.status = PROCESSING
+        event_req.status_update_id = HOSTNAME
+        event_req.last_update_timestamp = now
+
         return True
 
 
@@ -1208,107 +1662,114 @@ class Agent:
                 last_update_user          = self.user.user_name
             ).save(force_insert=True)
 
+        # コミット後に大グループの再評価を通知
+        rule_type_id    = self.dmctl.driver.ruletype.rule_type_id
+        request_type_id = self.dmctl.driver.request_type_id
+        transaction.on_commit(
+            lambda: correlation_engine.notify(rule_type_id, request_type_id, rule_name, group1_name)
+        )
+
 
     def _notify_unknown_event(self, req_type, notify_param):
         """
         未知事象のイベントを通知する
         """
 
-        logger.logic_log(
-            'LOSI00001', 'TraceID:%s, req_type:%s, notify_type:%s, mail_addr:%s' % (
-                notify_param.get('trace_id'),
-                req_type,
-                self.dmctl.driver.ruletype.unknown_event_notification,
-                self.dmctl.driver.ruletype.mail_address
-            )
-        )
-
-        # キーチェック
-        err_keys = []
-        key_list = [
-            'decision_table_name',
-            'event_to_time',
-            'request_reception_time',
-            'event_info',
-            'trace_id',
-        ]
-
-        for k in key_list:
-            if k not in notify_param:
-                err_keys.append(k)
-
-        if len(err_keys) > 0:
-            logger.logic_log('LOSI00002', 'Invalid notify parameter. keys:%s' % (err_keys))
-            return
-
-        trace_id = notify_param['trace_id']
-
-
-        # 本番環境リクエスト以外は通知対象外
-        if req_type != PRODUCTION:
-            logger.logic_log('LOSI00002', 'Not Production. TraceID:%s' % (trace_id))
-            return
-
-        # 対象ルールの通知設定チェック
-        if self.dmctl.driver.ruletype.unknown_event_notification != '1': # 1:メール通知
-            logger.logic_log('LOSI00002', 'Not notify. TraceID:%s' % (trace_id))
-            return
-
-        if not self.dmctl.driver.ruletype.mail_address:
-            logger.logic_log('LOSI00002', 'No mail address is defined. TraceID:%s' % (trace_id))
-            return
-
-        mail_list = self.dmctl.driver.ruletype.mail_address.split(';')
-
-        # メール署名用URL
-        url = getattr(settings, 'HOST_NAME', None)
-        if not url:
-            logger.logic_log('LOSI00002', 'No host is defined. TraceID:%s' % (trace_id))
-            return
-
-        url = url.rstrip('/')
-
-        login_url   = reverse('web_app:top:login')
-        inquiry_url = reverse('web_app:top:inquiry')
-        login_url   = '%s%s' % (url, login_url)
-        inquiry_url = '%s%s' % (url, inquiry_url)
-
-        # メール情報作成
-        smtp = OASEMailSMTP()
-        for m in mail_list:
-            m = m.strip()
-            notify_mail = OASEMailUnknownEventNotify(
-                m,
-                notify_param,
-                inquiry_url,
-                login_url
-            )
-            smtp.send_mail(notify_mail)
-
-        logger.logic_log('LOSI00002', 'Send mail. TraceID:%s' % (trace_id))
+        notify_unknown_event(self.dmctl.driver.ruletype, req_type, notify_param)
 
 
-def check_rhdm_response_correlation(now):
+def notify_unknown_event(ruletype, req_type, notify_param):
     """
     [概要]
-      マッチング結果コリレーション管理の状態をチェックする
-    [戻り値]
+    未知事象のイベントを通知する
+    [引数]
+    ruletype : RuleType 通知対象のルール種別
+    req_type : int リクエスト種別
+    notify_param : dict 通知内容
     """
 
-    def init_pre_info(sts):
+    logger.logic_log(
+        'LOSI00001', 'TraceID:%s, req_type:%s, notify_type:%s, mail_addr:%s' % (
+            notify_param.get('trace_id'),
+            req_type,
+            ruletype.unknown_event_notification,
+            ruletype.mail_address
+        )
+    )
 
-        pre_info = {
-            'rule_type_id'     : 0,
-            'request_type_id'  : 0,
-            'cond_large_group' : '',
-            'cond_small_group' : '',
-            'status'           : sts,
-        }
+    # キーチェック
+    err_keys = []
+    key_list = [
+        'decision_table_name',
+        'event_to_time',
+        'request_reception_time',
+        'event_info',
+        'trace_id',
+    ]
+
+    for k in key_list:
+        if k not in notify_param:
+            err_keys.append(k)
+
+    if len(err_keys) > 0:
+        logger.logic_log('LOSI00002', 'Invalid notify parameter. keys:%s' % (err_keys))
+        return
+
+    trace_id = notify_param['trace_id']
+
+
+    # 本番環境リクエスト以外は通知対象外
+    if req_type != PRODUCTION:
+        logger.logic_log('LOSI00002', 'Not Production. TraceID:%s' % (trace_id))
+        return
+
+    # 対象ルールの通知設定チェック
+    if ruletype.unknown_event_notification != '1': # 1:メール通知
+        logger.logic_log('LOSI00002', 'Not notify. TraceID:%s' % (trace_id))
+        return
+
+    if not ruletype.mail_address:
+        logger.logic_log('LOSI00002', 'No mail address is defined. TraceID:%s' % (trace_id))
+        return
+
+    mail_list = ruletype.mail_address.split(';')
+
+    # メール署名用URL
+    url = getattr(settings, 'HOST_NAME', None)
+    if not url:
+        logger.logic_log('LOSI00002', 'No host is defined. TraceID:%s' % (trace_id))
+        return
+
+    url = url.rstrip('/')
+
+    login_url   = reverse('web_app:top:login')
+    inquiry_url = reverse('web_app:top:inquiry')
+    login_url   = '%s%s' % (url, login_url)
+    inquiry_url = '%s%s' % (url, inquiry_url)
+
+    # メール情報作成
+    smtp = OASEMailSMTP()
+    for m in mail_list:
+        m = m.strip()
+        notify_mail = OASEMailUnknownEventNotify(
+            m,
+            notify_param,
+            inquiry_url,
+            login_url
+        )
+        smtp.send_mail(notify_mail)
 
-        return pre_info
+    logger.logic_log('LOSI00002', 'Send mail. TraceID:%s' % (trace_id))
 
 
-    logger.logic_log('LOSI00001', 'Check correlation info.')
+class CorrelationEngine:
+    """
+    [概要]
+    マッチング結果コリレーション管理の増分チェック
+    未アクション(status=0)のコリレーション情報を大グループ単位でメモリに保持し、
+    周期毎に、変更のあった大グループと期限を迎えた大グループのみを再評価する
+    (期限はヒープで管理し、他ホストによる変更は周期毎の集計値の比較で検知して取り込む)
+    """
 
     STS_REGISTED     = 0
     STS_REGISTABLE   = 1
@@ -1316,12 +1777,18 @@ def check_rhdm_response_correlation(now):
     STS_ACHIEVED     = 3
     STS_UNACHIEVABLE = 4
 
-    group_info = {}
-    pre_info   = init_pre_info(STS_ACHIEVED)
+    # 全件読み込みの間隔(秒)
+    RESYNC_INTERVAL = 600
+
+    # 変更検知に用いる集計項目(他ホストによる登録、更新の検知用)
+    MARKER_LIST = (
+        Max('last_update_timestamp'), Max('correlation_id'), Count('correlation_id'), Sum('current_count')
+    )
+
+    # 変更のあった大グループを一度に読み込む件数
+    LOAD_CHUNK_SIZE = 500
 
-    # 未アクションのコリレーション情報を取得
-    rset = RhdmResponseCorrelation.objects.filter(status=STS_REGISTED)
-    rset = rset.values_list(
+    FIELD_LIST = (
         'correlation_id', 'rule_type_id', 'request_type_id',
         'rule_name',
         'cond_large_group', 'cond_small_group', 'cond_small_group_priority', 'cond_large_group_priority',
@@ -1329,190 +1796,962 @@ def check_rhdm_response_correlation(now):
         'current_count', 'start_time',
         'response_detail_id'
     )
-    rset = rset.order_by(
+
+    ORDER_LIST = (
         'rule_type_id', 'request_type_id',
         'cond_large_group', 'cond_small_group', 'cond_small_group_priority', 'cond_large_group_priority'
     )
 
-    # 各グループの状態チェック
-    for cid, rule_id, req_id, rname, gr1, gr2, prio1, prio2, cond_cnt, cond_term, cur_cnt, stime, resp_id in rset:
-
-        # 前レコードと異なるグループの場合、
-        if rule_id != pre_info['rule_type_id'] \
-        or req_id  != pre_info['request_type_id'] \
-        or gr1     != pre_info['cond_large_group']:
-            pre_info = init_pre_info(STS_ACHIEVED)
+    def __init__(self):
 
-        # 前レコードと小グループが異なる場合、前ルールの状態をリセット
-        elif gr2 != pre_info['cond_small_group']:
-            pre_info['status'] = STS_ACHIEVED
+        self.lock = threading.Lock()
+        self.clear()
 
-        ####################################
-        # 条件達成チェック
-        ####################################
-        status = STS_NOTACHIEVE
+    def clear(self):
+        """
+        [概要]
+        保持している状態を破棄する(次回のチェックで全件を読み込む)
+        """
 
-        # 期限切れの場合「達成不可」へ遷移
-        if now >= stime + datetime.timedelta(seconds=cond_term):
-            status = STS_UNACHIEVABLE
+        with self.lock:
+            self.groups     = {}    # (rule_type_id, request_type_id, cond_large_group) : [row, ...]
+            self.rule_group = {}    # (rule_type_id, request_type_id, rule_name) : cond_large_group
+            self.deadlines  = {}    # 大グループ : 次の期限
+            self.heap       = []    # (期限, 大グループ)
+            self.dirty      = set()
+            self.synced_at  = None
+            self.marker     = None
+            self.fingerprints = {}    # 大グループ : 集計値
+
+    def notify(self, rule_type_id, request_type_id, rule_name, cond_large_group):
+        """
+        [概要]
+        コリレーション情報の変更を通知する(ルールの移動元の大グループも再評価の対象とする)
+        """
 
-        # 条件回数に到達、かつ、前提ルールが「達成」の場合「達成」へ遷移
-        elif cond_cnt <= cur_cnt and pre_info['status'] == STS_ACHIEVED:
-            status = STS_ACHIEVED
+        with self.lock:
+            self.dirty.add((rule_type_id, request_type_id, cond_large_group))
 
+            prev_group = self.rule_group.get((rule_type_id, request_type_id, rule_name))
+            if prev_group is not None and prev_group != cond_large_group:
+                self.dirty.add((rule_type_id, request_type_id, prev_group))
 
-        # 現在レコードの情報を保持
-        pre_info['rule_type_id']     = rule_id
-        pre_info['request_type_id']  = req_id
-        pre_info['cond_large_group'] = gr1
-        pre_info['cond_small_group'] = gr2
-        pre_info['status']           = status
+    def check(self, now):
+        """
+        [概要]
+        変更、または、期限を迎えた大グループを評価し、アクション可能なマッチング結果を状態遷移させる
+        (状態遷移の反映に失敗した場合は、次回のチェックで同じ大グループを再評価する)
+        """
 
-        if rule_id not in group_info:
-            group_info[rule_id] = {}
+        with self.lock:
+            resync = self.synced_at is None or time.time() - self.synced_at >= self.RESYNC_INTERVAL
+            keys = set()
 
-        if req_id not in group_info[rule_id]:
-            group_info[rule_id][req_id] = {}
+            try:
+                # 未アクションのコリレーション情報の変更有無(他ホストの変更はnotifyされないため集計値で検知)
+                marker = self._get_marker()
+
+                if resync:
+                    self.groups, self.rule_group, self.deadlines, self.heap = {}, {}, {}, []
+                    self.dirty.clear()
+                    self.synced_at = time.time()
+                    self.marker = marker
+                    self.fingerprints = self._get_fingerprints()
+                    self._load(now)
+                    keys = set(self.groups.keys())
 
-        if gr1 not in group_info[rule_id][req_id]:
-            group_info[rule_id][req_id][gr1] = {}
+                else:
+                    keys = self.dirty
+                    self.dirty = set()
+
+                    # 集計値が変わった場合は、集計値の変わった大グループを再評価
+                    if marker != self.marker:
+                        fingerprints = self._get_fingerprints()
+                        for key in set(fingerprints.keys()) | set(self.fingerprints.keys()):
+                            if fingerprints.get(key) != self.fingerprints.get(key):
+                                keys.add(key)
+
+                        self.marker = marker
+                        self.fingerprints = fingerprints
+
+                    # 期限を迎えた大グループ(再評価で期限が更新された古いエントリは無視)
+                    while self.heap and self.heap[0][0] <= now:
+                        deadline, key = heapq.heappop(self.heap)
+                        if self.deadlines.get(key) == deadline:
+                            self.deadlines.pop(key)
+                            keys.add(key)
+
+                    self._load(now, keys)
+
+                self._evaluate(now, keys)
+
+            except Exception:
+                # 次回のチェックで再評価する(全件読み込みに失敗した場合は全件読み込みからやり直す)
+                if resync:
+                    self.synced_at = None
+                else:
+                    self.dirty |= keys
 
-        if gr2 not in group_info[rule_id][req_id][gr1]:
-            group_info[rule_id][req_id][gr1][gr2] = {
-                'priority' : prio1,
-                'rules'    : [],
-            }
+                raise
 
-        if prio1 < group_info[rule_id][req_id][gr1][gr2]['priority']:
-            group_info[rule_id][req_id][gr1][gr2]['priority'] = prio1
+    def _get_marker(self):
+        """
+        [概要]
+        未アクションのコリレーション情報全体の集計値を取得する
+        """
 
-        group_info[rule_id][req_id][gr1][gr2]['rules'].append(
-            {
-                'name' : rname,
-                'prio' : prio2,
-                'sts'  : status,
-                'resp' : resp_id,
-            }
-        )
+        return tuple(RhdmResponseCorrelation.objects.filter(
+            status=self.STS_REGISTED).aggregate(*self.MARKER_LIST).values())
 
+    def _get_fingerprints(self):
+        """
+        [概要]
+        未アクションのコリレーション情報の集計値を大グループ毎に取得する
+        """
 
-    # 大グループ内での優先順位チェック
-    resp_ids = []
-    for rule_id, v1 in group_info.items():
-        for req_id, v2 in v1.items():
-            for gr1, v3 in v2.items():
+        rset = RhdmResponseCorrelation.objects.filter(status=self.STS_REGISTED).values_list(
+            'rule_type_id', 'request_type_id', 'cond_large_group').annotate(*self.MARKER_LIST).order_by()
 
-                del_ids = []
-                mod_ids = []
-                pnd_ids = []
-                settle_flag = False
+        return {row[:3] : row[3:] for row in rset}
 
-                for gr2, rule_info in sorted(v3.items(), key=lambda x: x[1]['priority']):
+    def _load(self, now, keys=None):
+        """
+        [概要]
+        未アクションのコリレーション情報を読み込む(keys指定時は該当大グループのみ)
+        """
 
-                    # 同じ小グループ内の状態チェック、および、アクションIDチェック
-                    for ri in rule_info['rules']:
+        rset = RhdmResponseCorrelation.objects.filter(status=self.STS_REGISTED)
 
-                        # 未達成状態の場合、状態が確定(アクションor期限切れ)するまで
-                        # 後続グループをアクションさせないようフラグを立てる
-                        if ri['sts'] == STS_NOTACHIEVE:
-                            settle_flag = True
+        if keys is None:
+            self._store(rset.values_list(*self.FIELD_LIST).order_by(*self.ORDER_LIST))
+            return
 
-                        # アクションが登録されている場合
-                        if  ri['resp']:
-                            del_ids.append(ri['resp'])
+        key_list = list(keys)
+        for key in key_list:
+            self.groups.pop(key, None)
 
-                            # 状態が「達成」、かつ、前提グループが「達成不可」の場合、アクション実行可能
-                            if ri['sts'] ==  STS_ACHIEVED and settle_flag == False:
-                                settle_flag = True
-                                mod_ids.append(ri['resp'])
+        for i in range(0, len(key_list), self.LOAD_CHUNK_SIZE):
+            chunk = key_list[i:i + self.LOAD_CHUNK_SIZE]
+            cond = Q()
+            for rule_id, req_id, gr1 in chunk:
+                cond |= Q(rule_type_id=rule_id, request_type_id=req_id, cond_large_group=gr1)
 
+            self._store(rset.filter(cond).values_list(*self.FIELD_LIST).order_by(*self.ORDER_LIST))
 
-                # アクション実行可能なグループが存在しない場合は、削除対象グループをクリア
-                if len(mod_ids) <= 0:
-                    del_ids.clear()
+    def _store(self, rset):
+        """
+        [概要]
+        読み込んだコリレーション情報を大グループ毎に保持する
+        """
+
+        for row in rset:
+            cid, rule_id, req_id, rname, gr1 = row[:5]
+            self.groups.setdefault((rule_id, req_id, gr1), []).append(row)
+            self.rule_group[(rule_id, req_id, rname)] = gr1
+
+    def _evaluate(self, now, keys):
+        """
+        [概要]
+        大グループ毎に状態をチェックし、状態遷移を一括で反映する
+        保持している状態は、状態遷移の反映をコミットした後に更新する
+        """
 
-                # 削除対象グループに更新対象と同一のアクションIDがあれば削除対象から除外
-                for mod_id in mod_ids:
-                    while mod_id in del_ids:
-                        del_ids.remove(mod_id)
+        run_groups = []    # (大グループ, コリレーションID, アクション実行対象, 削除対象)
+        deadlines  = {}    # 大グループ : 次の期限
+        empty_keys = []
 
-                logger.logic_log('LOSI02007', rule_id, req_id, gr1, mod_ids, del_ids)
+        for key in keys:
+            rows = self.groups.get(key)
+            if not rows:
+                empty_keys.append(key)
+                continue
 
-                # アクション実行登録可能な場合
-                if len(mod_ids) > 0:
+            rule_id, req_id, gr1 = key
+            group_mod_ids, group_del_ids, deadline = self.evaluate_group(rows, now)
 
-                    # 対象となる大グループの状態を変更
-                    RhdmResponseCorrelation.objects.filter(
-                        rule_type_id     = rule_id,
-                        request_type_id  = req_id,
-                        cond_large_group = gr1
-                    ).update(
-                        status           = STS_REGISTABLE
-                    )
+            logger.logic_log('LOSI02007', rule_id, req_id, gr1, group_mod_ids, group_del_ids)
+
+            # アクション実行登録可能な大グループ
+            if len(group_mod_ids) > 0:
+                run_groups.append((key, [row[0] for row in rows], group_mod_ids, group_del_ids))
+                continue
+
+            # 次の期限で再評価する
+            if deadline is not None:
+                deadlines[key] = deadline
+
+        done_keys  = []
+        stale_keys = []
+        resp_ids   = []
+        if len(run_groups) > 0:
+            del_ids = []
+            mod_ids = {}    # 実行順序 : [レスポンス詳細ID, ...]
+            run_ids = []
+
+            with transaction.atomic():
+
+                # 対象となる大グループの状態を変更
+                # 他ホストが状態遷移させた大グループ(未アクションでないレコードを含む)はアクションを更新しない
+                for key, corr_ids, group_mod_ids, group_del_ids in run_groups:
+                    with transaction.atomic():
+                        cnt = RhdmResponseCorrelation.objects.filter(
+                            correlation_id__in=corr_ids, status=self.STS_REGISTED
+                        ).update(status=self.STS_REGISTABLE)
+
+                        done_keys.append(key)
+                        if cnt != len(corr_ids):
+                            stale_keys.append(key)
+                            transaction.set_rollback(True)
+                            continue
+
+                    del_ids.extend(group_del_ids)
+                    run_ids.extend(group_mod_ids)
+                    for i, md in enumerate(group_mod_ids, 1):
+                        mod_ids.setdefault(i, []).append(md)
 
                 # アクションしないレコードは削除
                 if len(del_ids) > 0:
                     RhdmResponseAction.objects.filter(response_detail_id__in=del_ids).delete()
 
                 # アクション実施レコードは実行順序を更新
-                for i, md in enumerate(mod_ids, 1):
-                    RhdmResponseAction.objects.filter(response_detail_id=md).update(execution_order=i)
+                for i, ids in mod_ids.items():
+                    RhdmResponseAction.objects.filter(response_detail_id__in=ids).update(execution_order=i)
+
+                # アクション可能なマッチング結果を状態遷移させる
+                if len(run_ids) > 0:
+                    resp_ids = list(RhdmResponseAction.objects.filter(response_detail_id__in=run_ids).values_list('response_id', flat=True))
+                if len(resp_ids) > 0:
+                    RhdmResponse.objects.filter(response_id__in=resp_ids).update(status=UNPROCESS)
+
+        # コミット後に保持している状態を更新
+        # (状態遷移させた大グループ、他ホストが状態遷移させた大グループは保持対象から外す)
+        for key in empty_keys + done_keys:
+            self.groups.pop(key, None)
+            self.deadlines.pop(key, None)
+
+        for key, deadline in deadlines.items():
+            if self.deadlines.get(key) != deadline:
+                self.deadlines[key] = deadline
+                heapq.heappush(self.heap, (deadline, key))
+
+        # 他ホストが状態遷移させた大グループは、次回のチェックで読み込み直す
+        self.dirty.update(stale_keys)
+
+        logger.logic_log('LOSI02008', resp_ids)
+
+    @classmethod
+    def evaluate_group(cls, rows, now):
+        """
+        [概要]
+        大グループ内の各ルールの達成状態と、小グループの優先順位をチェックする
+        [引数]
+        rows : list 大グループのコリレーション情報(FIELD_LIST、ORDER_LIST順)
+        now  : datetime 判定日時
+        [戻り値]
+        list : アクション実行対象のレスポンス詳細ID
+        list : 削除対象のレスポンス詳細ID
+        datetime : 未到来の期限のうち最も早いもの(なければNone)
+        """
+
+        group_info = {}
+        pre_group  = None
+        pre_status = cls.STS_ACHIEVED
+        next_deadline = None
+
+        for cid, rule_id, req_id, rname, gr1, gr2, prio1, prio2, cond_cnt, cond_term, cur_cnt, stime, resp_id in rows:
+
+            # 前レコードと小グループが異なる場合、前ルールの状態をリセット
+            if gr2 != pre_group:
+                pre_status = cls.STS_ACHIEVED
+
+            ####################################
+            # 条件達成チェック
+            ####################################
+            status = cls.STS_NOTACHIEVE
+            deadline = stime + datetime.timedelta(seconds=cond_term)
+
+            # 期限切れの場合「達成不可」へ遷移
+            if now >= deadline:
+                status = cls.STS_UNACHIEVABLE
+
+            else:
+                if next_deadline is None or deadline < next_deadline:
+                    next_deadline = deadline
+
+                # 条件回数に到達、かつ、前提ルールが「達成」の場合「達成」へ遷移
+                if cond_cnt <= cur_cnt and pre_status == cls.STS_ACHIEVED:
+                    status = cls.STS_ACHIEVED
+
+            pre_group  = gr2
+            pre_status = status
+
+            if gr2 not in group_info:
+                group_info[gr2] = {
+                    'priority' : prio1,
+                    'rules'    : [],
+                }
+
+            if prio1 < group_info[gr2]['priority']:
+                group_info[gr2]['priority'] = prio1
+
+            group_info[gr2]['rules'].append(
+                {
+                    'name' : rname,
+                    'prio' : prio2,
+                    'sts'  : status,
+                    'resp' : resp_id,
+                }
+            )
+
+        # 大グループ内での優先順位チェック
+        del_ids = []
+        mod_ids = []
+        settle_flag = False
+
+        for gr2, rule_info in sorted(group_info.items(), key=lambda x: x[1]['priority']):
+
+            # 同じ小グループ内の状態チェック、および、アクションIDチェック
+            for ri in rule_info['rules']:
+
+                # 未達成状態の場合、状態が確定(アクションor期限切れ)するまで
+                # 後続グループをアクションさせないようフラグを立てる
+                if ri['sts'] == cls.STS_NOTACHIEVE:
+                    settle_flag = True
+
+                # アクションが登録されている場合
+                if  ri['resp']:
+                    del_ids.append(ri['resp'])
+
+                    # 状態が「達成」、かつ、前提グループが「達成不可」の場合、アクション実行可能
+                    if ri['sts'] == cls.STS_ACHIEVED and settle_flag == False:
+                        settle_flag = True
+                        mod_ids.append(ri['resp'])
+
+        # アクション実行可能なグループが存在しない場合は、削除対象グループをクリア
+        if len(mod_ids) <= 0:
+            del_ids.clear()
+
+        # 削除対象グループに更新対象と同一のアクションIDがあれば削除対象から除外
+        for mod_id in mod_ids:
+            while mod_id in del_ids:
+                del_ids.remove(mod_id)
+
+        return mod_ids, del_ids, next_deadline
+
+
+correlation_engine = CorrelationEngine()
+
+
+def check_rhdm_response_correlation(now):
+    """
+    [概要]
+      マッチング結果コリレーション管理の状態をチェックする
+      (変更、または、期限を迎えた大グループのみを評価する)
+    [戻り値]
+    """
+
+    logger.logic_log('LOSI00001', 'Check correlation info.')
+
+    correlation_engine.check(now)
+
+    logger.logic_log('LOSI00002', 'Check correlation info.')
+
+
+def decide_batch(agent_list, event_req_list, mode):
+    """
+    [概要]
+    同一コンテナ宛のリクエストをまとめてDMに投げ、リクエスト毎に結果を保存する
+    [引数]
+    agent_list : list リクエスト毎のAgent
+    event_req_list : list リクエスト
+    mode : int 処理モード
+    [戻り値]
+    """
+
+    logger.logic_log('LOSI00001', 'mode:%s, count:%s' % (mode, len(event_req_list)))
+
+    target_list = []
+    for agent, er in zip(agent_list, event_req_list):
+
+        # ルール種別、コンテナー不在、および、初期化エラーは個別に処理
+        if agent.dmctl.driver.err_flag:
+            agent.decide(er, mode)
+            continue
+
+        # モードによってステータス変更および試行回数のカウントアップ
+        if agent._check_mode(er, mode):
+            target_list.append((agent, er))
+
+    if len(target_list) <= 0:
+        logger.logic_log('LOSI00002', 'No target.')
+        return
+
+    # まとめてDMに投げる
+    dm_results = DMController.evaluates_rules_batch(
+        [agent.dmctl for agent, er in target_list],
+        [(er.event_to_time.strftime('%Y-%m-%dT%H:%M:%S'), er.event_info) for agent, er in target_list]
+    )
+
+    # リクエスト毎に結果を保存
+    for (agent, er), dm_result in zip(target_list, dm_results):
+        agent.decide(er, mode, dm_result=dm_result)
+
+    logger.logic_log('LOSI00002', 'count:%s' % (len(target_list)))
+
+
+class NotifyOutbox:
+    """
+    [概要]
+    未知事象通知の送信待ち行列
+    通知はリクエストの状態遷移と同じトランザクションで未知事象通知送信待ち管理に登録し、
+    ルールマッチングの処理スレッドから切り離した専用スレッドで送信して削除する
+    (送信前に停止した通知は、再起動後、または、占有期限切れ後に他ホストが送信する)
+    """
+
+    # 送信待ちを確認する間隔(秒)
+    POLL_INTERVAL = 60
+
+    # 送信待ちを一度に読み込む件数
+    CHUNK_SIZE = 100
+
+    _thread    = None
+    _lock      = threading.Lock()
+    _event     = threading.Event()
+    _stop_flag = False
+
+    @classmethod
+    def register(cls, event_req, ruletype, user_name):
+        """
+        [概要]
+        通知を送信待ちとして登録する(呼び出し元のトランザクション内で実行する)
+        本番環境リクエスト、かつ、メール通知が設定されたルール種別のみを対象とする
+        [戻り値]
+        bool 登録有無
+        """
+
+        if event_req.request_type_id != PRODUCTION:
+            return False
+
+        if ruletype is None or ruletype.unknown_event_notification != '1':
+            return False
+
+        UnknownEventNotify(
+            trace_id               = event_req.trace_id,
+            request_type_id        = event_req.request_type_id,
+            rule_type_id           = event_req.rule_type_id,
+            decision_table_name    = ruletype.rule_type_name,
+            request_reception_time = event_req.request_reception_time,
+            event_to_time          = event_req.event_to_time,
+            event_info             = event_req.event_info,
+            status_update_id       = HOSTNAME,
+            last_update_timestamp  = datetime.datetime.now(pytz.timezone('UTC')),
+            last_update_user       = user_name,
+        ).save(force_insert=True)
+
+        return True
+
+    @classmethod
+    def wake(cls):
+        """
+        [概要]
+        送信スレッドに送信待ちの確認を要求する(送信スレッドが未起動であれば起動する)
+        """
+
+        with cls._lock:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._stop_flag = False
+                cls._thread = threading.Thread(target=cls._run, daemon=True)
+                cls._thread.start()
+
+        cls._event.set()
+
+    @classmethod
+    def _run(cls):
+        """
+        [概要]
+        要求を受けるたび、または、一定間隔で送信待ちの通知を送信する
+        """
+
+        while True:
+            cls._event.wait(cls.POLL_INTERVAL)
+            cls._event.clear()
+            stop_flag = cls._stop_flag
+
+            cls.drain()
+
+            if stop_flag:
+                break
+
+    @classmethod
+    def drain(cls):
+        """
+        [概要]
+        自ホストが登録した通知と、占有期限切れの通知を送信して削除する
+        複数ホストが同時に実行しても、占有できた1ホストのみが送信する
+        [戻り値]
+        int 送信を試みた通知の件数
+        """
+
+        count = 0
+
+        try:
+            now = datetime.datetime.now(pytz.timezone('UTC'))
+            lease_expire = now - datetime.timedelta(seconds=LEASE_SECONDS)
+            ruletype_dic = {}
+            last_id = 0
+
+            while True:
+                notify_list = list(UnknownEventNotify.objects.filter(
+                    Q(status_update_id=HOSTNAME) | Q(last_update_timestamp__lt=lease_expire),
+                    notify_id__gt=last_id
+                ).order_by('notify_id')[:cls.CHUNK_SIZE])
+
+                for notify in notify_list:
+                    last_id = notify.notify_id
+
+                    # 読み込み時から占有者、最終更新日時が変わっていない場合のみ占有
+                    rcnt = UnknownEventNotify.objects.filter(
+                        notify_id=notify.notify_id,
+                        status_update_id=notify.status_update_id,
+                        last_update_timestamp=notify.last_update_timestamp
+                    ).update(
+                        status_update_id=HOSTNAME,
+                        last_update_timestamp=datetime.datetime.now(pytz.timezone('UTC'))
+                    )
+
+                    if rcnt <= 0:
+                        continue
+
+                    notify_param = {
+                        'decision_table_name'    : notify.decision_table_name,
+                        'event_to_time'          : notify.event_to_time,
+                        'request_reception_time' : notify.request_reception_time,
+                        'event_info'             : notify.event_info,
+                        'trace_id'               : notify.trace_id,
+                    }
+
+                    try:
+                        if notify.rule_type_id not in ruletype_dic:
+                            ruletype_dic[notify.rule_type_id] = RuleType.objects.get(rule_type_id=notify.rule_type_id)
+
+                        notify_unknown_event(ruletype_dic[notify.rule_type_id], notify.request_type_id, notify_param)
 
-                # アクション可能なIDを保持
-                if len(mod_ids) > 0:
-                    rset = RhdmResponseAction.objects.filter(response_detail_id__in=mod_ids).values_list('response_id', flat=True)
-                    resp_ids.extend(rset)
+                    except Exception as e:
+                        logger.system_log('LOSM02002', notify.trace_id, traceback.format_exc())
 
+                    # 送信に失敗した通知も再送しない
+                    UnknownEventNotify.objects.filter(notify_id=notify.notify_id).delete()
+                    count += 1
 
-    # アクション可能なマッチング結果を状態遷移させる
-    logger.logic_log('LOSI02008', resp_ids)
-    if len(resp_ids) > 0:
-        RhdmResponse.objects.filter(response_id__in=resp_ids).update(status=UNPROCESS)
+                if len(notify_list) < cls.CHUNK_SIZE:
+                    break
 
+        except Exception as e:
+            logger.system_log('LOSM02003', traceback.format_exc())
+
+        finally:
+            # 送信スレッドのDBコネクションを解放
+            if threading.current_thread() is cls._thread:
+                connection.close()
+
+        return count
+
+    @classmethod
+    def stop(cls):
+        """
+        [概要]
+        送信待ちの通知を全て送信してから送信スレッドを停止する
+        (送信スレッドが未起動の場合は、呼び出し元のスレッドで送信する)
+        """
+
+        with cls._lock:
+            thread = cls._thread
+            cls._thread = None
+
+            if thread is not None and thread.is_alive():
+                cls._stop_flag = True
+                cls._event.set()
+
+            else:
+                thread = None
+
+        if thread is None:
+            cls.drain()
+            return
+
+        thread.join()
+
+
+def fetch_event_requests(chunk_size=FETCH_CHUNK_SIZE, *args, claim=None, **conditions):
+    """
+    [概要]
+    条件に合うリクエストをリクエストIDの昇順に一定件数ずつ読み込んで返す
+    読み込み開始時点の最大リクエストIDまでを対象とし、処理中に状態が変わっても読み飛ばさない
+    [引数]
+    chunk_size : int 1度に読み込む件数
+    args, conditions : 抽出条件
+    claim : 読み込んだリクエストを占有する関数(占有できたリクエストのリストを返す)
+    [戻り値]
+    EventsRequest を1件ずつ返すジェネレーター
+    """
+
+    chunk_size = max(chunk_size, 1)
+    max_id = EventsRequest.objects.filter(*args, **conditions).aggregate(Max('request_id'))['request_id__max']
+    if max_id is None:
+        return
+
+    last_id = 0
+    while True:
+        chunk = list(EventsRequest.objects.filter(
+            *args, request_id__gt=last_id, request_id__lte=max_id, **conditions
+        ).order_by('request_id')[:chunk_size])
+
+        if len(chunk) <= 0:
+            break
+
+        last_id = chunk[-1].request_id
+        fetch_cnt = len(chunk)
+
+        if claim:
+            chunk = claim(chunk)
+
+        for er in chunk:
+            yield er
+
+        if fetch_cnt < chunk_size:
+            break
+
+
+def claim_event_requests(event_req_list, mode, lease_expire):
+    """
+    [概要]
+    リクエストをまとめて自ホストの占有にする
+    通常モードは未処理のリクエストを、再実行モードは自ホスト、または、占有期限切れの処理中リクエストを対象とする
+    条件付きの一括更新で占有するため、複数ホストから同時に実行しても同じリクエストを占有することはない
+    [引数]
+    event_req_list : list 占有するリクエスト
+    mode : int 処理モード
+    lease_expire : datetime 占有期限切れとする最終更新日時
+    [戻り値]
+    list 占有できたリクエスト
+    """
+
+    ids = [er.request_id for er in event_req_list]
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    with transaction.atomic():
+        if mode == NORMAL:
+            rset = EventsRequest.objects.filter(request_id__in=ids, status=UNPROCESS)
+
+        else:
+            rset = EventsRequest.objects.filter(request_id__in=ids, status=PROCESSING).filter(
+                Q(status_update_id=HOSTNAME) | Q(last_update_timestamp__lt=lease_expire)
+            )
+
+        claim_cnt = rset.update(status=PROCESSING, status_update_id=HOSTNAME, last_update_timestamp=now)
+
+    # 自ホストの処理中リクエストは全て今回占有したもの(1ホストにつき1プロセスで動作するため)
+    claimed_list = list(EventsRequest.objects.filter(
+        request_id__in=ids, status=PROCESSING, status_update_id=HOSTNAME
+    ).order_by('request_id'))
 
-def multi(event_req_list, mode, now):
+    logger.logic_log('LOSI02013', mode, len(ids), claim_cnt, len(claimed_list))
+
+    return claimed_list
+
+
+def multi(event_req_list, mode, now, batch_size=1, max_worker=MAX_WORKER):
     """
     [概要]
     マルチプロセスまたは、マルチスレッド処理用
+    処理待ちが上限に達したら、空きができるまで次のリクエストの読み込みを待機する
     [引数]
+    event_req_list : iterable リクエスト(ジェネレーター可)
+    batch_size : int 1回のDMリクエストにまとめるイベント数(1以下の場合はイベント毎にリクエスト)
+    max_worker : int 処理スレッド数(DMへの同時リクエスト数の上限)
     [戻り値]
+    int 処理したリクエスト数
     """
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKER) as executor:
+    user = User.objects.get(user_id=AGENT_USER_ID)
+    max_worker = max(max_worker, 1)
+    count = 0
+
+    # 処理待ちの上限(実行中を含めて処理スレッド数の2倍)
+    slots = threading.BoundedSemaphore(max_worker * 2)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_worker) as executor:
+
+        def _submit(fn, *args):
+            slots.acquire()
+            future = executor.submit(fn, *args)
+            future.add_done_callback(lambda f: slots.release())
+            return future
+
+        batch_info = {}
         for er in event_req_list:
+            count += 1
             driver = Driver(er.request_type_id, er.rule_type_id, er.trace_id)
             dmctl = DMController(driver)
-            agent = Agent(dmctl, now=now)
+            agent = Agent(dmctl, now=now, user=user)
 
-            future = executor.submit(agent.decide, er, mode)
+            if batch_size <= 1 or driver.err_flag:
+                future = _submit(agent.decide, er, mode)
+                continue
 
+            # コンテナ単位でまとめる
+            if dmctl.url not in batch_info:
+                batch_info[dmctl.url] = ([], [])
 
-if __name__=='__main__':
-    try:
-        retry_max = 5
+            batch_info[dmctl.url][0].append(agent)
+            batch_info[dmctl.url][1].append(er)
+
+            if len(batch_info[dmctl.url][0]) >= batch_size:
+                agent_list, er_list = batch_info.pop(dmctl.url)
+                future = _submit(decide_batch, agent_list, er_list, mode)
+
+        for agent_list, er_list in batch_info.values():
+            future = _submit(decide_batch, agent_list, er_list, mode)
+
+    return count
+
+
+class AgentDaemon:
+    """
+    [クラス概要]
+    エージェント常駐処理
+    設定を1度だけ読み込み、未処理リクエストをポーリングで待ち受ける。
+    SIGHUP受信時、または、設定変更検知時に設定を再読み込みする。
+    """
+
+    # 設定変更を監視する分類
+    CONF_CATEGORY = ['DMSETTINGS', 'AGENTSETTINGS']
+
+    # ポーリング間隔の初期値(秒)
+    MIN_INTERVAL = 0.1
+
+    # DBコネクションを再接続する無通信時間(秒)
+    # DBの無通信タイムアウト(wait_timeout)より短くする
+    DB_IDLE_TIMEOUT = 600
+
+    def __init__(self, max_interval):
+        """
+        [引数]
+        max_interval : float ポーリング間隔の上限(秒)
+        """
+
+        self.max_interval = max(float(max_interval), self.MIN_INTERVAL)
+        self.reload_flag  = True
+        self.stop_flag    = False
+        self.conf_version = None
+        self.agent_conf   = {}
+
+        signal.signal(signal.SIGHUP,  self._on_sighup)
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+        signal.signal(signal.SIGINT,  self._on_sigterm)
+
+    def _on_sighup(self, signum, frame):
+
+        self.reload_flag = True
+
+    def _on_sigterm(self, signum, frame):
+
+        self.stop_flag = True
+
+    def get_conf_version(self):
+        """
+        [概要]
+        設定の版数(最終更新日時の最大値)を取得する
+        """
+
+        return System.objects.filter(category__in=self.CONF_CATEGORY).aggregate(
+            Max('last_update_timestamp'))['last_update_timestamp__max']
+
+    def reload(self):
+        """
+        [概要]
+        設定を再読み込みする
+        """
+
+        logger.logic_log('LOSI02009', self.conf_version)
+
+        load_dmconf()
+        RuleTypeCache.clear()
+        self.agent_conf = load_agent_settings()
+        self.conf_version = self.get_conf_version()
+        self.reload_flag  = False
+
+    def run(self):
+        """
+        [概要]
+        停止要求を受けるまで未処理リクエストを処理し続ける
+        未処理リクエストがない間は、ポーリング間隔を上限まで延ばしながら待機する
+        """
+
+        interval = self.MIN_INTERVAL
+        last_access = time.time()
+
+        # 前回停止時に送信できなかった未知事象通知を送信
+        NotifyOutbox.wake()
+
+        try:
+            while not self.stop_flag:
+                try:
+                    # 無通信によるDB切断対策(無通信時間が長い場合のみ再接続)
+                    if time.time() - last_access > self.DB_IDLE_TIMEOUT:
+                        disconnect()
+
+                    if not self.reload_flag and self.conf_version != self.get_conf_version():
+                        self.reload_flag = True
+
+                    if self.reload_flag:
+                        self.reload()
+
+                    count = run_cycle(self.agent_conf)
+
+                except Exception as e:
+                    logger.logic_log('LOSE02009', traceback.format_exc())
+                    count = 0
+
+                    # 切断されている可能性があるため、次の周期で再接続
+                    disconnect()
+
+                last_access = time.time()
+
+                # 処理対象があれば直ちに次の周期へ
+                if count > 0:
+                    interval = self.MIN_INTERVAL
+                    continue
+
+                # 処理対象がなければ待機(停止要求、設定再読み込み要求には即時に応答)
+                wait_end = time.time() + interval
+                while not self.stop_flag and not self.reload_flag and time.time() < wait_end:
+                    time.sleep(min(self.MIN_INTERVAL, wait_end - time.time()))
+
+                interval = min(interval * 2, self.max_interval)
+
+        finally:
+            # 送信待ちの未知事象通知を送信してから終了
+            NotifyOutbox.stop()
+
+
+def load_agent_settings():
+    """
+    [概要]
+    エージェントの設定を読み込む
+    [戻り値]
+    dict retry_max  : 再実行上限回数
+         batch_size : 1回のDMリクエストにまとめるイベント数
+         max_worker : DMへの同時リクエスト数の上限
+         adaptive   : 同時リクエスト数を応答状況に応じて増減するか
+         chunk_size : リクエストを1度に読み込む件数
+         lease_sec  : 処理中リクエストの占有期限(秒)
+    """
+
+    def _get_int(config_id, default):
         try:
-            retry_max = int(System.objects.get(config_id='AGENT_RETRY_MAX').value)
+            return int(System.objects.get(config_id=config_id).value)
         except Exception as e:
             logger.logic_log('LOSI00005', traceback.format_exc())
+            return default
 
-        now = datetime.datetime.now(pytz.timezone('UTC'))
+    agent_conf = {
+        'retry_max'  : _get_int('AGENT_RETRY_MAX', 5),
+        'batch_size' : _get_int('AGENT_DM_BATCH_SIZE', 1),
+        'max_worker' : max(_get_int('AGENT_MAX_WORKER', MAX_WORKER), 1),
+        'adaptive'   : _get_int('AGENT_ADAPTIVE_CONCURRENCY', 0) == 1,
+        'chunk_size' : max(_get_int('AGENT_FETCH_CHUNK_SIZE', FETCH_CHUNK_SIZE), 1),
+        'lease_sec'  : max(_get_int('AGENT_LEASE_SECONDS', LEASE_SECONDS), 1),
+    }
 
+    dm_concurrency.configure(agent_conf['max_worker'], agent_conf['adaptive'])
+
+    return agent_conf
+
+
+def run_cycle(agent_conf):
+    """
+    [概要]
+    1周期分のリクエストを処理する
+    [引数]
+    agent_conf : dict エージェントの設定(load_agent_settings()の戻り値)
+    [戻り値]
+    int 処理したリクエスト数
+    """
+
+    retry_max  = agent_conf['retry_max']
+    batch_size = agent_conf['batch_size']
+    max_worker = agent_conf['max_worker']
+    chunk_size = agent_conf.get('chunk_size', FETCH_CHUNK_SIZE)
+    lease_sec  = agent_conf.get('lease_sec', LEASE_SECONDS)
+
+    start_time = time.time()
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    # 変更のあったルール種別のメタ情報を破棄
+    RuleTypeCache.refresh()
+
+    #--------------------------
+    #前回'処理中'で終わったレコードがあるものは再処理を行う
+    #--------------------------
+    # 自ホストの処理中リクエストは前周期の処理が中断したもの、他ホストの処理中リクエストは占有期限切れのものを再処理する
+    lease_expire = now - datetime.timedelta(seconds=lease_sec)
+
+    logger.logic_log('LOSI02000')
+    er_list = fetch_event_requests(
+        chunk_size,
+        Q(status_update_id=HOSTNAME) | Q(last_update_timestamp__lt=lease_expire),
+        claim=lambda chunk: claim_event_requests(chunk, RECOVER, lease_expire),
+        status=PROCESSING, retry_cnt__lt=retry_max
+    )
+    count = multi(er_list, RECOVER, now, batch_size, max_worker)
+
+    #--------------------------
+    #未処理のレコードを取得して処理する
+    #--------------------------
+    logger.logic_log('LOSI02001')
+    er_list = fetch_event_requests(
+        chunk_size,
+        claim=lambda chunk: claim_event_requests(chunk, NORMAL, lease_expire),
+        status=UNPROCESS
+    )
+    count += multi(er_list, NORMAL, now, batch_size, max_worker)
+
+    #--------------------------
+    #コリレーション情報をチェック
+    #--------------------------
+    check_rhdm_response_correlation(now)
+
+    #--------------------------
+    #周期毎の処理性能を出力
+    #--------------------------
+    metrics = dm_concurrency.take_metrics()
+    if count > 0:
+        elapsed = time.time() - start_time
+        logger.system_log(
+            'LOSI02010', count, round(elapsed, 3), round(count / elapsed, 1) if elapsed > 0 else 0,
+            metrics['requests'], metrics['errors'], round(metrics['latency_avg'], 3), metrics['limit'], metrics['max_worker']
+        )
+
+    return count
+
+
+if __name__=='__main__':
+    try:
         #--------------------------
-        #前回'処理中'で終わったレコードがあるものは再処理を行う
-        #--------------------------
-        logger.logic_log('LOSI02000')
-        er_list = list(EventsRequest.objects.filter(status=PROCESSING, retry_cnt__lt=retry_max).order_by('request_id'))
-        multi(er_list, RECOVER, now)
-        #--------------------------
-        #未処理のレコードを取得して処理する
+        # 常駐モード
         #--------------------------
-        logger.logic_log('LOSI02001')
-        er_list = list(EventsRequest.objects.filter(status=UNPROCESS).order_by('request_id'))
-        multi(er_list, NORMAL, now)
+        if '--daemon' in sys.argv:
+            AgentDaemon(run_interval).run()
 
         #--------------------------
-        #コリレーション情報をチェック
+        # 1回実行モード
         #--------------------------
-        check_rhdm_response_correlation(now)
+        else:
+            try:
+                run_cycle(load_agent_settings())
+
+            finally:
+                NotifyOutbox.stop()
 
     except Exception as e:
         logger.logic_log('LOSE02009', traceback.format_exc())
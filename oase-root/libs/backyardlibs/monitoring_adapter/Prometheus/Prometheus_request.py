@@ -37,23 +37,12 @@ from django.urls import reverse
 
 from libs.commonlibs.oase_logger import OaseLogger
 from libs.backyardlibs.monitoring_adapter.oase_monitoring_adapter_common_libs import _produce
-from libs.backyardlibs.monitoring_adapter.oase_monitoring_adapter_common_libs import _rabbitMQ_conf
 from libs.webcommonlibs.events_request import EventsRequestCommon
 
 urllib3.disable_warnings(InsecureRequestWarning)
 ssl._create_default_https_context = ssl._create_unverified_context
 logger = OaseLogger.get_instance()
 
-# 設定情報読み込み
-_mq_settings = None
-
-# RabbitMQ接続
-_channel    = None
-_connection = None
-_properties = None
-
-mq_lock = multiprocessing.Lock()
-
 
 def send_request(request_data_dic):
     """
@@ -84,17 +73,14 @@ def send_request(request_data_dic):
             logger.system_log('LOSM30028')
             raise
 
+        publish_list = []
         for i, data in enumerate(request_data_dic['request']):
 
             data['traceid'] = trace_id_list[i]
-            data = json.dumps(data)
-
-            _rabbitMQ_conf()
+            publish_list.append(json.dumps(data))
 
-            # RabbitMQへ送信
-            mq_lock.acquire()
-            _produce(data)
-            mq_lock.release()
+        # RabbitMQへまとめて送信
+        _produce(publish_list)
 
 
     except Exception as e:
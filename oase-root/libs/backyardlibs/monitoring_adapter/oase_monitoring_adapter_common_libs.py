@@ -24,79 +24,15 @@
 
 
 """
-import pika
-from retry import retry
-from libs.commonlibs.oase_logger import OaseLogger
-from libs.commonlibs.rabbitmq import RabbitMQ
+from libs.commonlibs.rabbitmq import RabbitMQPublisher
 
-logger = OaseLogger.get_instance() # ロガー初期化
 
-# 設定情報読み込み
-_mq_settings = None
-
-# RabbitMQ接続
-_channel    = None
-_connection = None
-_properties = None
-
-
-@retry(tries=3, delay=0.5)
-def _produce(json_str):
+def _produce(json_list):
     """
     [概要]
-        RabbitMQへの接続
-        retryデコレータにより、接続エラーが発生した場合はdelay秒間隔でtries回数、再接続を試みる
-        tries回数試行しても繋がらなかった場合は呼び元のexceptに飛ぶ
+        RabbitMQへの送信
+        スレッド毎の接続を使い、まとめて送信する
+        再接続を試みても送信できなかった場合は呼び元のexceptに飛ぶ
     """
-    try:
-        global _channel
-        global _connection
-        global _mq_settings
-        global _properties
-
-        _channel.queue_bind(exchange='amq.direct', queue=_mq_settings['queuename'], routing_key=_mq_settings['queuename'])
-
-        _channel.basic_publish(exchange='amq.direct',
-            routing_key=_mq_settings['queuename'],
-            body=json_str,
-            properties=_properties)
-
-    except pika.exceptions.AMQPConnectionError:
-        _channel = None
-        _rabbitMQ_conf()
-
-        #continue
-        raise Exception
-
-    except Exception as e:
-        raise
-
-
-def _rabbitMQ_conf():
-    """
-    [概要]
-        RabbitMQ接続に関しての設定を行う
-    """
-    global _channel
-    global _connection
-    global _mq_settings
-    global _properties
-
-    try:
-        if _channel is None:
-            # 設定情報読み込み
-            _mq_settings = RabbitMQ.settings()
-
-            # RabbitMQ接続
-            _channel, _connection = RabbitMQ.connect(_mq_settings)
-
-            # キューに接続
-            _channel.queue_declare(queue=_mq_settings['queuename'], durable=True)
-
-            _properties = pika.BasicProperties(
-                content_type='application/json',
-                content_encoding='utf-8',
-                delivery_mode=2)
 
-    except Exception as e:
-        logger.system_log('LOSM13024', traceback.format_exc())
+    RabbitMQPublisher.publish(json_list)
@@ -24,14 +24,20 @@
 import time
 import sys
 import os
+import re
+import json
+import atexit
+import queue
 import inspect
 import traceback
 import pytz
 import datetime
-from logging import DEBUG, WARNING
+from logging import DEBUG, INFO, WARNING, ERROR
 from logging import getLogger
+from logging import makeLogRecord
 from logging import Formatter
 from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener
 
 my_path = os.path.dirname(os.path.abspath(__file__))
 tmp_path = my_path.split('oase-root')
@@ -58,6 +64,182 @@ class OaseLoggerFormatter(Formatter):
         return ct
 
 
+# ログメッセージからトレースIDを抽出するパターン(EventsRequestCommon.generate_trace_id の採番形式)
+TRACE_ID_PATTERN = re.compile(r'TOS_\d{20}_\d{10}')
+
+
+class OaseJsonFormatter(OaseLoggerFormatter):
+    """
+    [概要]
+        JSON Lines形式のログフォーマッタ
+
+        トレースIDは、ログ出力時に指定されていない場合はメッセージから抽出する
+    """
+
+    def __init__(self, component):
+
+        super().__init__(datefmt='%Y/%m/%d %H:%M:%S.%f')
+        self.component = component
+
+    def format(self, record):
+
+        message = record.getMessage()
+        if record.exc_info:
+            message = '%s\n%s' % (message, self.formatException(record.exc_info))
+
+        trace_id = getattr(record, 'trace_id', None)
+        if not trace_id:
+            match = TRACE_ID_PATTERN.search(message)
+            trace_id = match.group(0) if match else None
+
+        data = {
+            'trace_id'  : trace_id,
+            'ts'        : round(record.created * 1000, 3),
+            'time'      : self.formatTime(record, self.datefmt),
+            'level'     : record.levelname,
+            'logtype'   : getattr(record, 'logtype', '').strip(),
+            'log_id'    : getattr(record, 'logid', None),
+            'component' : self.component,
+            'process'   : record.process,
+            'thread'    : record.threadName,
+            'src'       : '%s:%s:%s' % (
+                getattr(record, 'srcfilename', record.pathname),
+                getattr(record, 'srcfunc', record.funcName),
+                getattr(record, 'srcline', record.lineno),
+            ),
+        }
+
+        elapsed = getattr(record, 'elapsed', None)
+        if elapsed is not None:
+            data['elapsed_ms'] = round(elapsed * 1000, 3)
+
+        data['message'] = message
+
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LazyLogArg:
+    """
+    [概要]
+        遅延評価ログ引数
+
+        ログ出力が有効な場合のみ、メッセージ編集時に func(*args, **kwargs) を評価する
+        例) LazyLogArg(json.dumps, data, indent=4)
+    """
+
+    __slots__ = ('func', 'args', 'kwargs')
+
+    def __init__(self, func, *args, **kwargs):
+
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+
+        return str(self.func(*self.args, **self.kwargs))
+
+    def __format__(self, format_spec):
+
+        return format(str(self), format_spec)
+
+
+class OaseQueueHandler(QueueHandler):
+    """
+    [概要]
+        OASEログキューハンドラ
+
+        ログレコードをキューに格納し、書式編集とファイル出力はQueueListenerのスレッドで行う
+        キューが満杯の場合、block=True であれば空きを待ち、
+        block=False であればレコードを破棄して件数を記録する
+        (破棄件数は次にキューに格納できた時点でログ出力する)
+        fork後の子プロセスにはリスナースレッドが存在しないため、
+        生成元と異なるプロセスではon_forkで同期出力に切り替えて出力する
+    """
+
+    def __init__(self, log_queue, block=True, on_fork=None):
+
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped_count = 0
+        self.pid = os.getpid()
+        self.on_fork = on_fork
+
+    def handle(self, record):
+        """
+        [概要]
+            レコードの出力
+            fork後の子プロセスでは、親プロセスのスレッドが保持していた可能性のある
+            キューとハンドラのロックを使わず、同期出力用のハンドラに渡す
+        """
+
+        if self.pid != os.getpid() and self.on_fork:
+            for handler in self.on_fork():
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+            return True
+
+        return super().handle(record)
+
+    def prepare(self, record):
+        """
+        [概要]
+            キュー格納前のレコード編集
+            メッセージはOaseLoggerで編集済みのため、書式編集はリスナースレッドに任せる
+        """
+
+        return record
+
+    def enqueue(self, record):
+        """
+        [概要]
+            レコードをキューに格納する
+            ※Handler.handle()のロック内で呼ばれるため、破棄件数の更新は排他不要
+        """
+
+        if self.block:
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped_count += 1
+            return
+
+        if self.dropped_count > 0:
+            try:
+                self.queue.put_nowait(self.make_dropped_record(record))
+                self.dropped_count = 0
+
+            except queue.Full:
+                pass
+
+    def make_dropped_record(self, record):
+        """
+        [概要]
+            破棄件数通知用のレコードを作成する
+        """
+
+        log_id = 'LOSM00047'
+
+        return makeLogRecord({
+            'name'        : record.name,
+            'levelno'     : ERROR,
+            'levelname'   : 'ERROR',
+            'msg'         : OASELogID.Ary[log_id].format(self.dropped_count),
+            'logtype'     : 'system',
+            'logid'       : log_id,
+            'uid'         : 0,
+            'sid'         : '-',
+            'srcfilename' : os.path.abspath(__file__),
+            'srcfunc'     : 'enqueue',
+            'srcline'     : 0,
+        })
+
+
 class OaseLogger:
     """
     [概要]
@@ -68,6 +250,23 @@ class OaseLogger:
 
     __instance = None
 
+    # 環境変数LOG_LEVEL毎のDEBUG用ログの出力レベル(未指定時はDEBUG)
+    # NORMALはエラーと運用情報(INFO_LOG_ID_LIST)のみを出力する
+    DEBUG_LOG_LEVEL = {
+        'NORMAL' : INFO,
+        'DEBUG'  : DEBUG,
+        'TRACE'  : DEBUG,
+    }
+
+    # LOG_LEVEL=NORMALでもDEBUG用ログに出力する運用情報のログID
+    # (ワーカープール起動、設定の再読み込み、周期毎の処理性能、同時リクエスト数の変更)
+    INFO_LOG_ID_LIST = frozenset([
+        'LOSI01010',
+        'LOSI02009',
+        'LOSI02010',
+        'LOSI02011',
+    ])
+
     def __new__(cls):
 
         raise Exception('not allowed')
@@ -109,10 +308,23 @@ class OaseLogger:
         log_when = 'MIDNIGHT'
         log_interval = 1
         debug_log_max_bytes = 10000000
+        debug_log_level = OaseLogger.DEBUG_LOG_LEVEL.get(os.environ.get('LOG_LEVEL', 'DEBUG'), DEBUG)
+
+        # 非同期出力のキューサイズ(0:同期出力)と、キューが満杯の場合の動作(BLOCK:空きを待つ / DROP:破棄する)
+        log_queue_size = int(os.environ.get('LOG_QUEUE_SIZE', 0))
+        log_queue_block = os.environ.get('LOG_QUEUE_POLICY', 'BLOCK').upper() != 'DROP'
+
+        # JSON Lines形式のログ出力有無(1:出力する)
+        log_json_output = os.environ.get('LOG_JSON_OUTPUT', '0') == '1'
 
         try:
             # エラー時の内容記録変数
             self.__last_error_message = ""
+            self.__listener = None
+            self.__listener_pid = None
+            self.__queue_handler = None
+            self.__debug_handlers = []
+            self.__observational_handler = None
 
             #---------------------------
             #出力フォーマット設定
@@ -148,6 +360,20 @@ class OaseLogger:
             debug_handler.setFormatter(debug_formatter)
             debug_handler.setLevel(DEBUG)
 
+            debug_handlers = [debug_handler, ]
+            if log_json_output:
+                json_dir_name = dir_name + '/json'
+                json_log_file_path = os.path.join(json_dir_name, os.path.splitext(base_name)[0] + '.jsonl')
+                if not os.path.exists(json_dir_name):
+                    os.mkdir(json_dir_name)
+                json_handler = JsonLinesRotatingFileHandler(
+                    filename=json_log_file_path, when=log_when, interval=log_interval,
+                    backup_count=log_backup_count, encoding='utf-8', max_bytes=debug_log_max_bytes
+                )
+                json_handler.setFormatter(OaseJsonFormatter(logger_name))
+                json_handler.setLevel(DEBUG)
+                debug_handlers.append(json_handler)
+
             #---------------------------
             #ロガー作成
             #---------------------------
@@ -162,15 +388,112 @@ class OaseLogger:
             if not parent_logger.hasHandlers():
                 parent_logger.addHandler(observational_handler)
                 parent_logger.setLevel(WARNING)
-                self.__logger.addHandler(debug_handler)
-                self.__logger.setLevel(DEBUG)
+                self.__logger.setLevel(debug_log_level)
+
+                if log_queue_size > 0:
+                    self.__start_listener(log_queue_size, log_queue_block, debug_handlers, observational_handler)
+                else:
+                    for handler in debug_handlers:
+                        self.__logger.addHandler(handler)
 
         except Exception as ex:
             # エラー時の内容記録
             self.__last_error_message = str(ex)
             raise
 
-    def system_log(self, log_id, *args, request=None):
+    def __start_listener(self, log_queue_size, log_queue_block, debug_handlers, observational_handler):
+        """
+        [概要]
+            非同期出力の開始
+            ログ出力元のスレッドではキューへの格納のみを行い、
+            書式編集とファイル出力はリスナースレッドで行う
+
+        [引数]
+            log_queue_size       : キューサイズ
+            log_queue_block      : キューが満杯の場合に空きを待つか否か
+            debug_handlers       : DEBUG用ログのハンドラのリスト
+            observational_handler: 監視用ログのハンドラ
+        """
+
+        queue_handler = OaseQueueHandler(queue.Queue(log_queue_size), block=log_queue_block, on_fork=self.reset_after_fork)
+
+        self.__listener = QueueListener(
+            queue_handler.queue, *debug_handlers, observational_handler, respect_handler_level=True
+        )
+        self.__listener.start()
+        self.__listener_pid = os.getpid()
+        self.__queue_handler = queue_handler
+        self.__debug_handlers = debug_handlers
+        self.__observational_handler = observational_handler
+        atexit.register(self.stop_listener)
+
+        # 監視用ログへの出力もリスナースレッドで行うため、親ロガーには伝播させない
+        self.__logger.propagate = False
+        self.__logger.addHandler(queue_handler)
+
+        # os.register_at_forkのない環境(Python3.6)では、
+        # 子プロセスでの初回出力時、または、reset_after_fork()の呼び出しで同期出力に戻す
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def reset_after_fork(self):
+        """
+        [概要]
+            fork後の子プロセスで同期出力に戻す
+            子プロセスにはリスナースレッドが存在しないため、キューに格納したログは出力されない
+            親プロセスのスレッドが保持したままのロックを引き継がないよう、ハンドラのロックも作り直す
+            (非同期出力でない場合、および、非同期出力を開始したプロセスでは何もしない)
+
+        [引数]
+            なし
+
+        [戻り値]
+            list 同期出力用のハンドラ
+        """
+
+        if self.__observational_handler is None:
+            return []
+
+        sync_handlers = self.__debug_handlers + [self.__observational_handler, ]
+
+        queue_handler = self.__queue_handler
+        if queue_handler is None or self.__listener_pid == os.getpid():
+            return sync_handlers
+
+        self.__queue_handler = None
+        self.__listener = None
+        self.__listener_pid = os.getpid()
+
+        for handler in sync_handlers:
+            handler.createLock()
+
+        # 監視用ログは親ロガーへの伝播で出力する
+        self.__logger.removeHandler(queue_handler)
+        for handler in self.__debug_handlers:
+            self.__logger.addHandler(handler)
+        self.__logger.propagate = True
+
+        return sync_handlers
+
+    def stop_listener(self):
+        """
+        [概要]
+            非同期出力の停止
+            キューに残っているログを出力してからリスナースレッドを停止する
+
+        [引数]
+            なし
+
+        [戻り値]
+            
+        """
+
+        listener = self.__listener
+        self.__listener = None
+        if listener:
+            listener.stop()
+
+    def system_log(self, log_id, *args, request=None, trace_id=None, elapsed=None):
         """
         [概要]
             システムレベルログ
@@ -178,6 +501,9 @@ class OaseLogger:
         [引数]
             log_id: ログID
             *args:  ログIDに対応したメッセージに {} がある場合、{} を置き換える値の変数列
+                    (LazyLogArg を指定した場合は、ログ出力が有効な場合のみ評価する)
+            trace_id: トレースID(JSON Lines形式のログ用。省略時はメッセージから抽出する)
+            elapsed:  処理時間(秒)(JSON Lines形式のログ用)
 
         [戻り値]
             
@@ -186,6 +512,10 @@ class OaseLogger:
 
         self.__last_error_message = ""
 
+        level = ERROR if log_id[3] == 'E' or log_id[3] == 'M' else self._get_info_level(log_id)
+        if not self.__logger.isEnabledFor(level):
+            return
+
         log_message = self._get_logmessage(log_id, *args)
 
         caller_frame = inspect.currentframe().f_back
@@ -199,17 +529,14 @@ class OaseLogger:
         if request and hasattr(request, 'session') and hasattr(request.session, 'session_key'):
             sid = request.session.session_key
 
-        ids = {'logtype':'system', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline}
+        ids = {'logtype':'system', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline, 'trace_id':trace_id, 'elapsed':elapsed}
         try:
-            if log_id[3] == 'E' or log_id[3] == 'M':
-                self.__logger.error(log_message, extra=ids)
-            else:
-                self.__logger.debug(log_message, extra=ids)
+            self.__logger.log(level, log_message, extra=ids)
         except Exception as ex:
             # エラー時の内容記録
             self.__last_error_message = str(ex)
 
-    def user_log(self, log_id, *args, request=None):
+    def user_log(self, log_id, *args, request=None, trace_id=None, elapsed=None):
         """
         [概要]
             ユーザレベルログ
@@ -217,6 +544,9 @@ class OaseLogger:
         [引数]
             log_id: ログID
             *args:  ログIDに対応したメッセージに {} がある場合、{} を置き換える値の変数列
+                    (LazyLogArg を指定した場合は、ログ出力が有効な場合のみ評価する)
+            trace_id: トレースID(JSON Lines形式のログ用。省略時はメッセージから抽出する)
+            elapsed:  処理時間(秒)(JSON Lines形式のログ用)
 
         [戻り値]
             
@@ -224,6 +554,10 @@ class OaseLogger:
 
         self.__last_error_message = ""
 
+        level = ERROR if log_id[3] == 'E' else DEBUG
+        if not self.__logger.isEnabledFor(level):
+            return
+
         log_message = self._get_logmessage(log_id, *args)
 
         caller_frame = inspect.currentframe().f_back
@@ -237,17 +571,14 @@ class OaseLogger:
         if request and hasattr(request, 'session') and hasattr(request.session, 'session_key'):
             sid = request.session.session_key
 
-        ids = {'logtype':'user  ', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline}
+        ids = {'logtype':'user  ', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline, 'trace_id':trace_id, 'elapsed':elapsed}
         try:
-            if log_id[3] == 'E':
-                self.__logger.error(log_message, extra=ids)
-            else:
-                self.__logger.debug(log_message, extra=ids)
+            self.__logger.log(level, log_message, extra=ids)
         except Exception as ex:
             # エラー時の内容記録
             self.__last_error_message = str(ex)
 
-    def logic_log(self, log_id, *args, request=None):
+    def logic_log(self, log_id, *args, request=None, trace_id=None, elapsed=None):
         """
         [概要]
             ロジックレベルログ
@@ -255,6 +586,9 @@ class OaseLogger:
         [引数]
             log_id: ログID
             *args:  ログIDに対応したメッセージに {} がある場合、{} を置き換える値の変数列
+                    (LazyLogArg を指定した場合は、ログ出力が有効な場合のみ評価する)
+            trace_id: トレースID(JSON Lines形式のログ用。省略時はメッセージから抽出する)
+            elapsed:  処理時間(秒)(JSON Lines形式のログ用)
 
         [戻り値]
             
@@ -262,6 +596,10 @@ class OaseLogger:
 
         self.__last_error_message = ""
 
+        level = self._get_info_level(log_id)
+        if not self.__logger.isEnabledFor(level):
+            return
+
         log_message = self._get_logmessage(log_id, *args)
 
         caller_frame = inspect.currentframe().f_back
@@ -275,13 +613,41 @@ class OaseLogger:
         if request and hasattr(request, 'session') and hasattr(request.session, 'session_key'):
             sid = request.session.session_key
 
-        ids = {'logtype':'logic ', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline}
+        ids = {'logtype':'logic ', 'logid':log_id, 'uid':uid, 'sid':sid, 'srcfilename':srcfilename, 'srcfunc':srcfunc, 'srcline':srcline, 'trace_id':trace_id, 'elapsed':elapsed}
         try:
-            self.__logger.debug(log_message, extra=ids)
+            self.__logger.log(level, log_message, extra=ids)
         except Exception as ex:
             # エラー時の内容記録
             self.__last_error_message = str(ex)
 
+    def is_debug_enabled(self):
+        """
+        [概要]
+            DEBUGレベルのログ出力可否を返す
+
+        [引数]
+            なし
+
+        [戻り値]
+            bool
+        """
+
+        return self.__logger.isEnabledFor(DEBUG)
+
+    def _get_info_level(self, log_id):
+        """
+        [概要]
+            エラー以外のログの出力レベルを返す
+
+        [引数]
+            log_id: ログID
+
+        [戻り値]
+            int 運用情報のログIDはINFO、それ以外はDEBUG
+        """
+
+        return INFO if log_id in self.INFO_LOG_ID_LIST else DEBUG
+
     def _get_logmessage(self, log_id, *args):
         """
         [概要]
@@ -375,30 +741,74 @@ class OaseLogger:
 https://stackoverflow.com/questions/6167587/the-logging-handlers-how-to-rollover-after-time-or-maxbytes
 """
 class EnhancedRotatingFileHandler(TimedRotatingFileHandler):
+
+    # seconds between re-reading the actual file size
+    SIZE_SYNC_INTERVAL = 1.0
+
     def __init__(self, filename, when='h', interval=1, backup_count=0, encoding=None, delay=0, utc=0, max_bytes=0):
         """
         This is just a combination of TimedRotatingFileHandler and RotatingFileHandler
         (adds max_bytes to TimedRotatingFileHandler)
         """
 
+        self.stream_size = 0
+        self.size_synced_at = 0
         TimedRotatingFileHandler.__init__(self, filename, when, interval, backup_count, encoding, delay, utc)
         self.max_bytes = max_bytes
 
-    def shouldRollover(self, record):
+    def _open(self):
+        """
+        Open the stream and take the current file size as the starting point
+        of the incremental size tracking.
+        """
+        stream = TimedRotatingFileHandler._open(self)
+        self.stream_size = os.fstat(stream.fileno()).st_size
+        self.size_synced_at = time.time()
+        return stream
+
+    def emit(self, record):
+        """
+        Emit a record.
+
+        The record is formatted only once, and its encoded size is added to
+        the tracked file size instead of seeking to the end of the file.
+        """
+        try:
+            msg = self.format(record) + self.terminator
+            msg_size = len(msg.encode(self.encoding or 'utf-8', 'replace'))
+            if self.shouldRollover(record, msg_size):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self.flush()
+            self.stream_size += msg_size
+        except Exception:
+            self.handleError(record)
+
+    def shouldRollover(self, record, msg_size=None):
         """
         Determine if rollover should occur.
 
         Basically, see if the supplied record would cause the file to exceed
         the size limit we have.
 
+        The file size is tracked incrementally, and is re-read from the file
+        every SIZE_SYNC_INTERVAL seconds so that writes from other processes
+        sharing the same file are also taken into account.
+
         we are also comparing times
         """
         if self.stream is None:                 # delay was set...
             self.stream = self._open()
         if self.max_bytes > 0:                   # are we rolling over?
-            msg = "%s\n" % self.format(record)
-            self.stream.seek(0, 2)  #due to non-posix-compliant Windows feature
-            if self.stream.tell() + len(msg) >= self.max_bytes:
+            if msg_size is None:
+                msg_size = len(("%s\n" % self.format(record)).encode(self.encoding or 'utf-8', 'replace'))
+            now = time.time()
+            if now - self.size_synced_at >= self.SIZE_SYNC_INTERVAL:
+                self.stream_size = os.fstat(self.stream.fileno()).st_size
+                self.size_synced_at = now
+            if self.stream_size + msg_size >= self.max_bytes:
                 return 1
         t = int(time.time())
         if t >= self.rolloverAt:
@@ -440,12 +850,16 @@ class EnhancedRotatingFileHandler(TimedRotatingFileHandler):
                 dfn2 = "%s.%03d" % (dfn, cnt)
                 cnt += 1
             os.rename(self.baseFilename, dfn2)
+            self.on_rotate(dfn2)
             for s in self.get_files_to_delete():
                 os.remove(s)
+                self.on_delete(s)
         else:
             if os.path.exists(dfn):
                 os.remove(dfn)
+                self.on_delete(dfn)
             os.rename(self.baseFilename, dfn)
+            self.on_rotate(dfn)
         #print "%s -> %s" % (self.baseFilename, dfn)
         self.mode = 'w'
         self.stream = self._open()
@@ -491,3 +905,77 @@ class EnhancedRotatingFileHandler(TimedRotatingFileHandler):
             for key in delete_keys:
                 result.extend(target_holder[key])
         return result
+
+    def on_rotate(self, rotated_path):
+        """
+        Called after the current file has been renamed to rotated_path.
+        """
+        pass
+
+    def on_delete(self, deleted_path):
+        """
+        Called after an old rotated file has been deleted.
+        """
+        pass
+
+
+class JsonLinesRotatingFileHandler(EnhancedRotatingFileHandler):
+    """
+    JSON Lines log file handler.
+
+    When a file is rotated, a sidecar index mapping each trace_id to the
+    byte offsets of its lines is written to the "index" directory next to
+    the log file, so that a trace can be looked up without scanning the
+    rotated files.
+    """
+
+    INDEX_DIR = 'index'
+
+    @classmethod
+    def get_index_path(cls, log_path):
+        """
+        Return the path of the sidecar index for log_path.
+        """
+        dir_name, base_name = os.path.split(log_path)
+        return os.path.join(dir_name, cls.INDEX_DIR, base_name + '.idx')
+
+    @classmethod
+    def build_index(cls, log_path):
+        """
+        Scan log_path and return {trace_id: [offset, ...]}.
+        """
+        index = {}
+        offset = 0
+        with open(log_path, 'rb') as f:
+            for line in f:
+                try:
+                    trace_id = json.loads(line.decode('utf-8', 'replace')).get('trace_id')
+                except ValueError:
+                    trace_id = None
+                if trace_id:
+                    index.setdefault(trace_id, []).append(offset)
+                offset += len(line)
+        return index
+
+    def on_rotate(self, rotated_path):
+        """
+        Write the sidecar index of the rotated file.
+        If it fails, the file is simply scanned when looked up.
+        """
+        index_path = self.get_index_path(rotated_path)
+        try:
+            index = self.build_index(rotated_path)
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, separators=(',', ':'))
+        except (OSError, ValueError):
+            if os.path.exists(index_path):
+                os.remove(index_path)
+
+    def on_delete(self, deleted_path):
+        """
+        Remove the sidecar index of the deleted file.
+        """
+        index_path = self.get_index_path(deleted_path)
+        if os.path.exists(index_path):
+            os.remove(index_path)
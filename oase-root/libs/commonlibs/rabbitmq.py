@@ -20,10 +20,16 @@
 """
 
 
+import time
 import pika
+import threading
+import traceback
 from django.conf import settings
 from web_app.models.models import System
 from libs.commonlibs.aes_cipher import AESCipher
+from libs.commonlibs.oase_logger import OaseLogger
+
+logger = OaseLogger.get_instance() # ロガー初期化
 
 cipher = AESCipher(settings.AES_KEY)
 
@@ -70,3 +76,130 @@ class RabbitMQ:
 
         return channel, connection
 
+
+class RabbitMQPublisher:
+    """
+    [クラス概要]
+      イベントリクエストのRabbitMQ送信クラス
+      スレッド毎に接続とチャネルを保持し、スレッド間でロックせずに送信する。
+      チャネルはトランザクションモードとし、まとめて送信したメッセージを1回のコミットで
+      ブローカーに受理させる(コミットの応答は永続化後のため、往復はコミット毎に1回となる)。
+      キューの宣言とバインドはプロセスで最初の接続時に1度だけ行う。
+    """
+
+    EXCHANGE = 'amq.direct'
+    RETRY_MAX   = 3
+    RETRY_DELAY = 0.5
+
+    # 1回のコミットで送信するメッセージ数の上限
+    COMMIT_SIZE = 1000
+
+    PROPERTIES = pika.BasicProperties(
+        content_type='application/json',
+        content_encoding='utf-8',
+        delivery_mode=2)
+
+    _lock     = threading.Lock()
+    _local    = threading.local()
+    _settings = None
+    _declared = False
+
+
+    @classmethod
+    def _get_channel(cls):
+        """
+        [概要]
+          実行中スレッドのチャネルを取得する(未接続、切断済みの場合は接続する)
+        """
+
+        channel = getattr(cls._local, 'channel', None)
+        if channel is not None and channel.is_open:
+            return channel
+
+        cls._discard()
+
+        with cls._lock:
+            if cls._settings is None:
+                cls._settings = RabbitMQ.settings()
+
+            mq_settings = cls._settings
+
+        channel, connection = RabbitMQ.connect(mq_settings)
+        cls._local.channel    = channel
+        cls._local.connection = connection
+
+        with cls._lock:
+            if not cls._declared:
+                queuename = mq_settings['queuename']
+                channel.queue_declare(queue=queuename, durable=True)
+                channel.queue_bind(exchange=cls.EXCHANGE, queue=queuename, routing_key=queuename)
+                cls._declared = True
+
+        channel.tx_select()
+
+        return channel
+
+
+    @classmethod
+    def _discard(cls):
+        """
+        [概要]
+          実行中スレッドの接続を破棄する
+        """
+
+        connection = getattr(cls._local, 'connection', None)
+        cls._local.channel    = None
+        cls._local.connection = None
+
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception as e:
+                pass
+
+
+    @classmethod
+    def publish(cls, body_list):
+        """
+        [概要]
+          メッセージをまとめて送信する
+          COMMIT_SIZE 件毎にコミットし、接続エラーの場合は再接続してコミット済みでないメッセージから再送する
+          コミット中の切断ではブローカーが受理済みか判別できないため、
+          同じメッセージを重複して送信することがある(少なくとも1回の配信)
+          RETRY_MAX 回試行しても送信できなかった場合は例外を送出する
+          (例外の属性 sent にコミット済みの件数を設定する。先頭から sent 件はブローカーが受理済み)
+        [引数]
+          body_list : 送信するメッセージ(JSON文字列)のリスト
+        [戻り値]
+          int : 送信件数
+        """
+
+        sent = 0
+        for i in range(cls.RETRY_MAX):
+            try:
+                channel = cls._get_channel()
+                routing_key = cls._settings['queuename']
+
+                while sent < len(body_list):
+                    chunk = body_list[sent:sent + cls.COMMIT_SIZE]
+                    for body in chunk:
+                        channel.basic_publish(
+                            exchange=cls.EXCHANGE,
+                            routing_key=routing_key,
+                            body=body,
+                            properties=cls.PROPERTIES)
+
+                    channel.tx_commit()
+                    sent += len(chunk)
+
+                return sent
+
+            except pika.exceptions.AMQPError as e:
+                cls._discard()
+                logger.system_log('LOSM13024', traceback.format_exc())
+
+                if i + 1 >= cls.RETRY_MAX:
+                    e.sent = sent
+                    raise
+
+                time.sleep(cls.RETRY_DELAY)
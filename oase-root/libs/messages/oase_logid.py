@@ -160,6 +160,7 @@ class OASELogID:
     Ary['LOSM00044'] = "No value for WORKFLOW_ID. (check_info: {})"
     Ary['LOSM00045'] = "No value for WORK_NOTES_APPROVAL. (check_info: {})"
     Ary['LOSM00046'] = "No value for WORK_NOTES_REJECTED. (check_info: {})"
+    Ary['LOSM00047'] = "Log records were dropped because the log queue was full. (count:{})"
     Ary['LOSM00100'] = "RuleType does not exist. (rule_type_id: {}, {})"
     Ary['LOSM00101'] = "ConditionalExpression does not exist. (conditional_expression_id: {})"
     Ary['LOSM00102'] = "Failed to get data from the OASE_T_CONDITIONAL_EXPRESSION table. (conditional_expression_id: {}, {})"
@@ -181,6 +182,7 @@ class OASELogID:
     Ary['LOSM01015'] = "Failed do_exastro()"
     Ary['LOSM01016'] = "ActionHistory does not exist. (TraceID:{}, ResponseID:{}, ExeOrder:{})"
     Ary['LOSM01017'] = "Failed regist_exastro()"
+    Ary['LOSM01018'] = "Action worker terminated abnormally. (TraceID:{}, ExitCode:{})"
     Ary['LOSM01100'] = "Invalid type, preaction info. TraceID:{}, ResponseID:{}, ExecOrder:{}, Type:{}, Info:{}"
     Ary['LOSM01101'] = "Menu ID does not exists in ITA. (TraceID:{}, ResponseID:{}, ExecOrder:{}, MenuID:{})"
     Ary['LOSM01102'] = "Invalid type, postaction info. TraceID:{}, ResponseID:{}, ExecOrder:{}, Type:{}, Info:{}"
@@ -196,6 +198,8 @@ class OASELogID:
     Ary['LOSM01501'] = "ServiceNowActionHistory does not exist. (TraceID: {}, history_id: {})"
     Ary['LOSM01502'] = "{} request send failed, to ServiceNow. (TraceID: {}, Traceback: {})"
     Ary['LOSM02001'] = "Error has occurred. (TraceID: {}, Traceback: {})"
+    Ary['LOSM02002'] = "Failed to notify unknown event. (TraceID: {}, Traceback: {})"
+    Ary['LOSM02003'] = "Failed to send pending unknown event notifications. (Traceback: {})"
     Ary['LOSM03001'] = "Unexpected request status. (req_sts:{}, expect_sts:{})"
     Ary['LOSM03002'] = "Unexpected request type. (req_type:{}, expect_type:{})"
     Ary['LOSM03003'] = "Error in Apply side. (msg_id:{})"
@@ -362,6 +366,7 @@ class OASELogID:
     Ary['LOSM13028'] = "Unmatch, Number of event information elements. (RuleTypeID:{}, RequestNum:{}, NeedNum:{})"
     Ary['LOSM13029'] = "Unexpected error. (Detail:{})"
     Ary['LOSM13030'] = "Invalid rule_type_id. (rule_type_id:{}, menu_id:{}, group_id:{})"
+    Ary['LOSM13031'] = "Failed to check the version of rule type information. (Detail:{})"
     Ary['LOSM14001'] = "Invalid request. (req_keys:{}, need_keys{})"
     Ary['LOSM14002'] = "Invalid request. Nothing \"{}\"."
     Ary['LOSM14003'] = "Validation error. (Message:{})"
@@ -522,6 +527,9 @@ class OASELogID:
     Ary['LOSI01007'] = "Check Retry status and count. TraceID[{}], status[{}], retry[{}/{}]"
     Ary['LOSI01008'] = "This Action is not retry-status. TraceID[{}], ResponseID[{}], ExeOrder[{}]"
     Ary['LOSI01009'] = "Retry interval. TraceID[{}], ResponseID[{}], ExeOrder[{}], Interval[{}], StartTime[{}]"
+    Ary['LOSI01010'] = "Action worker pool start. workers[{}], queue_max[{}], max_tasks[{}]"
+    Ary['LOSI01011'] = "Skip the record processed by another host. TraceID[{}]"
+    Ary['LOSI01012'] = "Refresh the lease of running actions. (count:{})"
     Ary['LOSI01100'] = "OASE_T_ACTION_HISTORY select. count: [{}], TraceID: [{}]"
     Ary['LOSI01101'] = "OASE_T_RHDM_RESPONSE_ACTION select. count: [{}], TraceID: [{}]"
     Ary['LOSI01102'] = "Analyze action information. execution_order: [{}], TraceID: [{}]"
@@ -562,6 +570,12 @@ class OASELogID:
     Ary['LOSI02006'] = "Correlation info. TraceID:{}, Info:{}"
     Ary['LOSI02007'] = "State transition, OASE_T_RHDM_RESPONSE_ACTION. rule_type_id:{}, request_type_id:{}, group:{}, run_ids:{}, delete_ids:{}"
     Ary['LOSI02008'] = "State to run, OASE_T_RHDM_RESPONSE. ids:{}"
+    Ary['LOSI02009'] = "Reload agent settings. (previous version:{})"
+    Ary['LOSI02010'] = "Agent cycle metrics. (events:{}, elapsed:{}s, throughput:{}/s, dm_requests:{}, dm_errors:{}, dm_latency_avg:{}s, concurrency:{}/{})"
+    Ary['LOSI02011'] = "DM concurrency changed. ({} -> {}, error_rate:{}, latency_avg:{}s, latency_base:{}s)"
+    Ary['LOSI02012'] = "Skip the request processed by another host. (TraceID:{}, mode:{})"
+    Ary['LOSI02013'] = "Claim requests. (mode:{}, fetched:{}, updated:{}, claimed:{})"
+    Ary['LOSI02014'] = "Skip writing the result of the request claimed by another host. (TraceID:{}, status:{})"
     Ary['LOSI03000'] = "Request parameter. ({})"
     Ary['LOSI03001'] = "Can not change status. ({})"
     Ary['LOSI04000'] = "Update process for already deleted records (group_id:{})"
@@ -644,8 +658,9 @@ class OASELogID:
     Ary['LOSI13023'] = "Bulk Events Request processing Start."
     Ary['LOSI13024'] = "Event Request processing End. (ErrorFlag:{})"
     Ary['LOSI13025'] = "This Backend denied. (Path:{}, Backend:{})"
-    Ary['LOSI13026'] = "Initialize token info. (token_info:{})"
+    Ary['LOSI13026'] = "Initialize token info. (count:{})"
     Ary['LOSI13027'] = "Checked a request token. (TraceID:{}, sts:{}, msg:{})"
+    Ary['LOSI13028'] = "Reloaded rule type information. (count:{})"
     Ary['LOSI14001'] = "Does not have {} authority. [rule_type_id:{}, auth_rule_ids:{}]"
     Ary['LOSI16001'] = "Mail Template Modify. Update ID:{}, Delete ID:{}. (user_id: {})"
     Ary['LOSI16002'] = "Request ID does not exist. (ID:{}, user_id:{})"
@@ -38,13 +38,13 @@ from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth import load_backend
-from django.db.models.aggregates import Count
 
 from libs.commonlibs import define as defs
 from libs.commonlibs.oase_logger import OaseLogger
 from libs.webcommonlibs.common import get_client_ipaddr, TimeConversion
 from libs.webcommonlibs.user_config import UserConfig
-from web_app.models.models import User, PasswordHistory, BlackListIPAddress, WhiteListIPAddress, System
+from libs.webcommonlibs.ip_address_list import IPAddressList
+from web_app.models.models import User, PasswordHistory, System
 
 
 logger = OaseLogger.get_instance() # ロガー初期化
@@ -113,25 +113,17 @@ class SimpleMiddleware:
         """
         [メソッド概要]
           ブラックリストチェック処理
+          リストはプロセス内にキャッシュした照合クラスで判定する
         [引数]
           ipaddr     : アクセス元のIPアドレス
         [戻り値]
           なし
         """
-        whiteip_list = list(WhiteListIPAddress.objects.all().values_list('ipaddr', flat=True))
-        if not self._check_list(ipaddr, whiteip_list, 'White'):
+        white_list, black_list = IPAddressList.get_matchers()
+        if not self._check_list(ipaddr, white_list, 'White'):
 
             # アクセス元IPアドレスのブラックリストチェック
-            black_ipaddr_list = BlackListIPAddress.objects.all().values_list('ipaddr', flat=True).annotate(cnt=Count("*"))
-
-            blackip_list = []
-            for b_ip in black_ipaddr_list:
-                recent_record = list(BlackListIPAddress.objects.filter(ipaddr=b_ip).order_by('black_list_id').reverse()[:1])[0]
-
-                if recent_record.release_timestamp == None:
-                    blackip_list.append(recent_record.ipaddr)
-
-            if self._check_list(ipaddr, blackip_list, 'Black'):
+            if self._check_list(ipaddr, black_list, 'Black'):
                 logger.system_log('LOSI13004', ipaddr, )
                 return False
 
@@ -143,22 +135,14 @@ class SimpleMiddleware:
           IPリストチェック処理
         [引数]
           ipaddr     : アクセス元のIPアドレス
-          ip_list    : ブラックまたはホワイトリストのデータ
+          ip_list    : ブラックまたはホワイトリストの照合クラス
         [戻り値]
           チェック結果
         """
-        for ip in ip_list:
-
-            if ipaddr == ip:
-                logger.system_log('LOSI13010', str_type, ipaddr , ip)
-                return True
-
-            wild_position = ip.find('*')
-            sub_ip = ip[0:wild_position]
-
-            if wild_position == 0 or wild_position > 0 and ipaddr.startswith(sub_ip):
-                logger.system_log('LOSI13010', str_type, ipaddr , ip)
-                return True
+        ip = ip_list.match(ipaddr)
+        if ip is not None:
+            logger.system_log('LOSI13010', str_type, ipaddr , ip)
+            return True
 
         return False
 
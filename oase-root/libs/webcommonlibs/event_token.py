@@ -27,10 +27,15 @@
 """
 
 
+import time
+import uuid
 import pytz
+import hashlib
 import datetime
+import traceback
 
 from django.conf import settings
+from django.core.cache import cache
 
 from web_app.models.models import TokenInfo, TokenPermission, RuleType, AccessPermission
 from web_app.templatetags.common import get_message
@@ -50,6 +55,8 @@ class OASEEventToken(object):
     """
     [クラス概要]
       トークン管理クラス
+      トークンはハッシュ値をキーとしてメモリ上に保持し、リクエスト毎のDB参照は行わない。
+      トークンの変更時は memcached 上のバージョンを更新し、全WSGIプロセスに再読込させる。
     """
 
     _instance = None
@@ -69,6 +76,12 @@ class OASEEventToken(object):
     MSGID_INVALID    = "MOSJA40002"
     MSGID_PERMISSION = "MOSJA40003"
 
+    # トークン情報のバージョン(memcachedのキー)
+    VERSION_KEY = 'OASE_EVENT_TOKEN_VERSION'
+
+    # memcachedからバージョンを取得できない場合の再読込間隔(秒)
+    RELOAD_INTERVAL = 60
+
 
     ############################################
     # メソッド
@@ -106,27 +119,100 @@ class OASEEventToken(object):
 
         self.init_flag  = False
         self.token_info = {}
+        self.version    = None
+        self.load_time  = 0
+
 
+    @classmethod
+    def hash_token(cls, token):
+        """
+        [メソッド概要]
+          トークンのハッシュ値を取得する
+        """
 
-    def load_data(self):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
-        self.token_info = {}
+
+    def load_data(self, version=None):
+        """
+        [メソッド概要]
+          トークン情報を読み込む
+        """
+
+        token_info = {}
 
         # トークン情報取得
-        token_ids = []
         rset = TokenInfo.objects.all().values_list('token_id', 'token_data', 'use_start_time', 'use_end_time')
         for tkn_id, tkn, dt_from, dt_to in rset:
-            token_ids.append(tkn_id)
+            token_info[self.hash_token(tkn)] = {
+                'token_id'    : tkn_id,
+                'period_from' : dt_from,
+                'period_to'   : dt_to,
+            }
+
+        self.token_info = token_info
+        self.version    = version
+        self.load_time  = time.monotonic()
+        self.init_flag  = True
+
+        logger.logic_log('LOSI13026', len(token_info))
 
-            self.token_info[tkn] = {}
-            self.token_info[tkn]['token_id']    = tkn_id
-            self.token_info[tkn]['period_from'] = dt_from
-            self.token_info[tkn]['period_to']   = dt_to
 
+    def get_version(self):
+        """
+        [メソッド概要]
+          memcached上のバージョンを取得する(未登録の場合は登録する)
+        [戻り値]
+          str : バージョン(取得できない場合はNone)
+        """
+
+        try:
+            version = cache.get(self.VERSION_KEY)
+            if version is None:
+                cache.add(self.VERSION_KEY, uuid.uuid4().hex, None)
+                version = cache.get(self.VERSION_KEY)
+
+        except Exception as e:
+            logger.logic_log('LOSI00005', traceback.format_exc())
+            version = None
+
+        return version
+
+
+    def sync(self):
+        """
+        [メソッド概要]
+          他プロセスでトークンが変更されていれば再読込する
+        """
+
+        version = self.get_version()
+
+        if not self.init_flag:
+            self.load_data(version)
+
+        elif version is None:
+            if time.monotonic() - self.load_time >= self.RELOAD_INTERVAL:
+                self.load_data(version)
+
+        elif version != self.version:
+            self.load_data(version)
+
+
+    def notify_change(self):
+        """
+        [メソッド概要]
+          トークンの変更を全プロセスに通知し、自プロセスは直ちに再読込する
+        """
+
+        version = uuid.uuid4().hex
+        try:
+            cache.set(self.VERSION_KEY, version, None)
 
-        self.init_flag = True
+        except Exception as e:
+            logger.logic_log('LOSI00005', traceback.format_exc())
+            version = None
 
-        logger.logic_log('LOSI13026', self.token_info)
+        self.load_data(version)
 
 
     def check_request_token(self, request):
@@ -197,17 +283,18 @@ class OASEEventToken(object):
         else:
             return self.STS_NOTOKEN
 
-        # トークン読み込み
-        self.load_data()
+        # 他プロセスでの変更を反映
+        self.sync()
 
         # 登録されていないトークンは無効
-        if token not in self.token_info:
+        tkn_info = self.token_info.get(self.hash_token(token))
+        if tkn_info is None:
             return self.STS_INVALID
 
         # トークンの有効期間外は無効
         now = datetime.datetime.now(pytz.timezone('UTC'))
-        if (self.token_info[token]['period_from'] and now <  self.token_info[token]['period_from']) \
-        or (self.token_info[token]['period_to']   and now >= self.token_info[token]['period_to']):
+        if (tkn_info['period_from'] and now <  tkn_info['period_from']) \
+        or (tkn_info['period_to']   and now >= tkn_info['period_to']):
             return self.STS_INVALID
 
 
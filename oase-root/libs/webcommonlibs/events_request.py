@@ -29,14 +29,20 @@
 
 
 
+import os
+import time
 import uuid
 import pytz
 import datetime
 import traceback
+import threading
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models import aggregates
 from libs.commonlibs.oase_logger import OaseLogger
-from web_app.models.models import Count
+from web_app.models.models import Count, RuleType
 
 logger = OaseLogger.get_instance() # ロガー初期化
 
@@ -66,58 +72,131 @@ class EventsRequestCommon():
     REQUEST_ERR_EVINFO_TYPE   = 5  # イベント情報形式不正
     REQUEST_ERR_EVINFO_LENGTH = 6  # イベント情報数不正
 
+    # トレースID
+    TRACE_ID_PREFIX     = 'TOS'
+    TRACE_ID_COUNT_MAX  = 1000000000
+    TRACE_ID_BLOCK_SIZE = getattr(settings, 'TRACE_ID_BLOCK_SIZE', 10000)  # 1回の予約で確保するカウンタ数
+
+    # トレースID採番状態(プロセス単位)
+    _trace_id_lock = threading.Lock()
+    _trace_id_pid  = None
+    _trace_id_next = 0
+    _trace_id_end  = 0
+
 
     ############################################
     # メソッド
     ############################################
-    @staticmethod
-    def generate_trace_id(now=None,req=1):
+    @classmethod
+    def generate_trace_id(cls, now=None, req=1):
         """
         [メソッド概要]
           トレースIDを生成する
+          カウンタはプロセス毎にブロック単位で予約し、メモリ上で払い出す
         """
 
         trace_id_list = []
-        cnt = None
-
+        cnt_list = []
 
         try:
-            with transaction.atomic():
-                # カウント
-                count = Count.objects.select_for_update().get(pk=1)
-
-                # cntに現在の値を保持
-                cnt = count.count_number
-
-                # 1000000000超えたらリセット
-                count.count_number = (count.count_number + req) % 1000000000
-
-
-                count.save()
+            with cls._trace_id_lock:
+                # fork後の子プロセスは親プロセスの予約ブロックを使用しない
+                if cls._trace_id_pid != os.getpid():
+                    cls._trace_id_pid  = os.getpid()
+                    cls._trace_id_next = 0
+                    cls._trace_id_end  = 0
+
+                rest = req
+                while rest > 0:
+                    # 予約ブロックを使い切った場合は新たに予約
+                    if cls._trace_id_next >= cls._trace_id_end:
+                        block_size = max(cls.TRACE_ID_BLOCK_SIZE, rest)
+                        cls._trace_id_next = cls._reserve_trace_id_block(block_size)
+                        cls._trace_id_end  = cls._trace_id_next + block_size
+
+                    num = min(rest, cls._trace_id_end - cls._trace_id_next)
+                    cnt_list.extend(range(cls._trace_id_next, cls._trace_id_next + num))
+                    cls._trace_id_next += num
+                    rest -= num
 
         except Exception as e:
             logger.system_log('LOSM00038', traceback.format_exc())
             return trace_id_list
 
-        # トレースID接頭辞
-        prefix = 'TOS'
-
         # トレースID生成日時
         if not now:
-           now = datetime.datetime.now(pytz.timezone('UTC'))
+            now = datetime.datetime.now(pytz.timezone('UTC'))
 
-        for i in range(req):
-            cnt = cnt % 1000000000
-            cnt = str(cnt).zfill(10)
+        str_now = now.strftime('%Y%m%d%H%M%S%f')
+
+        for cnt in cnt_list:
+            # 1000000000超えたらリセット
+            cnt = str(cnt % cls.TRACE_ID_COUNT_MAX).zfill(10)
 
             # トレースID生成
-            trace_id_list.append('%s%s%s%s%s' % ('TOS', '_', now.strftime('%Y%m%d%H%M%S%f'), '_', cnt))
-            
-            cnt = int(cnt) + 1
+            trace_id_list.append('%s%s%s%s%s' % (cls.TRACE_ID_PREFIX, '_', str_now, '_', cnt))
 
         return trace_id_list
 
 
+    @classmethod
+    def _reserve_trace_id_block(cls, block_size):
+        """
+        [メソッド概要]
+          カウント管理からトレースID用のカウンタをブロック単位で予約する
+          呼び出し元がトランザクション中の場合、ロールバックで予約が取り消されないよう
+          別スレッド(別コネクション)で予約を確定させる
+        [戻り値]
+          予約したブロックの先頭カウンタ
+        """
+
+        if not transaction.get_connection().in_atomic_block:
+            return cls._update_count(block_size)
+
+        result = {}
+
+        def _reserve():
+            try:
+                result['cnt'] = cls._update_count(block_size)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                connection.close()
+
+        th = threading.Thread(target=_reserve)
+        th.start()
+        th.join()
+
+        if 'error' in result:
+            raise result['error']
+
+        return result['cnt']
+
+
+    @classmethod
+    def _update_count(cls, block_size):
+        """
+        [メソッド概要]
+          カウント管理のカウンタを予約数分進める
+        [戻り値]
+          更新前のカウンタ
+        """
+
+        with transaction.atomic():
+            # カウント
+            count = Count.objects.select_for_update().get(pk=1)
+
+            # cntに現在の値を保持
+            cnt = count.count_number
+
+            # 1000000000超えたらリセット
+            count.count_number = (count.count_number + block_size) % cls.TRACE_ID_COUNT_MAX
+
+            count.save()
+
+        return cnt
+
+
     @classmethod
     def check_events_request_key(cls, req):
         """
@@ -162,3 +241,105 @@ class EventsRequestCommon():
         return cls.REQUEST_OK
 
 
+class RuleTypeNameCache():
+    """
+    [クラス概要]
+      ルール種別名からルール種別ID、ラベル件数を引くためのプロセス内キャッシュ
+      イベント受付(oase_accept)、イベントリクエスト受付(Web)で共用する。
+      CACHE_TTL 秒毎にルール種別の件数、最大ID、最終更新日時をバージョンとして確認し、
+      変更があった場合のみ全件を読み直す(確認間隔内はDBを参照しない)。
+      未登録のルール種別名は、確認間隔内に追加された可能性があるため、
+      MISS_CHECK_INTERVAL 秒以上前の確認であればバージョンを再確認してから判定する。
+    """
+
+    # バージョン確認間隔(秒)
+    CACHE_TTL = getattr(settings, 'RULE_TYPE_CACHE_TTL', 10)
+
+    # 未登録のルール種別名によるバージョン再確認の最小間隔(秒)
+    MISS_CHECK_INTERVAL = getattr(settings, 'RULE_TYPE_CACHE_MISS_INTERVAL', 1)
+
+    _lock    = threading.Lock()
+    _data    = {}
+    _version = None
+    _checked = None
+
+
+    @classmethod
+    def get(cls, rule_type_name):
+        """
+        [メソッド概要]
+          ルール種別情報を取得する
+        [戻り値]
+          tuple : (ルール種別ID, ラベル件数)、未登録の場合はNone
+        """
+
+        checked = cls._checked
+        if checked is None or time.monotonic() - checked >= cls.CACHE_TTL:
+            cls.refresh()
+
+        info = cls._data.get(rule_type_name)
+
+        # 未登録の場合は、確認から一定時間経過していればバージョンを再確認
+        if info is None:
+            checked = cls._checked
+            if checked is not None and time.monotonic() - checked >= cls.MISS_CHECK_INTERVAL:
+                cls.refresh(ttl=cls.MISS_CHECK_INTERVAL)
+                info = cls._data.get(rule_type_name)
+
+        return info
+
+
+    @classmethod
+    def refresh(cls, force=False, ttl=None):
+        """
+        [メソッド概要]
+          バージョンを確認し、変更があればルール種別情報を読み直す
+          確認に失敗した場合は読込済みの情報を継続して使用し、次回の取得時に再確認する
+        [引数]
+          force : True=バージョンに関わらず読み直す
+          ttl   : 確認済みとみなす経過時間(秒)、省略時はCACHE_TTL
+        """
+
+        ttl = cls.CACHE_TTL if ttl is None else ttl
+
+        with cls._lock:
+            # 他スレッドで確認済み
+            if not force and cls._checked is not None and time.monotonic() - cls._checked < ttl:
+                return
+
+            try:
+                version = RuleType.objects.aggregate(
+                    count=aggregates.Count('rule_type_id'),
+                    max_id=Max('rule_type_id'),
+                    timestamp=Max('last_update_timestamp'),
+                )
+                version = (version['count'], version['max_id'], version['timestamp'])
+
+                if force or version != cls._version:
+                    data = {}
+                    rset = RuleType.objects.all().values_list('rule_type_name', 'rule_type_id', 'label_count')
+                    for name, rule_type_id, label_count in rset:
+                        data[name] = (rule_type_id, label_count)
+
+                    cls._data = data
+                    cls._version = version
+                    logger.logic_log('LOSI13028', len(data))
+
+                cls._checked = time.monotonic()
+
+            except Exception as e:
+                # 無通信による切断等は次回の確認時に再接続する
+                connection.close()
+                if cls._version is None:
+                    raise
+
+                logger.system_log('LOSM13031', traceback.format_exc())
+
+
+    @classmethod
+    def clear(cls):
+
+        with cls._lock:
+            cls._data    = {}
+            cls._version = None
+            cls._checked = None
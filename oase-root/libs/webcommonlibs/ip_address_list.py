@@ -0,0 +1,221 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  アクセス元IPアドレスのホワイトリスト/ブラックリストを管理する
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+import time
+import uuid
+import ipaddress
+import threading
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from libs.commonlibs.oase_logger import OaseLogger
+from web_app.models.models import BlackListIPAddress, WhiteListIPAddress
+
+
+logger = OaseLogger.get_instance() # ロガー初期化
+
+
+################################################################
+class IPAddressMatcher(object):
+
+    """
+    [クラス概要]
+      IPアドレスリストの照合クラス
+      完全一致、前方一致("*"以降を任意とする指定)、CIDR("/"を含む指定)を
+      それぞれハッシュで保持し、リストの件数によらず一定の回数で照合する
+    """
+
+    def __init__(self, ip_list):
+
+        self.match_all = None
+        self.exact     = {}
+        self.prefix    = {}
+        self.networks  = {}
+
+        for ip in ip_list:
+            if not ip:
+                continue
+
+            wild_position = ip.find('*')
+
+            # 先頭が"*"の場合は全て一致
+            if wild_position == 0:
+                if self.match_all is None:
+                    self.match_all = ip
+
+            elif wild_position > 0:
+                self.prefix.setdefault(ip[0:wild_position], ip)
+
+            elif '/' in ip:
+                try:
+                    network = ipaddress.ip_network(ip, strict=False)
+                except ValueError:
+                    self.exact.setdefault(ip, ip)
+                    continue
+
+                self.networks.setdefault((network.version, network.prefixlen), {}).setdefault(int(network.network_address), ip)
+
+            else:
+                self.exact.setdefault(ip, ip)
+
+
+    def match(self, ipaddr):
+        """
+        [メソッド概要]
+          照合処理
+        [戻り値]
+          str : 一致したリストの値(一致しない場合はNone)
+        """
+
+        if ipaddr in self.exact:
+            return self.exact[ipaddr]
+
+        if self.match_all is not None:
+            return self.match_all
+
+        for i in range(1, len(ipaddr) + 1):
+            ip = self.prefix.get(ipaddr[0:i])
+            if ip is not None:
+                return ip
+
+        if self.networks:
+            try:
+                addr = ipaddress.ip_address(ipaddr)
+            except ValueError:
+                return None
+
+            for (version, prefixlen), network_dic in self.networks.items():
+                if version != addr.version:
+                    continue
+
+                host_bits = addr.max_prefixlen - prefixlen
+                ip = network_dic.get(int(addr) >> host_bits << host_bits)
+                if ip is not None:
+                    return ip
+
+        return None
+
+
+################################################################
+class IPAddressList(object):
+
+    """
+    [クラス概要]
+      ホワイトリスト/ブラックリストのプロセス内キャッシュ
+      リストの変更時は memcached 上のバージョンを更新して全WSGIプロセスに再読込させる。
+      バージョンの更新漏れに備え、CACHE_TTL 秒経過した場合も再読込する。
+    """
+
+    VERSION_KEY = 'OASE_IPADDR_LIST_VERSION'
+    CACHE_TTL   = getattr(settings, 'IPADDR_LIST_CACHE_TTL', 10)
+
+    _lock      = threading.Lock()
+    _white     = None
+    _black     = None
+    _version   = None
+    _load_time = 0
+
+
+    @classmethod
+    def active_black_list(cls):
+        """
+        [メソッド概要]
+          有効なブラックリストを取得する
+          IPアドレス毎の最新レコードが未解除のものを1回のクエリで取得する
+        """
+
+        latest_ids = BlackListIPAddress.objects.values('ipaddr').annotate(max_id=Max('black_list_id')).values('max_id')
+
+        return BlackListIPAddress.objects.filter(black_list_id__in=latest_ids, release_timestamp__isnull=True)
+
+
+    @classmethod
+    def get_version(cls):
+
+        try:
+            return cache.get(cls.VERSION_KEY)
+
+        except Exception as e:
+            logger.logic_log('LOSI00005', traceback.format_exc())
+
+        return None
+
+
+    @classmethod
+    def get_matchers(cls):
+        """
+        [メソッド概要]
+          ホワイトリスト、ブラックリストの照合クラスを取得する
+        """
+
+        version = cls.get_version()
+        white, black = cls._white, cls._black
+
+        if white is None \
+        or version != cls._version \
+        or time.monotonic() - cls._load_time >= cls.CACHE_TTL:
+            with cls._lock:
+                white = IPAddressMatcher(WhiteListIPAddress.objects.all().values_list('ipaddr', flat=True))
+                black = IPAddressMatcher(cls.active_black_list().values_list('ipaddr', flat=True))
+
+                cls._white, cls._black = white, black
+                cls._version   = version
+                cls._load_time = time.monotonic()
+
+        return white, black
+
+
+    @classmethod
+    def notify_change(cls):
+        """
+        [メソッド概要]
+          リストの変更を全プロセスに通知する
+        """
+
+        cls._white = None
+
+        try:
+            cache.set(cls.VERSION_KEY, uuid.uuid4().hex, None)
+
+        except Exception as e:
+            logger.logic_log('LOSI00005', traceback.format_exc())
+
+
+@receiver(post_save, sender=WhiteListIPAddress)
+@receiver(post_save, sender=BlackListIPAddress)
+@receiver(post_delete, sender=WhiteListIPAddress)
+@receiver(post_delete, sender=BlackListIPAddress)
+def _on_ipaddr_list_changed(sender, **kwargs):
+
+    IPAddressList.notify_change()
@@ -56,6 +56,8 @@ from libs.webcommonlibs.events_request import EventsRequestCommon
 from libs.webcommonlibs.common import TimeConversion
 
 from backyards.accept_driver.oase_accept import data_list
+from backyards.accept_driver.oase_accept import EventsRequestWriter
+from backyards.accept_driver.oase_accept import ack_messages
 
 
 @pytest.mark.django_db
@@ -64,15 +66,13 @@ class TestOaseAcceptDataList:
     oase_accept.data_list テストクラス
     """
 
-    # disconnect()をmonkeypatchできないため、コメントアウト
+    # ルール種別の登録が必要なため、コメントアウト
     #def test_data_list_ok(self, monkeypatch):
     #    """
     #    正常系
     #    """
     #
     #    user = User.objects.get(user_id=1)
-    #    rule_type_id_list = {'pytest_name': 9999}
-    #    label_count_list = {'pytest_name': 1}
     #
     #    monkeypatch.setattr(EventsRequestSerializer, 'is_valid', lambda data=None:True)
     #
@@ -86,7 +86,7 @@ class TestOaseAcceptDataList:
     #
     #    body = json.dumps(json_str).encode('utf-8')
     #
-    #    assert data_list(body, user, rule_type_id_list, label_count_list)
+    #    assert data_list(body, user)
 
 
     def test_data_list_ng(self):
@@ -95,8 +95,6 @@ class TestOaseAcceptDataList:
         """
 
         user = User.objects.get(user_id=1)
-        rule_type_id_list = {}
-        label_count_list = {}
 
         json_str = {
             'decisiontable': 'pytest_name',
@@ -106,5 +104,144 @@ class TestOaseAcceptDataList:
             'traceid': 'TOS202006300025273975321dfee20a399d466e92ee3610457efc6b'
         }
 
-        assert not data_list(json_str, user, rule_type_id_list, label_count_list)
+        assert not data_list(json_str, user)
 
+
+def make_events_request(trace_id):
+    """
+    テスト用の登録データ作成
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    return EventsRequest(
+        trace_id=trace_id,
+        request_type_id=1,
+        rule_type_id=1,
+        request_reception_time=now,
+        request_user='OASE Web User',
+        request_server='OASE Web',
+        event_to_time=now,
+        event_info='{"EVENT_INFO":["1"]}',
+        status=defs.UNPROCESS,
+        status_update_id='',
+        retry_cnt=0,
+        last_update_timestamp=now,
+        last_update_user='pytest'
+    )
+
+
+class TestOaseAcceptWriter:
+    """
+    oase_accept.EventsRequestWriter テストクラス
+    """
+
+    def test_writer_ok_size_and_age(self, monkeypatch):
+        """
+        正常系(件数到達、または、経過時間で登録)
+        """
+
+        flush_list = []
+        writer = EventsRequestWriter(None, None, max_count=3, max_age=0.2)
+        monkeypatch.setattr(writer, 'flush', lambda data_list: flush_list.append([t for d, t in data_list]))
+        writer.start()
+
+        # 件数到達で登録
+        for tag in range(1, 4):
+            writer.add(None, tag)
+
+        for i in range(50):
+            if flush_list:
+                break
+            sleep(0.01)
+
+        assert flush_list == [[1, 2, 3]]
+
+        # 件数未満でも経過時間で登録
+        writer.add(None, 4)
+        sleep(0.5)
+        assert flush_list == [[1, 2, 3], [4]]
+
+        # 停止時は受付済みのデータを登録
+        writer.add(None, 5)
+        writer.stop()
+        assert flush_list == [[1, 2, 3], [4], [5]]
+
+
+    @pytest.mark.django_db
+    def test_writer_flush_ok_duplicate(self):
+        """
+        正常系(一括登録失敗時は1件ずつ登録し、登録できないデータは破棄)
+        """
+
+        EventsRequest.objects.all().delete()
+
+        trace_id_1 = 'TOS_pytest_accept_writer_0000000001'
+        trace_id_2 = 'TOS_pytest_accept_writer_0000000002'
+        make_events_request(trace_id_1).save(force_insert=True)
+
+        commit_list = []
+        error_list = []
+        writer = EventsRequestWriter(commit_list.extend, error_list.extend)
+        writer.flush([
+            (make_events_request(trace_id_1), 1),
+            (make_events_request(trace_id_2), 2),
+        ])
+
+        assert commit_list == [1, 2]
+        assert error_list == []
+        assert EventsRequest.objects.filter(trace_id=trace_id_2).count() == 1
+
+        EventsRequest.objects.all().delete()
+
+
+    @pytest.mark.django_db
+    def test_writer_flush_ok_skip_invalid(self):
+        """
+        正常系(登録データなしのメッセージは登録せずに受付順で通知)
+        """
+
+        EventsRequest.objects.all().delete()
+
+        trace_id_1 = 'TOS_pytest_accept_writer_0000000001'
+
+        call_list = []
+        writer = EventsRequestWriter(
+            lambda tags: call_list.append(('commit', tags)),
+            lambda tags: call_list.append(('error', tags)),
+        )
+        writer.flush([
+            (None, 1),
+            (make_events_request(trace_id_1), 2),
+            (None, 3),
+        ])
+
+        assert call_list == [('commit', [1, 2, 3])]
+        assert EventsRequest.objects.filter(trace_id=trace_id_1).count() == 1
+
+        EventsRequest.objects.all().delete()
+
+
+class DummyChannel:
+    """
+    テスト用のチャネル
+    """
+
+    def __init__(self):
+        self.ack_list = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.ack_list.append((delivery_tag, multiple))
+
+
+def test_ack_messages_ok():
+    """
+    正常系(最大のデリバリータグまでを一括でACK)
+    """
+
+    channel = DummyChannel()
+
+    ack_messages(channel, [3, 4, 5])
+    ack_messages(channel, [])
+
+    assert channel.ack_list == [(5, True)]
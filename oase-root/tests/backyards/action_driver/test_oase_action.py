@@ -28,9 +28,11 @@ import configparser
 import datetime
 import sys
 import traceback
+import signal
 import pytz
 
 from importlib import import_module
+from socket import gethostname
 from django.db import transaction
 from django.conf import settings
 
@@ -38,7 +40,7 @@ from libs.backyardlibs.oase_action_common_libs import ConstantModules as Cstobj
 from libs.commonlibs.aes_cipher import AESCipher
 from libs.commonlibs.define import *
 from libs.webcommonlibs.events_request import EventsRequestCommon
-from web_app.models.models import ActionHistory, User
+from web_app.models.models import ActionHistory, User, RhdmResponse
 
 
 oase_root_dir = os.path.join(os.path.dirname(
@@ -51,7 +53,9 @@ os.environ['PYTHON_MODULE'] = '/usr/bin/python3'
 os.environ['LOG_LEVEL'] = "TRACE"
 os.environ['LOG_DIR'] = log_dir
 
+from backyards.action_driver import oase_action
 from backyards.action_driver.oase_action import ActionDriverMainModules
+from backyards.action_driver.oase_action import ActionWorkerPool
 
 # 実行ファイル名取得
 filename, ext = os.path.splitext(os.path.basename(__file__))
@@ -78,7 +82,7 @@ def set_test_regist_data():
         action_type_id=1,
         status=2106,
         status_detail=0,
-        status_update_id='pytest_id',
+        status_update_id=gethostname(),
         retry_flag=False,
         retry_status=None,
         retry_status_detail=None,
@@ -164,3 +168,275 @@ def test_regist_exastro(monkeypatch):
 
     delete_test_regist_data()
     del ADM
+
+
+@pytest.mark.django_db
+def test_claim_rhdm_response_ok():
+    """
+    読み込み後に他ホストが更新したルールマッチング結果は占有できないこと
+    """
+
+    delete_test_regist_data()
+    set_test_regist_data()
+    RhdmResponse.objects.all().delete()
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    RhdmResponse(
+        trace_id               = EventsRequestCommon.generate_trace_id(now),
+        request_reception_time = now,
+        request_type_id        = 1,
+        resume_order           = 1,
+        resume_timestamp       = None,
+        status                 = UNPROCESS,
+        status_update_id       = '',
+        last_update_timestamp  = now,
+        last_update_user       = 'pytest'
+    ).save(force_insert=True)
+
+    ADM_self  = ActionDriverMainModules(log_file_path)
+    ADM_other = ActionDriverMainModules(log_file_path)
+    ADM_other.hostname = 'pytest_other_host'
+
+    # 両ホストが同じ状態で読み込み
+    rhdm_res_self  = RhdmResponse.objects.get()
+    rhdm_res_other = RhdmResponse.objects.get()
+
+    assert ADM_other.claim_rhdm_response(rhdm_res_other, PROCESSING) == True
+    assert ADM_self.claim_rhdm_response(rhdm_res_self, PROCESSING) == False
+
+    rhdm_res = RhdmResponse.objects.get()
+    assert rhdm_res.status == PROCESSING
+    assert rhdm_res.status_update_id == 'pytest_other_host'
+
+    RhdmResponse.objects.all().delete()
+    delete_test_regist_data()
+
+
+@pytest.mark.django_db
+def test_do_exastro_ok_claim(monkeypatch):
+    """
+    Exastro連携中のアクション履歴は、占有できたホストのみが処理すること
+    """
+
+    delete_test_regist_data()
+    set_test_regist_data()
+
+    expired = datetime.datetime.now(pytz.timezone('UTC')) - datetime.timedelta(seconds=oase_action.action_lease_sec + 60)
+    ActionHistory.objects.update(
+        status=ACTION_HISTORY_STATUS.EXASTRO_REQUEST, status_update_id='pytest_dead_host', last_update_timestamp=expired)
+
+    exec_list = []
+    def _execute(self, aryPCB, exec_type, ResponseID, TraceID, resume_order, action_history_id=0):
+        exec_list.append((self.hostname, action_history_id))
+        return True
+
+    monkeypatch.setattr(ActionDriverMainModules, 'ExecuteSubProcess', _execute)
+
+    ADM_self  = ActionDriverMainModules(log_file_path)
+    ADM_other = ActionDriverMainModules(log_file_path)
+    ADM_other.hostname = 'pytest_other_host'
+
+    # 占有期限切れのアクション履歴を1ホストのみが引き継ぐ
+    assert ADM_other.do_exastro({}) == True
+    assert ADM_self.do_exastro({}) == True
+    assert exec_list == [('pytest_other_host', ActionHistory.objects.get().pk)]
+
+    # 読み込み後に他ホストが占有した場合は処理しない
+    act_his = ActionHistory.objects.values('action_history_id', 'status_update_id', 'last_update_timestamp').get()
+    assert ADM_other.claim_action_history(act_his) == True
+    assert ADM_self.claim_action_history(act_his) == False
+
+    delete_test_regist_data()
+
+
+@pytest.mark.django_db
+def test_chk_abnomal_end_ok_lease(monkeypatch):
+    """
+    他ホストで実行中のアクションは、占有期限を延長している間は強制処理済みにしないこと
+    """
+
+    delete_test_regist_data()
+    set_test_regist_data()
+    RhdmResponse.objects.all().delete()
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    trace_id = EventsRequestCommon.generate_trace_id(now)
+    RhdmResponse(
+        trace_id               = trace_id,
+        request_reception_time = now,
+        request_type_id        = 1,
+        resume_order           = 1,
+        resume_timestamp       = None,
+        status                 = PROCESSING,
+        status_update_id       = 'pytest_other_host',
+        last_update_timestamp  = now - datetime.timedelta(seconds=oase_action.action_lease_sec + 60),
+        last_update_user       = 'pytest'
+    ).save(force_insert=True)
+
+    ADM_self  = ActionDriverMainModules(log_file_path)
+    ADM_other = ActionDriverMainModules(log_file_path)
+    ADM_other.hostname = 'pytest_other_host'
+
+    # 期限切れの状態で読み込んだ後に、実行中のホストが占有期限を延長
+    rhdm_res_stale = RhdmResponse.objects.get()
+    ADM_other.refresh_lease({trace_id : None})
+
+    assert ADM_self.claim_rhdm_response(rhdm_res_stale, FORCE_PROCESSED) == False
+
+    ADM_self.chkAbnomalEndChildProcs()
+    rhdm_res = RhdmResponse.objects.get()
+    assert rhdm_res.status == PROCESSING
+    assert rhdm_res.status_update_id == 'pytest_other_host'
+
+    # 延長は一定間隔毎
+    ADM_other.refresh_lease({trace_id : None})
+    assert RhdmResponse.objects.get().last_update_timestamp == rhdm_res.last_update_timestamp
+
+    RhdmResponse.objects.all().delete()
+    delete_test_regist_data()
+
+
+def dummy_action_worker(conn, max_tasks):
+    """ワーカープロセスのダミー 実行種別'crash'の場合は異常終了する"""
+
+    while True:
+        args = conn.recv()
+        if args is None:
+            break
+
+        if args[0] == 'crash':
+            os._exit(3)
+
+        conn.send((0, False))
+
+    conn.close()
+
+
+def test_action_worker_pool_ok(monkeypatch):
+    """
+    ワーカープールに投入したジョブがTraceID毎に終了確認できること
+    """
+
+    monkeypatch.setattr(oase_action, 'action_worker', dummy_action_worker)
+
+    pool = ActionWorkerPool(2, 1)
+
+    aryPCB = {}
+    for i in range(5):
+        trace_id = 'TOS_pytest_%s' % (i)
+        aryPCB[trace_id] = pool.submit('normal', i, trace_id, 1)
+
+    # 待ち行列の上限を超えて滞留しないこと
+    assert len(pool.pending) <= 1
+
+    for trace_id, job in aryPCB.items():
+        assert job.wait() == 0
+
+    # 起動したワーカー数が上限を超えないこと
+    assert len([w for w in pool.workers if w]) <= 2
+
+    pool.shutdown()
+    assert pool.workers == [None, None]
+
+
+def test_action_worker_pool_ok_no_log_dir(monkeypatch):
+    """
+    環境変数LOG_DIR未指定(常駐モード)でもワーカープールを起動できること
+    """
+
+    monkeypatch.setattr(oase_action, 'action_worker', dummy_action_worker)
+    monkeypatch.delenv('LOG_DIR', raising=False)
+    monkeypatch.delitem(sys.modules, 'backyards.action_driver.oase_action_sub', raising=False)
+
+    pool = ActionWorkerPool(1, 1)
+
+    assert os.environ['LOG_DIR'] == oase_root_dir + '/logs/backyardlogs/oase_action'
+
+    job = pool.submit('normal', 1, 'TOS_pytest_no_log_dir', 1)
+    assert job.wait() == 0
+
+    pool.shutdown()
+
+
+def test_action_worker_pool_ok_crash(monkeypatch):
+    """
+    ジョブ実行中にワーカーが異常終了しても、後続のジョブが処理されること
+    """
+
+    monkeypatch.setattr(oase_action, 'action_worker', dummy_action_worker)
+
+    pool = ActionWorkerPool(1, 10)
+
+    crash_job = pool.submit('crash', 1, 'TOS_pytest_crash', 1)
+    normal_job = pool.submit('normal', 2, 'TOS_pytest_normal', 1)
+
+    assert crash_job.wait() == 3
+    assert normal_job.wait() == 0
+
+    pool.shutdown()
+
+
+
+def patch_main_modules(monkeypatch, main_loop):
+    """
+    起動処理のテスト用に、DBを参照する処理をダミーに置き換える
+    """
+
+    def _init(self, log_file_path, pool=None):
+        self.LogFilePath = log_file_path
+        self.pool = pool
+
+    monkeypatch.setattr(oase_action, 'action_worker', dummy_action_worker)
+    monkeypatch.setattr(ActionDriverMainModules, '__init__', _init)
+    monkeypatch.setattr(ActionDriverMainModules, 'MainLoop', main_loop)
+    monkeypatch.setattr(ActionDriverMainModules, 'chkAbnomalEndChildProcs', lambda self: None)
+
+
+@pytest.mark.parametrize('worker_num', [0, 2])
+def test_main_ok(monkeypatch, worker_num):
+    """
+    起動処理(1回実行モード)がワーカー数の設定に関わらず正常終了すること
+    """
+
+    cycle_list = []
+    patch_main_modules(monkeypatch, lambda self, aryPCB: cycle_list.append(self.pool) or True)
+    monkeypatch.setattr(oase_action, 'action_worker_num', worker_num)
+
+    assert oase_action.main(['oase_action.py']) == 0
+    assert len(cycle_list) == 1
+    assert (cycle_list[0] is not None) == (worker_num > 0)
+
+
+def test_main_ok_daemon(monkeypatch):
+    """
+    常駐モードでは、停止要求まで同じワーカープールで周期処理を繰り返すこと
+    """
+
+    cycle_list = []
+    def _main_loop(self, aryPCB):
+        cycle_list.append(self.pool)
+        trace_id = 'TOS_pytest_%s' % len(cycle_list)
+        aryPCB[trace_id] = self.pool.submit('normal', len(cycle_list), trace_id, 1)
+
+        # 3周期目で停止要求
+        if len(cycle_list) >= 3:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        return True
+
+    patch_main_modules(monkeypatch, _main_loop)
+    monkeypatch.setattr(oase_action, 'action_worker_num', 1)
+    monkeypatch.setattr(oase_action, 'run_interval', '0')
+
+    default_sigterm = signal.getsignal(signal.SIGTERM)
+    default_sigint  = signal.getsignal(signal.SIGINT)
+    try:
+        assert oase_action.main(['oase_action.py', '--daemon']) == 0
+
+    finally:
+        signal.signal(signal.SIGTERM, default_sigterm)
+        signal.signal(signal.SIGINT, default_sigint)
+
+    assert len(cycle_list) == 3
+    assert cycle_list[0] is cycle_list[1] is cycle_list[2]
+    assert cycle_list[0].workers == [None]
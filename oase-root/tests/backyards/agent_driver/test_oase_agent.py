@@ -36,6 +36,7 @@ from libs.webcommonlibs.events_request import EventsRequestCommon
 from libs.webcommonlibs.oase_mail import OASEMailSMTP
 from web_app.models.models import EventsRequest, RuleType, System
 from web_app.models.models import ActionType, DataObject, DriverType, RhdmResponseCorrelation
+from web_app.models.models import UnknownEventNotify
 
 oase_root_dir = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), '../..')
@@ -240,6 +241,42 @@ def test_agent(django_db_setup_with_system_dmsettings):
     assert 'VAR_条件1' not in result[0] and 'VAR_条件2' in result[0]
 
 
+@pytest.mark.django_db
+def test_replace_reserv_var_ok_template(django_db_setup_with_system_dmsettings):
+    """
+    予約変数の置換(コンパイル済みテンプレート)
+    正常系
+    """
+
+    from backyards.agent_driver import oase_agent as ag
+    classAgent = ag.Agent()
+
+    var_index = {'条件1' : 0, '条件2' : 1}
+    templates = {}
+    act = 'ITA_NAME=ITA176, SYMPHONY_CLASS_ID={{ VAR_条件1 }}, OPERATION_ID={{ VAR_条件2 }}, {{ VAR_条件3 }}'
+
+    result = classAgent.replace_reserv_var(None, var_index, [act, 'MAIL_NAME=MAIL'], templates, ['1', '2'])
+
+    assert result == ['ITA_NAME=ITA176, SYMPHONY_CLASS_ID=1, OPERATION_ID=2, {{ VAR_条件3 }}', 'MAIL_NAME=MAIL']
+    assert templates['MAIL_NAME=MAIL'] is None
+
+    # 2回目以降はキャッシュしたテンプレートで置換
+    templates[act] = ['cached=', 1]
+    result = classAgent.replace_reserv_var(None, var_index, [act], templates, ['1', '2'])
+    assert result == ['cached=2']
+
+    # 取得の直前に他スレッドがキャッシュをクリアしても置換できる
+    class ClearedTemplates(dict):
+        def get(self, key, default=None):
+            self.clear()
+            return super().get(key, default)
+
+    templates = ClearedTemplates({act : ['cached=', 1]})
+    result = classAgent.replace_reserv_var(None, var_index, [act], templates, ['1', '2'])
+    assert result == ['ITA_NAME=ITA176, SYMPHONY_CLASS_ID=1, OPERATION_ID=2, {{ VAR_条件3 }}']
+    assert act in templates
+
+
 ################################################
 # テスト(未知事象通知)
 ################################################
@@ -639,6 +676,7 @@ def test_check_rhdm_response_correlation_ok(django_db_setup_with_system_dmsettin
     # テスト
     result = True
     try:
+        ag.correlation_engine.clear()
         ag.check_rhdm_response_correlation(now)
     except Exception as e:
         print(traceback.format_exc())
@@ -650,6 +688,225 @@ def test_check_rhdm_response_correlation_ok(django_db_setup_with_system_dmsettin
     del_test_data()
 
 
+def test_correlation_engine_evaluate_group_ok():
+    """
+    大グループ内の状態チェック
+    正常系
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    past = now - datetime.timedelta(seconds=100)
+
+    def _row(cid, gr2, prio, cond_cnt, cond_term, cur_cnt, stime, resp_id):
+        return (cid, 1, 1, 'rule%s' % cid, 'L1', gr2, prio, 1, cond_cnt, cond_term, cur_cnt, stime, resp_id)
+
+    # 優先グループが未達成の間は、後続グループをアクションさせない
+    rows = [
+        _row(1, 'S1', 1, 2, 60,  1, now,  None),
+        _row(2, 'S2', 2, 1, 60,  1, now,  102),
+    ]
+    mod_ids, del_ids, deadline = ag.CorrelationEngine.evaluate_group(rows, now)
+    assert mod_ids == []
+    assert del_ids == []
+    assert deadline == now + datetime.timedelta(seconds=60)
+
+    # 優先グループが期限切れになれば、後続グループをアクションさせる
+    rows = [
+        _row(1, 'S1', 1, 2, 60,  1, past, 101),
+        _row(2, 'S2', 2, 1, 200, 1, past, 102),
+        _row(3, 'S3', 3, 1, 200, 1, past, 103),
+    ]
+    mod_ids, del_ids, deadline = ag.CorrelationEngine.evaluate_group(rows, now)
+    assert mod_ids == [102]
+    assert del_ids == [101, 103]
+    assert deadline == past + datetime.timedelta(seconds=200)
+
+
+@pytest.mark.django_db
+def test_correlation_engine_notify_ok():
+    """
+    変更通知された大グループのみを再評価する
+    正常系
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    engine = ag.CorrelationEngine()
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    evaluated = []
+    def _evaluate(now, keys):
+        evaluated.append(set(keys))
+
+    engine._evaluate = _evaluate
+
+    # 初回は全件
+    engine.check(now)
+    engine.rule_group[(1, 1, 'rule1')] = 'L1'
+
+    # ルールの移動元と移動先の大グループを再評価
+    engine.notify(1, 1, 'rule1', 'L2')
+    engine.check(now)
+
+    assert evaluated[1] == {(1, 1, 'L1'), (1, 1, 'L2')}
+
+    # 変更がなければ再評価しない
+    engine.check(now)
+    assert evaluated[2] == set()
+
+
+
+@pytest.mark.django_db
+def test_correlation_engine_check_ok_other_host():
+    """
+    他ホストが登録、更新した大グループを次回のチェックで再評価する
+    正常系
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    RhdmResponseCorrelation.objects.all().delete()
+
+    engine = ag.CorrelationEngine()
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    evaluated = []
+    def _evaluate(now, keys):
+        evaluated.append(set(keys))
+
+    engine._evaluate = _evaluate
+
+    engine.check(now)
+
+    # notifyを経由せずに登録(他ホストによる登録)
+    corr = RhdmResponseCorrelation.objects.create(
+        rule_type_id              = 1,
+        rule_name                 = 'rule1',
+        request_type_id           = 1,
+        cond_large_group          = 'L1',
+        cond_large_group_priority = 1,
+        cond_small_group          = 'S1',
+        cond_small_group_priority = 1,
+        cond_count                = 2,
+        cond_term                 = 60,
+        current_count             = 0,
+        start_time                = now,
+        response_detail_id        = None,
+        status                    = ag.CorrelationEngine.STS_REGISTED,
+        last_update_user          = 'pytest',
+    )
+
+    engine.check(now)
+    assert evaluated[1] == {(1, 1, 'L1')}
+    assert engine.groups[(1, 1, 'L1')][0][0] == corr.pk
+
+    # 変更がなければ再評価しない
+    engine.check(now)
+    assert evaluated[2] == set()
+
+    # notifyを経由せずに更新(他ホストによる条件回数の加算)
+    RhdmResponseCorrelation.objects.filter(pk=corr.pk).update(current_count=1)
+
+    engine.check(now)
+    assert evaluated[3] == {(1, 1, 'L1')}
+    assert engine.groups[(1, 1, 'L1')][0][10] == 1
+
+    RhdmResponseCorrelation.objects.all().delete()
+
+
+@pytest.mark.django_db
+def test_correlation_engine_check_ng():
+    """
+    状態遷移の反映に失敗した大グループは次回のチェックで再評価する
+    異常系
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    engine = ag.CorrelationEngine()
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    evaluated = []
+    def _evaluate(now, keys):
+        evaluated.append(set(keys))
+        if len(evaluated) == 2:
+            raise Exception('pytest')
+
+    engine._evaluate = _evaluate
+
+    engine.check(now)
+    engine.notify(1, 1, 'rule1', 'L1')
+
+    with pytest.raises(Exception):
+        engine.check(now)
+
+    engine.check(now)
+    assert evaluated[1] == {(1, 1, 'L1')}
+    assert evaluated[2] == {(1, 1, 'L1')}
+
+
+@pytest.mark.django_db
+def test_correlation_engine_evaluate_other_host_ok():
+    """
+    他ホストが状態遷移させた大グループはアクションを更新しない
+    正常系
+    """
+    from backyards.agent_driver import oase_agent as ag
+    from web_app.models.models import RhdmResponseAction
+
+    RhdmResponseCorrelation.objects.all().delete()
+    RhdmResponseAction.objects.all().delete()
+
+    engine = ag.CorrelationEngine()
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    act = RhdmResponseAction.objects.create(
+        response_id           = 1,
+        rule_name             = 'rule1',
+        execution_order       = 5,
+        action_type_id        = 1,
+        action_parameter_info = '{}',
+        action_pre_info       = '{}',
+        action_retry_interval = 1,
+        action_retry_count    = 1,
+        last_update_user      = 'pytest',
+    )
+
+    corr = RhdmResponseCorrelation.objects.create(
+        rule_type_id              = 1,
+        rule_name                 = 'rule1',
+        request_type_id           = 1,
+        cond_large_group          = 'L1',
+        cond_large_group_priority = 1,
+        cond_small_group          = 'S1',
+        cond_small_group_priority = 1,
+        cond_count                = 1,
+        cond_term                 = 60,
+        current_count             = 0,
+        start_time                = now,
+        response_detail_id        = act.pk,
+        status                    = ag.CorrelationEngine.STS_REGISTED,
+        last_update_user          = 'pytest',
+    )
+
+    engine.check(now)
+    assert (1, 1, 'L1') in engine.groups
+
+    # 読み込み後に条件回数へ到達し、他ホストが先に状態遷移させる
+    engine.groups[(1, 1, 'L1')] = [
+        (corr.pk, 1, 1, 'rule1', 'L1', 'S1', 1, 1, 1, 60, 1, now, act.pk),
+    ]
+    RhdmResponseCorrelation.objects.filter(pk=corr.pk).update(current_count=1, status=ag.CorrelationEngine.STS_REGISTABLE)
+
+    # 他ホストが状態遷移させた大グループは、再度読み込むまでアクションを更新しない
+    engine._evaluate(now, {(1, 1, 'L1')})
+
+    assert (1, 1, 'L1') not in engine.groups
+    assert engine.dirty == {(1, 1, 'L1')}
+    assert RhdmResponseAction.objects.get(pk=act.pk).execution_order == 5
+
+    RhdmResponseCorrelation.objects.all().delete()
+    RhdmResponseAction.objects.all().delete()
+
+
 ################################################
 # テスト(データ作成)
 ################################################
@@ -721,3 +978,580 @@ def test_make_rhdm_response_action_data_ok(django_db_setup_with_system_dmsetting
 
     del_test_data()
 
+
+
+################################################
+# テスト(バッチ評価)
+################################################
+class DummyResponse:
+
+    def __init__(self, text):
+
+        self.text = text
+
+
+def make_batch_dmctl(ag, trace_id):
+    """
+    バッチ評価用のDMControllerを作成する
+    """
+
+    driver = ag.Driver.__new__(ag.Driver)
+    driver._Driver__trace_id = trace_id
+    driver._Driver__insert_obj = 'com.oase.pytest'
+    driver._Driver__insert_vars = ['label0', 'acts']
+    driver._Driver__action_ins_name = 'acts'
+    driver._lookup = 'ksession-dtables'
+
+    dmctl = ag.DMController.__new__(ag.DMController)
+    dmctl.driver = driver
+
+    return dmctl
+
+
+@pytest.mark.django_db
+def test_evaluates_rules_batch_ok(django_db_setup_with_system_dmsettings, monkeypatch):
+    """
+    複数イベントのバッチ評価
+    正常系(イベント毎に結果を振り分け)
+    """
+    import json
+    from backyards.agent_driver import oase_agent as ag
+
+    post_list = []
+    def _dummy_post(self, postdata):
+        post_list.append(json.loads(postdata))
+        return DummyResponse(json.dumps({
+            'type' : 'SUCCESS',
+            'result' : {'execution-results' : {'results' : [
+                {'key' : 'in1', 'value' : {'com.oase.pytest' : {'acts' : {'ruleName' : ['rule1']}}}},
+                {'key' : 'in0', 'value' : {'com.oase.pytest' : {'acts' : {'ruleName' : []}}}},
+            ]}}
+        }))
+
+    monkeypatch.setattr(ag.DMController, '_post', _dummy_post)
+
+    dmctl_list = [make_batch_dmctl(ag, 'TOS_pytest_0'), make_batch_dmctl(ag, 'TOS_pytest_1'), make_batch_dmctl(ag, 'TOS_pytest_2')]
+    event_list = [
+        ('2020-01-01T00:00:00', '{"EVENT_INFO":["a"]}'),
+        ('2020-01-01T00:00:01', '{"EVENT_INFO":["b"]}'),
+        ('2020-01-01T00:00:02', '{"EVENT_INFO":["c", "d"]}'),
+    ]
+
+    results = ag.DMController.evaluates_rules_batch(dmctl_list, event_list)
+
+    # 1回のリクエストにまとめる(要素数不正のイベントは除外)
+    assert len(post_list) == 1
+    assert len([c for c in post_list[0]['commands'] if 'insert' in c]) == 2
+
+    assert results[0][0] == ag.RULE_UNMATCH
+    assert results[1][0] == ag.RULE_MATCH
+    assert results[1][1] == {'ruleName' : ['rule1']}
+    assert results[2][0] == ag.RULE_ERROR
+
+
+@pytest.mark.django_db
+def test_evaluates_rules_batch_ng_failure(django_db_setup_with_system_dmsettings, monkeypatch):
+    """
+    複数イベントのバッチ評価
+    異常系(DM処理失敗)
+    """
+    import json
+    from backyards.agent_driver import oase_agent as ag
+
+    def _dummy_post(self, postdata):
+        return DummyResponse(json.dumps({'type' : 'FAILURE'}))
+
+    monkeypatch.setattr(ag.DMController, '_post', _dummy_post)
+
+    dmctl_list = [make_batch_dmctl(ag, 'TOS_pytest_0'), make_batch_dmctl(ag, 'TOS_pytest_1')]
+    event_list = [
+        ('2020-01-01T00:00:00', '{"EVENT_INFO":["a"]}'),
+        ('2020-01-01T00:00:01', '{"EVENT_INFO":["b"]}'),
+    ]
+
+    results = ag.DMController.evaluates_rules_batch(dmctl_list, event_list)
+
+    assert [r[0] for r in results] == [ag.RULE_ERROR, ag.RULE_ERROR]
+
+
+################################################
+# テスト(未知事象通知の送信待ち行列)
+################################################
+def set_data_unknown_event_notify(trace_id, hostname, timestamp):
+    """
+    未知事象通知送信待ちのテストデータを作成
+    """
+
+    notify = UnknownEventNotify(
+        trace_id               = trace_id,
+        request_type_id        = PRODUCTION,
+        rule_type_id           = 9999,
+        decision_table_name    = 'pytest_name',
+        request_reception_time = timestamp,
+        event_to_time          = timestamp,
+        event_info             = '{"EVENT_INFO":["pytest"]}',
+        status_update_id       = hostname,
+        last_update_timestamp  = timestamp,
+        last_update_user       = 'pytest'
+    )
+    notify.save(force_insert=True)
+
+    return notify
+
+
+@pytest.mark.django_db
+def test_notify_outbox_ok(django_db_setup_with_system_dmsettings, monkeypatch):
+    """
+    未知事象通知の送信待ち行列
+    正常系(送信に失敗した通知があっても後続の通知を送信し、送信済みの通知は削除する)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    expired = now - datetime.timedelta(seconds=ag.LEASE_SECONDS + 60)
+
+    del_test_data()
+    UnknownEventNotify.objects.all().delete()
+    set_data_ruletype()
+
+    # 自ホスト、占有期限切れの他ホスト、占有中の他ホスト
+    set_data_unknown_event_notify('TOS_pytest_ng', ag.HOSTNAME, now)
+    set_data_unknown_event_notify('TOS_pytest_1', ag.HOSTNAME, now)
+    set_data_unknown_event_notify('TOS_pytest_2', 'pytest_other_host', expired)
+    set_data_unknown_event_notify('TOS_pytest_3', 'pytest_other_host', now)
+
+    sent_list = []
+
+    def _dummy_notify(ruletype, req_type, notify_param):
+        if notify_param['trace_id'] == 'TOS_pytest_ng':
+            raise Exception('pytest')
+        sent_list.append((ruletype.rule_type_id, req_type, notify_param['trace_id']))
+
+    monkeypatch.setattr(ag, 'notify_unknown_event', _dummy_notify)
+
+    # 停止時は送信待ちを全て送信する
+    ag.NotifyOutbox.stop()
+
+    assert sent_list == [(9999, PRODUCTION, 'TOS_pytest_1'), (9999, PRODUCTION, 'TOS_pytest_2')]
+    assert list(UnknownEventNotify.objects.values_list('trace_id', flat=True)) == ['TOS_pytest_3']
+
+    UnknownEventNotify.objects.all().delete()
+    del_test_data()
+
+
+@pytest.mark.django_db
+def test_notify_outbox_ok_register(django_db_setup_with_system_dmsettings):
+    """
+    未知事象通知の送信待ち行列
+    正常系(本番環境、かつ、メール通知ありのルール種別のみ登録する)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    del_test_data()
+    UnknownEventNotify.objects.all().delete()
+    ruletype = set_data_ruletype()
+
+    event_req = EventsRequest(
+        trace_id               = 'TOS_pytest_register',
+        request_type_id        = PRODUCTION,
+        rule_type_id           = ruletype.rule_type_id,
+        request_reception_time = now,
+        request_user           = 'pytest',
+        request_server         = 'pytest',
+        event_to_time          = now,
+        event_info             = '{"EVENT_INFO":["pytest"]}',
+        status                 = RULE_UNMATCH,
+        status_update_id       = ag.HOSTNAME,
+        retry_cnt              = 0,
+        last_update_timestamp  = now,
+        last_update_user       = 'pytest'
+    )
+
+    assert ag.NotifyOutbox.register(event_req, ruletype, 'pytest')
+
+    event_req.request_type_id = STAGING
+    assert not ag.NotifyOutbox.register(event_req, ruletype, 'pytest')
+
+    event_req.request_type_id = PRODUCTION
+    ruletype.unknown_event_notification = '0'
+    assert not ag.NotifyOutbox.register(event_req, ruletype, 'pytest')
+
+    notify = UnknownEventNotify.objects.get(trace_id='TOS_pytest_register')
+    assert notify.decision_table_name == 'pytest_name'
+    assert notify.status_update_id == ag.HOSTNAME
+    assert UnknownEventNotify.objects.count() == 1
+
+    UnknownEventNotify.objects.all().delete()
+    del_test_data()
+
+
+################################################
+# テスト(ルール種別キャッシュ)
+################################################
+@pytest.mark.django_db
+def test_ruletype_cache_ok_refresh(django_db_setup_with_system_dmsettings):
+    """
+    ルール種別キャッシュ
+    正常系(最終更新日時が変わったルール種別のみ再読み込み)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    ag.RuleTypeCache.clear()
+
+    ruletype = set_data_ruletype()
+    DataObject(
+        rule_type_id = ruletype.rule_type_id,
+        conditional_name = 'pytest_cond',
+        label = 'label0',
+        conditional_expression_id = 1,
+        last_update_timestamp = ruletype.last_update_timestamp,
+        last_update_user = 'pytest'
+    ).save(force_insert=True)
+
+    meta = ag.RuleTypeCache.get(ruletype.rule_type_id)
+    assert meta['insert_obj'] == 'com.oase.pytest_table.pytest_tableObject'
+    assert meta['insert_vars'] == ['label0']
+    assert meta['var_index'] == {'pytest_cond' : 0}
+
+    # 変更がなければキャッシュを返す
+    ag.RuleTypeCache.refresh()
+    assert ag.RuleTypeCache.get(ruletype.rule_type_id) is meta
+
+    # ルール適用等で最終更新日時が変わった場合は再読み込み
+    RuleType.objects.filter(rule_type_id=ruletype.rule_type_id).update(
+        current_container_id_product = 'prodpytest_table_1',
+        last_update_timestamp = datetime.datetime(2020, 6, 5, 12, 0, 0, tzinfo=datetime.timezone.utc)
+    )
+    ag.RuleTypeCache.refresh()
+    new_meta = ag.RuleTypeCache.get(ruletype.rule_type_id)
+    assert new_meta is not meta
+    assert new_meta['ruletype'].current_container_id_product == 'prodpytest_table_1'
+
+    ag.RuleTypeCache.clear()
+
+
+################################################
+# テスト(リクエストの分割読み込み)
+################################################
+@pytest.mark.django_db
+def test_fetch_event_requests_ok(django_db_setup_with_system_dmsettings):
+    """
+    リクエストの分割読み込み
+    正常系(読み込み中に状態が変わっても、開始時点の対象を漏れなく昇順で返す)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    EventsRequest.objects.all().delete()
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    for i in range(5):
+        EventsRequest(
+            trace_id               = 'TOS_pytest_fetch_%s' % (i),
+            request_type_id        = 1,
+            rule_type_id           = 1,
+            request_reception_time = now,
+            request_user           = 'pytest_user',
+            request_server         = 'pytest_server',
+            event_to_time          = now,
+            event_info             = '{"EVENT_INFO":["pytest"]}',
+            status                 = UNPROCESS,
+            status_update_id       = 'pytest_id',
+            retry_cnt              = 0,
+            last_update_timestamp  = now,
+            last_update_user       = 'administrator'
+        ).save(force_insert=True)
+
+    trace_id_list = []
+    for er in ag.fetch_event_requests(2, status=UNPROCESS):
+        trace_id_list.append(er.trace_id)
+
+        # 処理済みに更新しても後続の読み込みに影響しないこと
+        EventsRequest.objects.filter(request_id=er.request_id).update(status=PROCESSED)
+
+    assert trace_id_list == ['TOS_pytest_fetch_%s' % (i) for i in range(5)]
+    assert list(ag.fetch_event_requests(2, status=UNPROCESS)) == []
+
+    EventsRequest.objects.all().delete()
+
+
+@pytest.mark.django_db
+def test_claim_event_requests_ok(django_db_setup_with_system_dmsettings):
+    """
+    リクエストの占有
+    正常系(他ホストが処理中のリクエストは占有期限切れの場合のみ占有する)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    EventsRequest.objects.all().delete()
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    for i in range(3):
+        EventsRequest(
+            trace_id               = 'TOS_pytest_claim_%s' % (i),
+            request_type_id        = 1,
+            rule_type_id           = 1,
+            request_reception_time = now,
+            request_user           = 'pytest_user',
+            request_server         = 'pytest_server',
+            event_to_time          = now,
+            event_info             = '{"EVENT_INFO":["pytest"]}',
+            status                 = UNPROCESS,
+            status_update_id       = '',
+            retry_cnt              = 0,
+            last_update_timestamp  = now,
+            last_update_user       = 'administrator'
+        ).save(force_insert=True)
+
+    lease_expire = now - datetime.timedelta(seconds=600)
+
+    # 通常モード：他ホストが処理中に変更済みのリクエストは占有しない
+    er_list = list(EventsRequest.objects.all().order_by('request_id'))
+    EventsRequest.objects.filter(trace_id='TOS_pytest_claim_0').update(status=PROCESSING, status_update_id='pytest_other_host')
+
+    claimed_list = ag.claim_event_requests(er_list, NORMAL, lease_expire)
+    assert [er.trace_id for er in claimed_list] == ['TOS_pytest_claim_1', 'TOS_pytest_claim_2']
+    assert all(er.status_update_id == ag.HOSTNAME for er in claimed_list)
+
+    # 再実行モード：他ホストの占有期限内のリクエストは占有しない
+    er_list = list(EventsRequest.objects.filter(trace_id='TOS_pytest_claim_0'))
+    assert ag.claim_event_requests(er_list, RECOVER, lease_expire) == []
+
+    # 再実行モード：占有期限切れのリクエストは占有する
+    EventsRequest.objects.filter(trace_id='TOS_pytest_claim_0').update(
+        last_update_timestamp=now - datetime.timedelta(seconds=601))
+    claimed_list = ag.claim_event_requests(er_list, RECOVER, lease_expire)
+    assert [er.trace_id for er in claimed_list] == ['TOS_pytest_claim_0']
+
+    EventsRequest.objects.all().delete()
+
+
+@pytest.mark.django_db
+def test_update_event_request_ok_lease(django_db_setup_with_system_dmsettings):
+    """
+    リクエストの状態更新
+    正常系(占有期限切れで他ホストが占有し直したリクエストは更新しない)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    EventsRequest.objects.all().delete()
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    for i in range(2):
+        EventsRequest(
+            trace_id               = 'TOS_pytest_lease_%s' % (i),
+            request_type_id        = 1,
+            rule_type_id           = 1,
+            request_reception_time = now,
+            request_user           = 'pytest_user',
+            request_server         = 'pytest_server',
+            event_to_time          = now,
+            event_info             = '{"EVENT_INFO":["pytest"]}',
+            status                 = UNPROCESS,
+            status_update_id       = '',
+            retry_cnt              = 0,
+            last_update_timestamp  = now,
+            last_update_user       = 'administrator'
+        ).save(force_insert=True)
+
+    er_list = list(EventsRequest.objects.all().order_by('request_id'))
+    claimed_list = ag.claim_event_requests(er_list, NORMAL, now - datetime.timedelta(seconds=600))
+    assert len(claimed_list) == 2
+
+    # 他ホストが占有し直す
+    EventsRequest.objects.filter(trace_id='TOS_pytest_lease_0').update(
+        status_update_id='pytest_other_host', last_update_timestamp=now + datetime.timedelta(seconds=1))
+
+    agent = ag.Agent(now=now)
+    assert agent._update_event_request(claimed_list[0], PROCESSED) == False
+    assert agent._update_event_request(claimed_list[1], PROCESSED) == True
+
+    assert EventsRequest.objects.get(trace_id='TOS_pytest_lease_0').status == PROCESSING
+    assert EventsRequest.objects.get(trace_id='TOS_pytest_lease_1').status == PROCESSED
+
+    EventsRequest.objects.all().delete()
+
+
+################################################
+# テスト(DM同時リクエスト数制御)
+################################################
+def test_dm_concurrency_ok_adaptive():
+    """
+    DM同時リクエスト数制御
+    正常系(応答が安定していれば増やし、エラー率が上がれば半減する)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    dmc = ag.DMConcurrency()
+    dmc.configure(8, True)
+    assert dmc.limit == 5
+
+    # 安定応答で上限まで増加
+    for i in range(40):
+        dmc.acquire()
+        dmc.release(0.1, False)
+
+    assert dmc.limit == 8
+
+    # エラー多発で半減(設定を再適用して計測区間を揃える)
+    dmc.configure(8, True)
+    assert dmc.limit == 8
+    for i in range(8):
+        dmc.acquire()
+        dmc.release(0.1, True)
+
+    assert dmc.limit == 4
+
+    metrics = dmc.take_metrics()
+    assert metrics['requests'] == 48
+    assert metrics['errors'] == 8
+    assert metrics['max_worker'] == 8
+    assert dmc.take_metrics()['requests'] == 0
+
+    # 適応モード解除時は設定値を上限とする
+    dmc.configure(20, False)
+    assert dmc.limit == 20
+
+
+def test_run_cycle_ok_metrics(monkeypatch):
+    """
+    周期毎の処理性能
+    正常系(LOG_LEVEL=NORMALでも出力する)
+    """
+    from logging import Handler
+    from backyards.agent_driver import oase_agent as ag
+
+    record_list = []
+    class _ListHandler(Handler):
+        def emit(self, record):
+            record_list.append((record.logid, record.getMessage()))
+
+    monkeypatch.setattr(ag.RuleTypeCache, 'refresh', lambda: None)
+    monkeypatch.setattr(ag, 'fetch_event_requests', lambda *args, **kwargs: [])
+    monkeypatch.setattr(ag, 'multi', lambda *args: 2)
+    monkeypatch.setattr(ag, 'check_rhdm_response_correlation', lambda now: None)
+
+    inner_logger = ag.logger._OaseLogger__logger
+    default_level = inner_logger.level
+    list_handler = _ListHandler()
+
+    try:
+        inner_logger.setLevel(ag.OaseLogger.DEBUG_LOG_LEVEL['NORMAL'])
+        inner_logger.addHandler(list_handler)
+
+        count = ag.run_cycle({'retry_max' : 5, 'batch_size' : 1, 'max_worker' : 1})
+
+    finally:
+        inner_logger.removeHandler(list_handler)
+        inner_logger.setLevel(default_level)
+
+    assert count == 4
+    assert [r[0] for r in record_list] == ['LOSI02010']
+    assert 'events:4,' in record_list[0][1]
+
+
+@pytest.mark.django_db
+def test_load_agent_settings_ok(django_db_setup_with_system_dmsettings):
+    """
+    エージェント設定読み込み
+    正常系(未登録の設定は既定値)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    System.objects.filter(config_id__in=['AGENT_MAX_WORKER', 'AGENT_ADAPTIVE_CONCURRENCY']).delete()
+
+    agent_conf = ag.load_agent_settings()
+
+    assert agent_conf['max_worker'] == ag.MAX_WORKER
+    assert agent_conf['adaptive'] == False
+    assert ag.dm_concurrency.limit == ag.MAX_WORKER
+
+
+################################################
+# テスト(常駐処理)
+################################################
+@pytest.mark.django_db
+def test_agent_daemon_ok_reload(django_db_setup_with_system_dmsettings, monkeypatch):
+    """
+    常駐処理
+    正常系(設定変更を検知して再読み込み)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    daemon = ag.AgentDaemon(0.1)
+
+    cycle_list = []
+    reload_list = []
+    current = {'version' : 'v1'}
+
+    def _dummy_run_cycle(agent_conf):
+        cycle_list.append(agent_conf)
+        current['version'] = 'v2'
+        if len(cycle_list) >= 3:
+            daemon.stop_flag = True
+        return 1
+
+    def _dummy_reload():
+        reload_list.append(daemon.conf_version)
+        daemon.conf_version = current['version']
+        daemon.reload_flag = False
+
+    monkeypatch.setattr(ag, 'run_cycle', _dummy_run_cycle)
+    monkeypatch.setattr(ag, 'disconnect', non_dummy)
+    monkeypatch.setattr(daemon, 'reload', _dummy_reload)
+    monkeypatch.setattr(daemon, 'get_conf_version', lambda: current['version'])
+
+    stop_list = []
+    monkeypatch.setattr(ag.NotifyOutbox, 'wake', lambda: None)
+    monkeypatch.setattr(ag.NotifyOutbox, 'stop', lambda: stop_list.append(True))
+
+    daemon.run()
+
+    # 起動時、および、版数変更時に再読み込み
+    assert len(cycle_list) == 3
+
+    # 停止時は送信待ちの未知事象通知を送信する
+    assert stop_list == [True]
+    assert reload_list == [None, 'v1']
+
+
+@pytest.mark.django_db
+def test_agent_daemon_ok_disconnect(django_db_setup_with_system_dmsettings, monkeypatch):
+    """
+    常駐処理
+    正常系(無通信時間が長い場合、および、異常発生後のみDBを再接続)
+    """
+    from backyards.agent_driver import oase_agent as ag
+
+    daemon = ag.AgentDaemon(0.1)
+    daemon.reload_flag = False
+    daemon.DB_IDLE_TIMEOUT = 0.05
+
+    cycle_list = []
+    disconnect_list = []
+
+    def _dummy_run_cycle(agent_conf):
+        cycle_list.append(agent_conf)
+
+        # 2周期目は処理対象なし(待機)、4周期目は異常
+        if len(cycle_list) == 2:
+            return 0
+
+        if len(cycle_list) >= 4:
+            daemon.stop_flag = True
+            raise Exception('pytest')
+
+        return 1
+
+    monkeypatch.setattr(ag, 'run_cycle', _dummy_run_cycle)
+    monkeypatch.setattr(ag, 'disconnect', lambda: disconnect_list.append(len(cycle_list)))
+    monkeypatch.setattr(daemon, 'get_conf_version', lambda: None)
+    monkeypatch.setattr(ag.NotifyOutbox, 'wake', lambda: None)
+    monkeypatch.setattr(ag.NotifyOutbox, 'stop', lambda: None)
+
+    daemon.run()
+
+    # 待機後の3周期目の前、および、異常発生後のみ再接続
+    assert len(cycle_list) == 4
+    assert disconnect_list == [2, 4]
@@ -0,0 +1,265 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+
+oase_logger.pyのテスト
+
+"""
+
+
+import os
+import json
+import queue
+import pytest
+from logging import DEBUG, WARNING, Formatter, Handler, makeLogRecord
+
+from libs.commonlibs.oase_logger import OaseLogger, LazyLogArg, OaseQueueHandler, EnhancedRotatingFileHandler
+from libs.commonlibs.oase_logger import OaseJsonFormatter, JsonLinesRotatingFileHandler
+
+
+def test_lazy_log_arg_ok():
+    """
+    遅延評価ログ引数の正常系テスト
+    """
+
+    arg = LazyLogArg('{}-{}'.format, 'a', 1)
+
+    assert str(arg) == 'a-1'
+    assert 'TraceID:{}'.format(arg) == 'TraceID:a-1'
+    assert '[{:>5}]'.format(arg) == '[  a-1]'
+
+
+@pytest.mark.django_db
+def test_logic_log_level_gating_ok():
+    """
+    ログレベル無効時にメッセージ編集を行わないことのテスト
+    """
+
+    logger = OaseLogger.get_instance()
+    inner_logger = logger._OaseLogger__logger
+    default_level = inner_logger.level
+
+    call_list = []
+    def _render(value):
+        call_list.append(value)
+        return value
+
+    try:
+        # DEBUG無効時は評価しない
+        inner_logger.setLevel(WARNING)
+        assert logger.is_debug_enabled() == False
+
+        logger.logic_log('LOSI00001', LazyLogArg(_render, 'logic'))
+        logger.system_log('LOSI02002', 'trace', LazyLogArg(_render, 'system'))
+        logger.user_log('LOSI00001', LazyLogArg(_render, 'user'))
+        assert call_list == []
+
+        # エラーログは出力する
+        logger.system_log('LOSM13024', LazyLogArg(_render, 'error'))
+        assert call_list == ['error']
+
+        # DEBUG有効時は評価する
+        inner_logger.setLevel(DEBUG)
+        assert logger.is_debug_enabled() == True
+
+        logger.logic_log('LOSI00001', LazyLogArg(_render, 'logic'))
+        assert call_list == ['error', 'logic']
+        assert logger.get_last_error() == ''
+
+    finally:
+        inner_logger.setLevel(default_level)
+
+
+@pytest.mark.django_db
+def test_normal_log_level_ok():
+    """
+    LOG_LEVEL=NORMALでも運用情報のログIDは出力することのテスト
+    """
+
+    logger = OaseLogger.get_instance()
+    inner_logger = logger._OaseLogger__logger
+    default_level = inner_logger.level
+
+    logid_list = []
+    class _ListHandler(Handler):
+        def emit(self, record):
+            logid_list.append(record.logid)
+
+    list_handler = _ListHandler(DEBUG)
+
+    try:
+        inner_logger.setLevel(OaseLogger.DEBUG_LOG_LEVEL['NORMAL'])
+        inner_logger.addHandler(list_handler)
+
+        logger.logic_log('LOSI00001', 'logic')
+        logger.logic_log('LOSI02009', None)
+        logger.system_log('LOSI02011', 1, 2, 0.0, 0.1, 0.1)
+        logger.system_log('LOSM13024', 'error')
+
+        assert logid_list == ['LOSI02009', 'LOSI02011', 'LOSM13024']
+
+    finally:
+        inner_logger.removeHandler(list_handler)
+        inner_logger.setLevel(default_level)
+
+
+def test_queue_handler_drop_ok():
+    """
+    キュー満杯時にレコードを破棄し、破棄件数を通知することのテスト
+    """
+
+    log_queue = queue.Queue(2)
+    handler = OaseQueueHandler(log_queue, block=False)
+
+    for i in range(5):
+        handler.handle(makeLogRecord({'name':'test', 'msg':'msg%s' % i}))
+
+    assert log_queue.qsize() == 2
+    assert handler.dropped_count == 3
+
+    # 空きができた時点で破棄件数を通知する
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    handler.handle(makeLogRecord({'name':'test', 'msg':'msg5'}))
+
+    assert log_queue.get_nowait().msg == 'msg5'
+    dropped_record = log_queue.get_nowait()
+    assert dropped_record.logid == 'LOSM00047'
+    assert '(count:3)' in dropped_record.msg
+    assert handler.dropped_count == 0
+
+
+def test_queue_handler_fork_ok():
+    """
+    生成元と異なるプロセスでは、キューを使わず同期出力用のハンドラに渡すことのテスト
+    """
+
+    record_list = []
+    class _ListHandler(Handler):
+        def emit(self, record):
+            record_list.append(record.msg)
+
+    sync_handler = _ListHandler(WARNING)
+    fork_list = []
+    def _on_fork():
+        fork_list.append(os.getpid())
+        return [sync_handler, ]
+
+    log_queue = queue.Queue(2)
+    handler = OaseQueueHandler(log_queue, block=True, on_fork=_on_fork)
+
+    handler.handle(makeLogRecord({'name':'test', 'msg':'parent', 'levelno':WARNING}))
+    assert log_queue.qsize() == 1
+    assert fork_list == []
+
+    # fork後の子プロセスを模擬
+    handler.pid = -1
+    handler.handle(makeLogRecord({'name':'test', 'msg':'child', 'levelno':WARNING}))
+    handler.handle(makeLogRecord({'name':'test', 'msg':'child_debug', 'levelno':DEBUG}))
+
+    assert log_queue.qsize() == 1
+    assert record_list == ['child']
+    assert len(fork_list) == 2
+
+
+def test_rotating_file_handler_size_ok(tmp_path):
+    """
+    ファイルサイズを加算管理し、上限でローテーションすることのテスト
+    """
+
+    log_file_path = str(tmp_path / 'test.log')
+    handler = EnhancedRotatingFileHandler(
+        filename=log_file_path, when='MIDNIGHT', interval=1,
+        backup_count=3, encoding='utf-8', max_bytes=100
+    )
+    handler.setFormatter(Formatter('%(message)s'))
+
+    try:
+        handler.handle(makeLogRecord({'msg':'あ' * 10}))
+        assert handler.stream_size == os.path.getsize(log_file_path) == 31
+
+        for i in range(3):
+            handler.handle(makeLogRecord({'msg':'x' * 29}))
+
+        assert handler.stream_size == os.path.getsize(log_file_path) == 30
+        assert len(os.listdir(str(tmp_path))) == 2
+
+    finally:
+        handler.close()
+
+
+def test_json_formatter_ok():
+    """
+    JSON Lines形式のログ編集のテスト
+    """
+
+    formatter = OaseJsonFormatter('oase_agent')
+
+    # トレースIDをメッセージから抽出
+    record = makeLogRecord({
+        'msg':'DM post data. TraceID:TOS_20201001123456789012_0000000001 \n{}',
+        'levelname':'DEBUG', 'logtype':'system', 'logid':'LOSI02002',
+    })
+    data = json.loads(formatter.format(record))
+
+    assert data['trace_id'] == 'TOS_20201001123456789012_0000000001'
+    assert data['log_id'] == 'LOSI02002'
+    assert data['component'] == 'oase_agent'
+    assert 'elapsed_ms' not in data
+
+    # トレースIDと処理時間の指定
+    record = makeLogRecord({'msg':'Response.', 'trace_id':'TOS_1', 'elapsed':0.0125})
+    data = json.loads(formatter.format(record))
+
+    assert data['trace_id'] == 'TOS_1'
+    assert data['elapsed_ms'] == 12.5
+
+
+def test_json_handler_index_ok(tmp_path):
+    """
+    ローテーション時にトレースIDのインデックスを作成することのテスト
+    """
+
+    log_file_path = str(tmp_path / 'test.jsonl')
+    handler = JsonLinesRotatingFileHandler(
+        filename=log_file_path, when='MIDNIGHT', interval=1,
+        backup_count=3, encoding='utf-8', max_bytes=10000
+    )
+    handler.setFormatter(OaseJsonFormatter('test'))
+
+    try:
+        for i in range(4):
+            handler.handle(makeLogRecord({'msg':'TraceID:%s' % ('TOS_A' if i % 2 == 0 else 'TOS_B'), 'trace_id':'TOS_A' if i % 2 == 0 else 'TOS_B'}))
+
+        handler.doRollover()
+
+        rotated_path = [os.path.join(str(tmp_path), f) for f in os.listdir(str(tmp_path)) if f.startswith('test.jsonl.')][0]
+        with open(JsonLinesRotatingFileHandler.get_index_path(rotated_path)) as f:
+            index = json.load(f)
+
+        assert len(index['TOS_A']) == 2
+        assert len(index['TOS_B']) == 2
+
+        with open(rotated_path, 'rb') as f:
+            f.seek(index['TOS_B'][1])
+            assert json.loads(f.readline().decode('utf-8'))['trace_id'] == 'TOS_B'
+
+        # ローテーション済みファイルの削除時にインデックスも削除
+        handler.on_delete(rotated_path)
+        assert not os.path.exists(JsonLinesRotatingFileHandler.get_index_path(rotated_path))
+
+    finally:
+        handler.close()
@@ -0,0 +1,126 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+
+rabbitmq.pyのテスト
+
+"""
+
+
+import pytest
+import threading
+import pika
+
+from libs.commonlibs.rabbitmq import RabbitMQ, RabbitMQPublisher
+
+
+class DummyConnection:
+
+    def __init__(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+class DummyChannel:
+
+    def __init__(self, call_list, fail_at=None):
+        self.is_open   = True
+        self.call_list = call_list
+        self.fail_at   = fail_at
+
+    def queue_declare(self, queue, durable):
+        self.call_list.append(('declare', queue))
+
+    def queue_bind(self, exchange, queue, routing_key):
+        self.call_list.append(('bind', queue))
+
+    def tx_select(self):
+        self.call_list.append(('select', None))
+
+    def tx_commit(self):
+        self.call_list.append(('commit', None))
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if body == self.fail_at:
+            self.fail_at = None
+            raise pika.exceptions.AMQPConnectionError()
+
+        self.call_list.append(('publish', body))
+
+
+@pytest.mark.django_db
+def test_publish_ok_retry(monkeypatch):
+    """
+    RabbitMQPublisher.publish 正常系
+    ※キューのバインドは1度のみ、接続エラー時はコミット済みでない分から再送
+    """
+
+    call_list = []
+    channel_list = [
+        DummyChannel(call_list, fail_at='d'),
+        DummyChannel(call_list),
+    ]
+
+    monkeypatch.setattr(RabbitMQ, 'settings', classmethod(lambda cls: {'queuename': 'pytest_queue'}))
+    monkeypatch.setattr(RabbitMQ, 'connect', classmethod(lambda cls, s: (channel_list.pop(0), DummyConnection())))
+    monkeypatch.setattr(RabbitMQPublisher, '_local', threading.local())
+    monkeypatch.setattr(RabbitMQPublisher, '_settings', None)
+    monkeypatch.setattr(RabbitMQPublisher, '_declared', False)
+    monkeypatch.setattr(RabbitMQPublisher, 'RETRY_DELAY', 0)
+    monkeypatch.setattr(RabbitMQPublisher, 'COMMIT_SIZE', 2)
+
+    assert RabbitMQPublisher.publish(['a', 'b', 'c', 'd', 'e']) == 5
+
+    assert call_list == [
+        ('declare', 'pytest_queue'),
+        ('bind', 'pytest_queue'),
+        ('select', None),
+        ('publish', 'a'),
+        ('publish', 'b'),
+        ('commit', None),
+        ('publish', 'c'),
+        ('select', None),
+        ('publish', 'c'),
+        ('publish', 'd'),
+        ('commit', None),
+        ('publish', 'e'),
+        ('commit', None),
+    ]
+
+
+@pytest.mark.django_db
+def test_publish_ng(monkeypatch):
+    """
+    RabbitMQPublisher.publish 異常系
+    ※再試行しても接続できない場合は例外
+    """
+
+    def _connect(cls, s):
+        raise pika.exceptions.AMQPConnectionError()
+
+    monkeypatch.setattr(RabbitMQ, 'settings', classmethod(lambda cls: {'queuename': 'pytest_queue'}))
+    monkeypatch.setattr(RabbitMQ, 'connect', classmethod(_connect))
+    monkeypatch.setattr(RabbitMQPublisher, '_local', threading.local())
+    monkeypatch.setattr(RabbitMQPublisher, '_settings', None)
+    monkeypatch.setattr(RabbitMQPublisher, 'RETRY_DELAY', 0)
+
+    with pytest.raises(pika.exceptions.AMQPConnectionError) as e:
+        RabbitMQPublisher.publish(['a'])
+
+    # 送信済み件数を例外に設定
+    assert e.value.sent == 0
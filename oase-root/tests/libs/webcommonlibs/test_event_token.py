@@ -0,0 +1,102 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+
+event_token.pyのテスト
+
+"""
+import pytest
+import datetime
+import pytz
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from libs.webcommonlibs import event_token
+from libs.webcommonlibs.event_token import OASEEventToken
+from web_app.models.models import TokenInfo
+
+
+class DummyCache:
+    """
+    テスト用のmemcached
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def add(self, key, value, timeout=None):
+        self.data.setdefault(key, value)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+
+@pytest.mark.django_db
+def test_check_token_ok_cache(monkeypatch):
+    """
+    トークンチェックテスト
+    ※正常系(バージョンが変わるまでDBを参照せず、変更通知で再読込)
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    shared_cache = DummyCache()
+    monkeypatch.setattr(event_token, 'cache', shared_cache)
+
+    TokenInfo.objects.filter(last_update_user='pytest').delete()
+    TokenInfo(
+        token_name='pytest_token1',
+        token_data='pytest_token_data_1',
+        use_start_time=None,
+        use_end_time=None,
+        last_update_timestamp=now,
+        last_update_user='pytest'
+    ).save(force_insert=True)
+
+    try:
+        evtoken = OASEEventToken.get_instance()
+        evtoken.initialize()
+
+        assert evtoken.check_token('Bearer pytest_token_data_1') == OASEEventToken.STS_OK
+        assert 'pytest_token_data_1' not in evtoken.token_info
+
+        # バージョンが変わらなければトークン情報を読み直さない
+        with CaptureQueriesContext(connection) as ctx:
+            assert evtoken.check_token('Bearer pytest_token_data_1') == OASEEventToken.STS_OK
+            assert evtoken.check_token('Bearer pytest_token_data_2') == OASEEventToken.STS_INVALID
+
+        assert len(ctx.captured_queries) == 0
+
+        # 他プロセスでの変更通知を反映
+        TokenInfo(
+            token_name='pytest_token2',
+            token_data='pytest_token_data_2',
+            use_start_time=None,
+            use_end_time=now - datetime.timedelta(days=1),
+            last_update_timestamp=now,
+            last_update_user='pytest'
+        ).save(force_insert=True)
+        shared_cache.set(OASEEventToken.VERSION_KEY, 'changed')
+
+        assert evtoken.check_token('Token pytest_token_data_2') == OASEEventToken.STS_INVALID
+        assert evtoken.version == 'changed'
+        assert len(evtoken.token_info) == TokenInfo.objects.count()
+
+    finally:
+        TokenInfo.objects.filter(last_update_user='pytest').delete()
+        OASEEventToken.get_instance().initialize()
@@ -17,7 +17,16 @@
 common.pyのテスト
 
 """
-from libs.webcommonlibs.events_request import EventsRequestCommon
+import pytest
+
+import datetime
+import pytz
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from libs.webcommonlibs.events_request import EventsRequestCommon, RuleTypeNameCache
+from web_app.models.models import RuleType
 
 
 def test_generate_trace_id_ok():
@@ -31,6 +40,55 @@ def test_generate_trace_id_ok():
     assert len(trace_id) == 55
 
 
+@pytest.mark.django_db
+def test_generate_trace_id_ok_block(monkeypatch):
+    """
+    トレースID生成テスト
+    ※正常系(ブロック予約)
+    """
+
+    reserve_list = []
+    def _dummy_update_count(block_size):
+        reserve_list.append(block_size)
+        return [999999998, 1][len(reserve_list) - 1]
+
+    monkeypatch.setattr(EventsRequestCommon, 'TRACE_ID_BLOCK_SIZE', 3)
+    monkeypatch.setattr(EventsRequestCommon, '_trace_id_pid', None)
+    monkeypatch.setattr(EventsRequestCommon, '_update_count', _dummy_update_count)
+
+    trace_id_list = EventsRequestCommon.generate_trace_id(req=2)
+    trace_id_list.extend(EventsRequestCommon.generate_trace_id(req=2))
+
+    # 予約ブロックを使い切るまでDBへアクセスしない
+    assert reserve_list == [3, 3]
+    assert len(trace_id_list) == len(set(trace_id_list)) == 4
+    assert all(len(t) == 35 for t in trace_id_list)
+    assert trace_id_list[2].endswith('_0000000000')
+
+
+@pytest.mark.django_db
+def test_generate_trace_id_ok_fork(monkeypatch):
+    """
+    トレースID生成テスト
+    ※正常系(プロセスが異なる場合は予約ブロックを破棄)
+    """
+
+    reserve_list = []
+    def _dummy_update_count(block_size):
+        reserve_list.append(block_size)
+        return 0
+
+    monkeypatch.setattr(EventsRequestCommon, 'TRACE_ID_BLOCK_SIZE', 10)
+    monkeypatch.setattr(EventsRequestCommon, '_trace_id_pid', None)
+    monkeypatch.setattr(EventsRequestCommon, '_update_count', _dummy_update_count)
+
+    EventsRequestCommon.generate_trace_id()
+    monkeypatch.setattr(EventsRequestCommon, '_trace_id_pid', -1)
+    EventsRequestCommon.generate_trace_id()
+
+    assert reserve_list == [10, 10]
+
+
 def test_check_events_request_key_ok():
     """
     トレースID生成テスト
@@ -177,3 +235,92 @@ def test_check_events_request_len_ng_errlen():
     assert result == EventsRequestCommon.REQUEST_ERR_EVINFO_LENGTH
 
 
+@pytest.mark.django_db
+def test_rule_type_name_cache_ok(monkeypatch):
+    """
+    ルール種別キャッシュテスト
+    ※正常系(確認間隔内はDBを参照せず、変更後の確認で読み直す)
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    RuleTypeNameCache.clear()
+
+    rt = RuleType(
+        rule_type_name='pytest_name_cache',
+        rule_table_name='pytestnamecache',
+        generation_limit=5,
+        group_id='com.pytest',
+        artifact_id='pytestnamecache',
+        container_id_prefix_staging='test',
+        container_id_prefix_product='prod',
+        label_count=2,
+        last_update_timestamp=now,
+        last_update_user='pytest'
+    )
+    rt.save(force_insert=True)
+
+    try:
+        info = RuleTypeNameCache.get('pytest_name_cache')
+        assert info == (rt.rule_type_id, 2)
+
+        # 確認間隔内はDBを参照しない
+        with CaptureQueriesContext(connection) as ctx:
+            assert RuleTypeNameCache.get('pytest_name_cache') == info
+            assert RuleTypeNameCache.get('pytest_name_unknown') is None
+
+        assert len(ctx.captured_queries) == 0
+
+        # 変更後、確認間隔を過ぎたら読み直す
+        RuleType.objects.filter(rule_type_id=rt.rule_type_id).update(
+            label_count=3, last_update_timestamp=now + datetime.timedelta(seconds=1))
+        monkeypatch.setattr(RuleTypeNameCache, 'CACHE_TTL', 0)
+
+        assert RuleTypeNameCache.get('pytest_name_cache') == (rt.rule_type_id, 3)
+
+    finally:
+        RuleType.objects.filter(last_update_user='pytest').delete()
+        RuleTypeNameCache.clear()
+
+
+@pytest.mark.django_db
+def test_rule_type_name_cache_ok_miss(monkeypatch):
+    """
+    ルール種別キャッシュテスト
+    ※正常系(確認間隔内に追加されたルール種別は、未登録時の再確認で取得する)
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    RuleTypeNameCache.clear()
+    monkeypatch.setattr(RuleTypeNameCache, 'CACHE_TTL', 3600)
+
+    try:
+        assert RuleTypeNameCache.get('pytest_name_added') is None
+
+        rt = RuleType(
+            rule_type_name='pytest_name_added',
+            rule_table_name='pytestnameadded',
+            generation_limit=5,
+            group_id='com.pytest',
+            artifact_id='pytestnameadded',
+            container_id_prefix_staging='test',
+            container_id_prefix_product='prod',
+            label_count=2,
+            last_update_timestamp=now,
+            last_update_user='pytest'
+        )
+        rt.save(force_insert=True)
+
+        # 再確認の間隔内は未登録のまま(DBを参照しない)
+        monkeypatch.setattr(RuleTypeNameCache, 'MISS_CHECK_INTERVAL', 3600)
+        with CaptureQueriesContext(connection) as ctx:
+            assert RuleTypeNameCache.get('pytest_name_added') is None
+
+        assert len(ctx.captured_queries) == 0
+
+        # 再確認の間隔を過ぎていれば、確認間隔内でも読み直す
+        monkeypatch.setattr(RuleTypeNameCache, 'MISS_CHECK_INTERVAL', 0)
+        assert RuleTypeNameCache.get('pytest_name_added') == (rt.rule_type_id, 2)
+
+    finally:
+        RuleType.objects.filter(last_update_user='pytest').delete()
+        RuleTypeNameCache.clear()
@@ -0,0 +1,95 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+
+ip_address_list.pyのテスト
+
+"""
+import pytest
+import datetime
+import pytz
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from libs.webcommonlibs.ip_address_list import IPAddressMatcher, IPAddressList
+from web_app.models.models import BlackListIPAddress
+
+
+def test_matcher_ok():
+    """
+    IPアドレス照合テスト
+    ※正常系(完全一致、前方一致、CIDR)
+    """
+
+    matcher = IPAddressMatcher(['192.168.0.1', '10.1.*', '172.16.0.0/12', '', 'abc/xyz'])
+
+    assert matcher.match('192.168.0.1') == '192.168.0.1'
+    assert matcher.match('10.1.2.3') == '10.1.*'
+    assert matcher.match('172.31.255.1') == '172.16.0.0/12'
+    assert matcher.match('192.168.0.2') is None
+    assert matcher.match('10.10.0.1') is None
+    assert matcher.match('172.32.0.1') is None
+    assert matcher.match('abc/xyz') == 'abc/xyz'
+
+    assert IPAddressMatcher(['*']).match('1.2.3.4') == '*'
+    assert IPAddressMatcher([]).match('1.2.3.4') is None
+
+
+@pytest.mark.django_db
+def test_active_black_list_ok():
+    """
+    有効なブラックリスト取得テスト
+    ※正常系(IPアドレス毎の最新レコードが未解除のもののみ、1回のクエリで取得)
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    BlackListIPAddress.objects.filter(last_update_user='pytest').delete()
+
+    for ipaddr, release in [
+        ('192.0.2.1', None), ('192.0.2.1', now),
+        ('192.0.2.2', now),  ('192.0.2.2', None),
+        ('192.0.2.3', None),
+    ]:
+        BlackListIPAddress(
+            ipaddr=ipaddr,
+            release_timestamp=release,
+            last_update_timestamp=now,
+            last_update_user='pytest'
+        ).save(force_insert=True)
+
+    try:
+        with CaptureQueriesContext(connection) as ctx:
+            ip_list = sorted(IPAddressList.active_black_list().filter(last_update_user='pytest').values_list('ipaddr', flat=True))
+
+        assert ip_list == ['192.0.2.2', '192.0.2.3']
+        assert len(ctx.captured_queries) == 1
+
+        # 変更時は再読込
+        white, black = IPAddressList.get_matchers()
+        assert black.match('192.0.2.3') == '192.0.2.3'
+
+        BlackListIPAddress(
+            ipaddr='192.0.2.3',
+            release_timestamp=now,
+            last_update_timestamp=now,
+            last_update_user='pytest'
+        ).save(force_insert=True)
+
+        white, black = IPAddressList.get_matchers()
+        assert black.match('192.0.2.3') is None
+
+    finally:
+        BlackListIPAddress.objects.filter(last_update_user='pytest').delete()
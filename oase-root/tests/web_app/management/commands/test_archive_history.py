@@ -0,0 +1,135 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+
+archive_history.pyのテスト
+
+"""
+
+
+import datetime
+import pytest
+import pytz
+
+from django.core.management import call_command
+
+from libs.commonlibs.define import *
+from web_app.models.models import System
+from web_app.models.models import EventsRequest, ActionHistory, ActionLog
+from web_app.models.models import EventsRequestArchive, ActionHistoryArchive, ActionLogArchive
+
+
+def create_data(no, timestamp, req_status=RULE_MATCH, act_status=None):
+    """
+    リクエスト、アクション履歴、アクション履歴ログを登録する
+    """
+
+    trace_id = 'TOS_ARCHIVE_%023d' % no
+
+    EventsRequest.objects.create(
+        trace_id               = trace_id,
+        request_type_id        = PRODUCTION,
+        rule_type_id           = 1,
+        request_reception_time = timestamp,
+        request_user           = 'pytest',
+        request_server         = 'pytest',
+        event_to_time          = timestamp,
+        event_info             = '{"EVENT_INFO":["pytest"]}',
+        status                 = req_status,
+        status_update_id       = 'pytest',
+        retry_cnt              = 0,
+        last_update_timestamp  = timestamp,
+        last_update_user       = 'pytest',
+    )
+
+    if act_status is None:
+        return trace_id
+
+    ActionHistory.objects.create(
+        response_id            = no,
+        trace_id               = trace_id,
+        rule_type_id           = 1,
+        rule_type_name         = 'pytest',
+        rule_name              = 'pytest_rule',
+        execution_order        = 1,
+        action_start_time      = timestamp,
+        action_type_id         = 1,
+        status                 = act_status,
+        status_detail          = ACTION_HISTORY_STATUS.DETAIL_STS.NONE,
+        action_retry_count     = 0,
+        last_act_user          = 'pytest',
+        last_update_timestamp  = timestamp,
+        last_update_user       = 'pytest',
+    )
+
+    ActionLog.objects.create(
+        response_id            = no,
+        execution_order        = 1,
+        trace_id               = trace_id,
+        message_id             = 'MOSJA01001',
+        last_update_timestamp  = timestamp,
+    )
+
+    return trace_id
+
+
+@pytest.mark.django_db
+def test_archive_history_ok():
+    """
+    保存期間を過ぎた処理済みのレコードのみをアーカイブへ移動することのテスト
+    """
+
+    EventsRequest.objects.all().delete()
+    ActionHistory.objects.all().delete()
+    ActionLog.objects.all().delete()
+
+    System.objects.filter(config_id='DATA_HOT_PERIOD').update(value='31')
+    System.objects.filter(config_id='DATA_ARCHIVE_PERIOD').update(value='400')
+    System.objects.filter(config_id='DATA_ARCHIVE_BATCH_SIZE').update(value='2')
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+    expired = now - datetime.timedelta(days=40)
+
+    # 保管期間切れのアーカイブ
+    EventsRequestArchive.objects.create(
+        request_id             = 999999,
+        trace_id               = 'TOS_ARCHIVE_PURGE'.ljust(35, '0'),
+        request_type_id        = PRODUCTION,
+        rule_type_id           = 1,
+        request_reception_time = now - datetime.timedelta(days=401),
+        request_user           = 'pytest',
+        request_server         = 'pytest',
+        event_to_time          = now - datetime.timedelta(days=401),
+        event_info             = '{"EVENT_INFO":["pytest"]}',
+        status                 = RULE_MATCH,
+        last_update_user       = 'pytest',
+    )
+
+    moved_event_only = create_data(1, expired)
+    moved_with_action = create_data(2, expired, act_status=PROCESSED)
+    remained_by_action = create_data(3, expired, act_status=ACTION_HISTORY_STATUS.RETRY)
+    remained_by_status = create_data(4, expired, req_status=PROCESSING)
+    remained_by_period = create_data(5, now - datetime.timedelta(days=1), act_status=PROCESSED)
+
+    call_command('archive_history', interval=0)
+
+    assert set(EventsRequestArchive.objects.values_list('trace_id', flat=True)) == {moved_event_only, moved_with_action}
+    assert set(EventsRequest.objects.values_list('trace_id', flat=True)) == {remained_by_action, remained_by_status, remained_by_period}
+
+    assert list(ActionHistoryArchive.objects.values_list('trace_id', flat=True)) == [moved_with_action]
+    assert list(ActionLogArchive.objects.values_list('trace_id', flat=True)) == [moved_with_action]
+    assert set(ActionHistory.objects.values_list('trace_id', flat=True)) == {remained_by_action, remained_by_period}
+    assert ActionLog.objects.filter(trace_id=moved_with_action).count() == 0
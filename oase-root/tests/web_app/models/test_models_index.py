@@ -0,0 +1,269 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+
+バックヤードのポーリング検索の実行計画テスト
+
+  環境変数 OASE_QUERY_PLAN_ROWS に登録件数(例:1000000)を指定した場合のみ実行する
+  各テーブルに指定件数のデータを登録し、ポーリング検索がテーブルの全件走査にならないことを確認する
+  ※テスト終了時に登録したデータは削除する
+
+"""
+
+
+import os
+import random
+import datetime
+import pytest
+import pytz
+
+from django.db import connection
+from django.db.models import Q
+
+from libs.commonlibs.define import *
+from web_app.models.models import EventsRequest, RhdmResponse, RhdmResponseAction, ActionHistory, ActionLog
+
+
+PLAN_ROWS = int(os.environ.get('OASE_QUERY_PLAN_ROWS', '0') or 0)
+TRACE_ID_PREFIX = 'TOS_PLAN_'
+CHUNK_SIZE = 10000
+
+pytestmark = pytest.mark.skipif(PLAN_ROWS <= 0, reason='OASE_QUERY_PLAN_ROWS is not set')
+
+
+def make_data(now):
+    """
+    実運用に近い分布(大半が処理済み)でデータを登録する
+    """
+
+    random.seed(0)
+    request_status_list = [RULE_MATCH] * 90 + [RULE_UNMATCH] * 5 + [RULE_ERROR] * 3 + [UNPROCESS, PROCESSING]
+    response_status_list = [PROCESSED] * 90 + [ACTION_EXEC_ERROR] * 5 + [FORCE_PROCESSED] * 3 + [UNPROCESS, PROCESSING]
+    history_status_list = response_status_list + [ACTION_HISTORY_STATUS.EXASTRO_REQUEST, ACTION_HISTORY_STATUS.ITA_REGISTERING_SUBSTITUTION_VALUE]
+    retry_status_list = [None] * 998 + [ACTION_HISTORY_STATUS.EXASTRO_REQUEST, PROCESSED]
+
+    for offset in range(0, PLAN_ROWS, CHUNK_SIZE):
+        event_list = []
+        response_list = []
+        response_action_list = []
+        history_list = []
+        log_list = []
+
+        for i in range(offset, min(offset + CHUNK_SIZE, PLAN_ROWS)):
+            trace_id = '%s%026d' % (TRACE_ID_PREFIX, i)
+            timestamp = now - datetime.timedelta(seconds=random.randrange(86400 * 365))
+
+            event_list.append(EventsRequest(
+                trace_id               = trace_id,
+                request_type_id        = PRODUCTION if random.randrange(10) else STAGING,
+                rule_type_id           = random.randrange(1, 101),
+                request_reception_time = timestamp,
+                request_user           = 'plan',
+                request_server         = 'plan',
+                event_to_time          = timestamp,
+                event_info             = '{"EVENT_INFO":["plan"]}',
+                status                 = random.choice(request_status_list),
+                status_update_id       = 'plan',
+                retry_cnt              = 0,
+                last_update_timestamp  = timestamp,
+                last_update_user       = 'plan',
+            ))
+
+            response_list.append(RhdmResponse(
+                trace_id               = trace_id,
+                request_reception_time = timestamp,
+                request_type_id        = PRODUCTION if random.randrange(10) else STAGING,
+                resume_order           = 1,
+                resume_timestamp       = None,
+                status                 = random.choice(response_status_list),
+                status_update_id       = 'plan',
+                last_update_timestamp  = timestamp,
+                last_update_user       = 'plan',
+            ))
+
+            response_action_list.append(RhdmResponseAction(
+                response_id            = -(i + 1),
+                rule_name              = 'plan_rule_%d' % random.randrange(1000),
+                execution_order        = 1,
+                action_type_id         = 1,
+                action_parameter_info  = '{}',
+                action_pre_info        = '{}',
+                action_retry_interval  = 1,
+                action_retry_count     = 1,
+                last_update_timestamp  = timestamp,
+                last_update_user       = 'plan',
+            ))
+
+            history_list.append(ActionHistory(
+                response_id            = -(i + 1),
+                trace_id               = trace_id,
+                rule_type_id           = random.randrange(1, 101),
+                rule_type_name         = 'plan',
+                rule_name              = 'plan_rule_%d' % random.randrange(1000),
+                execution_order        = 1,
+                action_start_time      = timestamp,
+                action_type_id         = 1,
+                status                 = random.choice(history_status_list),
+                status_detail          = ACTION_HISTORY_STATUS.DETAIL_STS.NONE,
+                retry_flag             = random.randrange(1000) == 0,
+                retry_status           = random.choice(retry_status_list),
+                action_retry_count     = 0,
+                last_act_user          = 'plan',
+                last_update_timestamp  = timestamp,
+                last_update_user       = 'plan',
+            ))
+
+            log_list.append(ActionLog(
+                response_id            = -(i + 1),
+                execution_order        = 1,
+                trace_id               = trace_id,
+                message_id             = 'MOSJA01001',
+                last_update_timestamp  = timestamp,
+            ))
+
+        EventsRequest.objects.bulk_create(event_list)
+        RhdmResponse.objects.bulk_create(response_list)
+        RhdmResponseAction.objects.bulk_create(response_action_list)
+        ActionHistory.objects.bulk_create(history_list)
+        ActionLog.objects.bulk_create(log_list)
+
+
+def delete_data():
+    """
+    登録したデータを削除する
+    """
+
+    EventsRequest.objects.filter(trace_id__startswith=TRACE_ID_PREFIX).delete()
+    RhdmResponse.objects.filter(trace_id__startswith=TRACE_ID_PREFIX).delete()
+    RhdmResponseAction.objects.filter(response_id__lt=0).delete()
+    ActionHistory.objects.filter(response_id__lt=0).delete()
+    ActionLog.objects.filter(response_id__lt=0).delete()
+
+
+@pytest.fixture(scope='module')
+def plan_data(django_db_setup, django_db_blocker):
+    """
+    セットアップ：
+        各テーブルにデータを登録し、統計情報を更新する
+    ティアダウン：
+        登録したデータを削除する
+    """
+
+    with django_db_blocker.unblock():
+        now = datetime.datetime.now(pytz.timezone('UTC'))
+        delete_data()
+        make_data(now)
+
+        with connection.cursor() as cursor:
+            for model in (EventsRequest, RhdmResponse, RhdmResponseAction, ActionHistory, ActionLog):
+                cursor.execute('ANALYZE TABLE %s' % model._meta.db_table)
+                cursor.fetchall()
+
+    yield now
+
+    with django_db_blocker.unblock():
+        delete_data()
+
+
+def explain(queryset):
+    """
+    検索の実行計画を取得する
+    """
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [c[0].lower() for c in cursor.description]
+
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# バックヤードのポーリング検索(各処理と同じ検索条件)
+POLLING_QUERY_LIST = [
+    # エージェント:未処理リクエストの読み込み
+    ('agent_fetch', lambda now: EventsRequest.objects.filter(
+        status=UNPROCESS, request_id__gt=0, request_id__lte=2 ** 31 - 1
+    ).order_by('request_id')[:1000]),
+
+    # エージェント:処理中リクエストの読み込み(リカバリ)
+    ('agent_recover', lambda now: EventsRequest.objects.filter(
+        status=PROCESSING, request_id__gt=0, request_id__lte=2 ** 31 - 1
+    ).order_by('request_id')[:1000]),
+
+    # ServiceNow通知:ルール未検出リクエストの取得
+    ('servicenow_notification', lambda now: EventsRequest.objects.filter(
+        status=RULE_UNMATCH, request_type_id=PRODUCTION, rule_type_id__in=[1, 2, 3]
+    ).order_by('request_id')),
+
+    # アクション:実行対象の取得
+    ('action_normal', lambda now: RhdmResponse.objects.filter(request_type_id=PRODUCTION).filter(
+        Q(status=UNPROCESS)
+        | Q(status=WAITING)
+        | Q(status=ACTION_HISTORY_STATUS.SNOW_APPROVAL_PENDING)
+        | Q(status=ACTION_HISTORY_STATUS.SNOW_APPROVED)
+        | Q(status=ACTION_HISTORY_STATUS.RETRY, resume_timestamp__isnull=False, resume_timestamp__lte=now)
+    ).order_by('request_reception_time')),
+
+    # アクション:リカバリ対象の取得
+    ('action_recover', lambda now: RhdmResponse.objects.filter(
+        Q(status_update_id='plan_host') | Q(last_update_timestamp__lt=now - datetime.timedelta(seconds=600)),
+        status=PROCESSING,
+    )),
+
+    # アクション:再実行対象の取得
+    ('action_retry', lambda now: ActionHistory.objects.filter(retry_flag=True)),
+
+    # アクション:Exastro実行状況の確認対象の取得
+    ('action_do_exastro', lambda now: ActionHistory.objects.filter(
+        Q(status__in=ACTION_HISTORY_STATUS.EXASTRO_CHECK_LIST)
+        | Q(retry_status__in=ACTION_HISTORY_STATUS.EXASTRO_CHECK_LIST),
+    ).order_by('action_history_id').values('action_history_id', 'trace_id', 'response_id', 'execution_order')),
+
+    # アクション:Exastro代入値登録確認対象の取得
+    ('action_regist_exastro', lambda now: ActionHistory.objects.filter(
+        Q(status__in=ACTION_HISTORY_STATUS.EXASTRO_REGIST_LIST)
+        | Q(retry_status__in=ACTION_HISTORY_STATUS.EXASTRO_REGIST_LIST),
+    ).order_by('action_history_id').values('action_history_id', 'trace_id', 'response_id', 'execution_order')),
+
+    # アクション:抑止判定
+    ('action_prevent', lambda now: ActionHistory.objects.filter(
+        rule_type_id=1, rule_name='plan_rule_0', last_update_timestamp__gt=now - datetime.timedelta(seconds=3600)
+    ).exclude(status__in=[ACTION_HISTORY_STATUS.PENDING, ACTION_HISTORY_STATUS.STOP])),
+
+    # アクション:実行するアクションの取得
+    ('action_response_action', lambda now: RhdmResponseAction.objects.filter(
+        response_id=-1, execution_order=1
+    )),
+
+    # アクション履歴画面:アクションログの取得
+    ('action_log', lambda now: ActionLog.objects.filter(
+        response_id=-1, execution_order=1
+    ).order_by('action_log_id')),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, make_queryset', POLLING_QUERY_LIST, ids=[q[0] for q in POLLING_QUERY_LIST])
+def test_polling_query_plan_ok(plan_data, name, make_queryset):
+    """
+    ポーリング検索がテーブルの全件走査にならないことのテスト
+    """
+
+    plan = explain(make_queryset(plan_data))
+
+    assert len(plan) > 0
+    for row in plan:
+        assert row.get('type') != 'ALL', '%s: %s' % (name, row)
@@ -0,0 +1,101 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# 
+#     http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pytest
+import datetime
+import pytz
+
+from libs.commonlibs import define as defs
+from web_app.serializers.events_request import EventsRequestSerializer, EventsRequestValidator
+
+
+def make_data(**kwargs):
+    """
+    テスト用のイベントリクエスト作成
+    """
+
+    now = datetime.datetime.now(pytz.timezone('UTC'))
+
+    data = {
+        'trace_id'               : 'TOS_pytest_validator_00000000000001',
+        'request_type_id'        : defs.PRODUCTION,
+        'rule_type_id'           : 1,
+        'request_reception_time' : now,
+        'request_user'           : 'OASE Web User',
+        'request_server'         : 'OASE Web',
+        'event_to_time'          : now,
+        'event_info'             : '{"EVENT_INFO":["1"]}',
+        'status'                 : defs.UNPROCESS,
+        'status_update_id'       : '',
+        'retry_cnt'              : 0,
+        'last_update_timestamp'  : now,
+        'last_update_user'       : 'pytest',
+    }
+    data.update(kwargs)
+
+    return data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'trace_id': 'TOS_short'},
+    {'trace_id': 'T' * 36},
+    {'trace_id': None},
+    {'trace_id': ''},
+    {'request_type_id': '2'},
+    {'request_type_id': 9},
+    {'request_type_id': 'abc'},
+    {'rule_type_id': 2 ** 40},
+    {'event_to_time': 'abc'},
+    {'event_info': 'x' * 4001},
+    {'event_info': '["1"]'},
+    {'event_info': '{"EVENT_INFO":"1"}'},
+    {'event_info': '{"INFO":["1"]}'},
+    {'status_update_id': None},
+    {'last_update_user': 'u' * 65},
+    {'request_user': {'a': 1}},
+])
+def test_validator_ok_same_as_serializer(kwargs):
+    """
+    EventsRequestValidator シリアライザと同じエラーメッセージとなること
+    """
+
+    data = make_data(**kwargs)
+
+    serializer = EventsRequestSerializer(data=data)
+    serializer.is_valid()
+    expected = {k: [str(m) for m in v] for k, v in serializer.errors.items()}
+
+    validated_data, errors = EventsRequestValidator.validate(data)
+
+    assert errors == expected
+    if not errors:
+        assert validated_data == dict(serializer.validated_data)
+
+
+def test_validator_ok_required():
+    """
+    EventsRequestValidator 必須項目の欠落
+    """
+
+    data = make_data()
+    data.pop('trace_id')
+    data.pop('last_update_timestamp')
+
+    validated_data, errors = EventsRequestValidator.validate(data)
+
+    assert list(errors) == ['trace_id']
+    assert 'last_update_timestamp' not in validated_data
@@ -30,6 +30,7 @@ from importlib import import_module
 from libs.commonlibs.common import Common
 from libs.webcommonlibs.user_config import UserConfig
 from web_app.models.models import RuleType, DataObject
+from libs.webcommonlibs.events_request import RuleTypeNameCache
 
 
 @pytest.mark.django_db
@@ -96,6 +97,7 @@ class TestEvent_EventsRequest:
 
         RuleType.objects.filter(last_update_user='pytest').delete()
         DataObject.objects.filter(last_update_user='pytest').delete()
+        RuleTypeNameCache.clear()
 
 
     ############################################################
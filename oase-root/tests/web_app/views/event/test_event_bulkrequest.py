@@ -19,7 +19,7 @@ import json
 import pytz
 import requests
 
-from django.test import Client
+from django.test import Client, RequestFactory
 from django.db import transaction
 from django.conf import settings
 
@@ -27,6 +27,7 @@ from importlib import import_module
 
 from web_app.views.event import event as event_view
 from web_app.models.models import RuleType, DataObject
+from libs.webcommonlibs.events_request import RuleTypeNameCache
 
 
 @pytest.mark.django_db
@@ -93,6 +94,7 @@ class TestEvent_BulkEventsRequest:
 
         RuleType.objects.filter(last_update_user='pytest').delete()
         DataObject.objects.filter(last_update_user='pytest').delete()
+        RuleTypeNameCache.clear()
 
 
     ############################################################
@@ -202,3 +204,102 @@ class TestEvent_BulkEventsRequest:
         self.del_test_data()
 
 
+    @pytest.mark.django_db
+    def test_ok_partial(self, monkeypatch):
+        """
+        一括リクエスト(ビュー関数を直接呼び出し)
+        ※ 正常系(正常なイベントのみまとめて送信し、イベント毎の結果を返す)
+        """
+
+        self.del_test_data()
+        self.set_test_data()
+
+        publish_list = []
+        monkeypatch.setattr(event_view, '_produce', publish_list.append)
+
+        json_data = {
+            "request" : [
+                {
+                    "decisiontable":"pytest_name",
+                    "requesttype":"1",
+                    "eventdatetime":"2020-01-01 00:00:00",
+                    "eventinfo":["pytest1", "pytest2"]
+                },
+                {
+                    "decisiontable":"pytest_name",
+                    "requesttype":"1",
+                    "eventdatetime":"2020-01-01 00:00:00",
+                    "eventinfo":["pytest1"]
+                },
+                {
+                    "decisiontable":"pytest_name",
+                    "requesttype":"1",
+                    "eventinfo":["pytest1", "pytest2"]
+                },
+                {
+                    "decisiontable":"pytest_name",
+                    "requesttype":"1",
+                    "eventdatetime":"2020-01-01 00:00:01",
+                    "eventinfo":["pytest3", "pytest4"]
+                },
+            ]
+        }
+
+        request = RequestFactory().post(
+            '/oase_web/event/event/bulk_eventsrequest', data=json.dumps(json_data), content_type='application/json'
+        )
+        response = event_view.bulk_eventsrequest(request)
+        resp_content = json.loads(response.content.decode('utf-8'))
+
+        assert resp_content['result'] == False
+        assert [ev['result'] for ev in resp_content['events']] == [True, False, False, True]
+        assert resp_content['events'][1]['msg'] == 'Unmatch, Number of event information elements.'
+        assert resp_content['events'][2]['msg'] == 'Invalid request.'
+
+        # 1回でまとめて送信
+        assert len(publish_list) == 1
+        sent = [json.loads(m) for m in publish_list[0]]
+        assert [m['traceid'] for m in sent] == [resp_content['events'][0]['trace_id'], resp_content['events'][3]['trace_id']]
+        assert [m['eventinfo'] for m in sent] == [["pytest1", "pytest2"], ["pytest3", "pytest4"]]
+
+        self.del_test_data()
+
+
+    @pytest.mark.django_db
+    def test_ng_partial_publish(self, monkeypatch):
+        """
+        一括リクエスト(ビュー関数を直接呼び出し)
+        ※ 異常系(送信途中で失敗した場合、送信済みのイベントのみ受付済みとする)
+        """
+
+        self.del_test_data()
+        self.set_test_data()
+
+        def _produce(json_list):
+            e = Exception('pytest')
+            e.sent = 2
+            raise e
+
+        monkeypatch.setattr(event_view, '_produce', _produce)
+
+        event = {
+            "decisiontable":"pytest_name",
+            "requesttype":"1",
+            "eventdatetime":"2020-01-01 00:00:00",
+            "eventinfo":["pytest1", "pytest2"]
+        }
+        json_data = {"request" : [event, event, event]}
+
+        request = RequestFactory().post(
+            '/oase_web/event/event/bulk_eventsrequest', data=json.dumps(json_data), content_type='application/json'
+        )
+        response = event_view.bulk_eventsrequest(request)
+        resp_content = json.loads(response.content.decode('utf-8'))
+
+        assert resp_content['result'] == False
+        assert [ev['result'] for ev in resp_content['events']] == [True, True, False]
+        assert [bool(ev['trace_id']) for ev in resp_content['events']] == [True, True, False]
+        assert resp_content['events'][0]['msg'] == 'Accept request.'
+        assert resp_content['events'][2]['msg'] == 'Unexpected error.'
+
+        self.del_test_data()
@@ -0,0 +1,203 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  イベント受付(oase_accept)登録処理ベンチマークコマンド
+
+    指定レートでイベントを受け付けた場合の登録スループットと受付の停止時間を、
+    従来の登録処理(deepcopy + 受付スレッドでの同期登録)と
+    一括登録スレッド(EventsRequestWriter)で比較する
+    ※リクエスト管理にデータを登録、削除するため、検証環境で実行すること
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import copy
+import datetime
+import threading
+import time
+import traceback
+
+import pytz
+
+from django.core.management.base import BaseCommand
+
+from libs.commonlibs import define as defs
+from web_app.models.models import EventsRequest
+
+
+TRACE_ID_PREFIX = 'TOS_BENCH_'
+
+
+class Command(BaseCommand):
+
+    help = 'イベント受付登録処理ベンチマークコマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-r', '--rate',  action='store', default=5000,  type=int, dest='rate',  help='1秒あたりの受付件数')
+        parser.add_argument('-c', '--count', action='store', default=50000, type=int, dest='count', help='受付件数')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            from backyards.accept_driver.oase_accept import EventsRequestWriter, MAX_COUNT
+
+            rate  = max(options['rate'], 1)
+            count = max(options['count'], 1)
+
+            print('rate=%s[msg/s], count=%s' % (rate, count))
+
+            for name, func in (('legacy', self.run_legacy), ('writer', self.run_writer)):
+                self.cleanup()
+
+                data_list = self.make_data(name, count)
+                elapsed, max_stall = func(data_list, rate, MAX_COUNT, EventsRequestWriter)
+                stored = EventsRequest.objects.filter(trace_id__startswith=TRACE_ID_PREFIX).count()
+
+                print(
+                    '%-6s: stored=%s, elapsed=%.3f[s], throughput=%.1f[msg/s], max_stall=%.1f[ms]' % (
+                        name, stored, elapsed, stored / elapsed if elapsed > 0 else 0, max_stall * 1000
+                    )
+                )
+
+            self.cleanup()
+
+        except Exception as e:
+            print(traceback.format_exc())
+
+
+    def cleanup(self):
+
+        EventsRequest.objects.filter(trace_id__startswith=TRACE_ID_PREFIX).delete()
+
+
+    def make_data(self, name, count):
+        """
+        [メソッド概要]
+          登録データを作成する
+        """
+
+        now = datetime.datetime.now(pytz.timezone('UTC'))
+        data_list = []
+        for i in range(count):
+            data_list.append(EventsRequest(
+                trace_id               = ('%s%s_%d' % (TRACE_ID_PREFIX, name, i)).ljust(35, '0'),
+                request_type_id        = defs.PRODUCTION,
+                rule_type_id           = 1,
+                request_reception_time = now,
+                request_user           = 'OASE Web User',
+                request_server         = 'OASE Web',
+                event_to_time          = now,
+                event_info             = '{"EVENT_INFO":["%s"]}' % ('x' * 100),
+                status                 = defs.UNPROCESS,
+                status_update_id       = '',
+                retry_cnt              = 0,
+                last_update_timestamp  = now,
+                last_update_user       = 'benchmark',
+            ))
+
+        return data_list
+
+
+    def feed(self, data_list, rate, add_func):
+        """
+        [メソッド概要]
+          指定レートで受付処理を呼び出し、受付の最大停止時間を返す
+        """
+
+        start_time = time.monotonic()
+        max_stall = 0.0
+        for i, data in enumerate(data_list):
+            wait_time = start_time + i / rate - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+            add_start = time.monotonic()
+            add_func(data, i + 1)
+            max_stall = max(max_stall, time.monotonic() - add_start)
+
+        return max_stall
+
+
+    def run_legacy(self, data_list, rate, max_count, writer_class):
+        """
+        [メソッド概要]
+          従来の登録処理
+        """
+
+        lock = threading.Lock()
+        state = {'list' : [], 'timer' : False}
+
+        def _bulk_create():
+            state['timer'] = False
+            with lock:
+                if len(state['list']) <= 0:
+                    return
+
+                tmp_data = copy.deepcopy(state['list'])
+                state['list'] = []
+
+            EventsRequest.objects.bulk_create(tmp_data)
+
+        def _add(data, tag):
+            state['list'].append(data)
+
+            if len(state['list']) >= max_count:
+                state['timer'] = True
+                _bulk_create()
+
+            elif not state['timer']:
+                state['timer'] = True
+                threading.Timer(0.1, _bulk_create).start()
+
+        start_time = time.monotonic()
+        max_stall = self.feed(data_list, rate, _add)
+
+        # 残データの登録完了待ち
+        while state['timer'] or state['list']:
+            time.sleep(0.01)
+            if not state['timer'] and state['list']:
+                _bulk_create()
+
+        return time.monotonic() - start_time, max_stall
+
+
+    def run_writer(self, data_list, rate, max_count, writer_class):
+        """
+        [メソッド概要]
+          一括登録スレッドによる登録処理
+        """
+
+        commit_list = []
+        writer = writer_class(commit_list.extend, commit_list.extend, max_count=max_count)
+        writer.start()
+
+        start_time = time.monotonic()
+        max_stall = self.feed(data_list, rate, writer.add)
+        writer.stop()
+
+        return time.monotonic() - start_time, max_stall
@@ -0,0 +1,257 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  リクエスト・アクション履歴アーカイブコマンド
+
+    保存期間(システム設定 DATA_HOT_PERIOD)を過ぎた処理済みのレコードを、
+    リクエスト管理、アクション履歴管理、アクション履歴ログ管理から各アーカイブテーブルへ移動し、
+    アーカイブの保管期間(DATA_ARCHIVE_PERIOD)を過ぎたレコードを削除する
+    移動、削除は一定件数(DATA_ARCHIVE_BATCH_SIZE)ずつ別トランザクションで行い、
+    バックヤードや画面の処理を長時間ロックしないようにする
+    ※oase-archive-history.timer(backyards/common)により1日1回、夜間に実行する
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import time
+import datetime
+import traceback
+
+import pytz
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from libs.commonlibs.define import *
+from web_app.models.models import System
+from web_app.models.models import EventsRequest, ActionHistory, ActionLog
+from web_app.models.models import EventsRequestArchive, ActionHistoryArchive, ActionLogArchive
+
+
+# アーカイブ対象とするリクエストのステータス(処理済み)
+EVENTS_REQUEST_ARCHIVE_STATUS = [
+    PROCESSED, FORCE_PROCESSED,
+    RULE_UNMATCH, RULE_ERROR, RULE_MATCH, RULE_ALREADY_LINKED,
+]
+
+# アーカイブ対象外とするアクション履歴のステータス(処理中、再開待ち)
+ACTION_HISTORY_ACTIVE_STATUS = [
+    UNPROCESS,
+    ACTION_HISTORY_STATUS.PROCESSING,
+    ACTION_HISTORY_STATUS.PENDING,
+    ACTION_HISTORY_STATUS.WAITING,
+    ACTION_HISTORY_STATUS.ACTION_EXEC_ERROR_HOLD,
+    ACTION_HISTORY_STATUS.EXASTRO_REQUEST,
+    ACTION_HISTORY_STATUS.RETRY,
+    ACTION_HISTORY_STATUS.ITA_UNPROCESS,
+    ACTION_HISTORY_STATUS.ITA_PROCESSING,
+    ACTION_HISTORY_STATUS.ITA_REGISTERING_SUBSTITUTION_VALUE,
+    ACTION_HISTORY_STATUS.SNOW_APPROVAL_PENDING,
+    ACTION_HISTORY_STATUS.SNOW_APPROVED,
+]
+
+
+class Command(BaseCommand):
+
+    help = 'リクエスト・アクション履歴アーカイブコマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-i', '--interval', action='store', default=0.1, type=float, dest='interval', help='一定件数を処理する毎の待機時間(秒)')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            self.interval = max(options['interval'], 0.0)
+
+            now = datetime.datetime.now(pytz.timezone('UTC'))
+            hot_period, archive_period, batch_size = self.load_settings()
+
+            # 保存期間を過ぎたレコードをアーカイブへ移動
+            hot_cutoff = now - datetime.timedelta(days=hot_period)
+            print('archive: period=%s[days], cutoff=%s, batch_size=%s' % (hot_period, hot_cutoff, batch_size))
+
+            # アクション履歴を先に移動し、アクション履歴の残るリクエストは移動しない
+            moved = self.move_records(
+                ActionHistory, ActionHistoryArchive, 'action_start_time', hot_cutoff, batch_size,
+                Q(retry_flag=False, last_update_timestamp__lt=hot_cutoff) & ~Q(status__in=ACTION_HISTORY_ACTIVE_STATUS),
+                self.move_action_log
+            )
+            print('  %s: %s' % (ActionHistory._meta.db_table, moved))
+
+            moved = self.move_records(
+                EventsRequest, EventsRequestArchive, 'request_reception_time', hot_cutoff, batch_size,
+                Q(status__in=EVENTS_REQUEST_ARCHIVE_STATUS),
+                self.exclude_action_remained
+            )
+            print('  %s: %s' % (EventsRequest._meta.db_table, moved))
+
+            # 保管期間を過ぎたアーカイブを削除
+            if archive_period <= 0:
+                return
+
+            archive_cutoff = now - datetime.timedelta(days=archive_period)
+            print('purge: period=%s[days], cutoff=%s' % (archive_period, archive_cutoff))
+
+            for archive_model, time_field in (
+                (ActionLogArchive,     'last_update_timestamp'),
+                (ActionHistoryArchive, 'action_start_time'),
+                (EventsRequestArchive, 'request_reception_time'),
+            ):
+                purged = self.purge_records(archive_model, time_field, archive_cutoff, batch_size)
+                print('  %s: %s' % (archive_model._meta.db_table, purged))
+
+        except Exception as e:
+            print(traceback.format_exc())
+
+
+    def load_settings(self):
+        """
+        [メソッド概要]
+          システム設定から保存期間、保管期間、1回に処理する件数を取得する
+        """
+
+        def _get_int(config_id, default):
+            try:
+                return int(System.objects.get(config_id=config_id).value)
+            except Exception as e:
+                return default
+
+        hot_period     = max(_get_int('DATA_HOT_PERIOD', 31), 1)
+        archive_period = max(_get_int('DATA_ARCHIVE_PERIOD', 400), 0)
+        batch_size     = max(_get_int('DATA_ARCHIVE_BATCH_SIZE', 1000), 1)
+
+        return hot_period, archive_period, batch_size
+
+
+    def move_records(self, model, archive_model, time_field, cutoff, batch_size, condition, before_move=None):
+        """
+        [メソッド概要]
+          保存期間を過ぎたレコードを主キー順に一定件数ずつアーカイブへ移動する
+          主キーは登録順のため、保存期間内のレコードに到達した時点で終了する
+        """
+
+        pk_name = model._meta.pk.attname
+        last_id = 0
+        moved = 0
+
+        while True:
+            # ロックを取らずに対象候補を読み込む
+            chunk = list(model.objects.filter(**{'%s__gt' % pk_name: last_id}).order_by(pk_name).values_list(pk_name, time_field)[:batch_size])
+            if len(chunk) <= 0:
+                break
+
+            last_id = chunk[-1][0]
+            ids = [c[0] for c in chunk if c[1] < cutoff]
+
+            if len(ids) > 0:
+                # 対象候補のみをロックし、条件を再確認して移動
+                with transaction.atomic():
+                    rows = list(model.objects.select_for_update().filter(
+                        condition, **{'%s__in' % pk_name: ids, '%s__lt' % time_field: cutoff}
+                    ).values())
+
+                    if before_move and len(rows) > 0:
+                        rows = before_move(rows)
+
+                    if len(rows) > 0:
+                        archive_model.objects.bulk_create([archive_model(**r) for r in rows])
+                        model.objects.filter(**{'%s__in' % pk_name: [r[pk_name] for r in rows]}).delete()
+
+                moved += len(rows)
+
+            if len(ids) < len(chunk):
+                break
+
+            time.sleep(self.interval)
+
+        return moved
+
+
+    def move_action_log(self, rows):
+        """
+        [メソッド概要]
+          移動するアクション履歴のアクション履歴ログを合わせて移動する
+        """
+
+        keys = set((r['response_id'], r['execution_order']) for r in rows)
+
+        logs = [
+            l for l in ActionLog.objects.select_for_update().filter(
+                response_id__in=set(k[0] for k in keys)
+            ).values()
+            if (l['response_id'], l['execution_order']) in keys
+        ]
+
+        if len(logs) > 0:
+            ActionLogArchive.objects.bulk_create([ActionLogArchive(**l) for l in logs])
+            ActionLog.objects.filter(action_log_id__in=[l['action_log_id'] for l in logs]).delete()
+
+        return rows
+
+
+    def exclude_action_remained(self, rows):
+        """
+        [メソッド概要]
+          アクション履歴が残っているリクエストは移動対象から除く
+          (アクション履歴画面からリクエストを参照するため)
+        """
+
+        remained = set(ActionHistory.objects.filter(
+            trace_id__in=[r['trace_id'] for r in rows]
+        ).values_list('trace_id', flat=True))
+
+        return [r for r in rows if r['trace_id'] not in remained]
+
+
+    def purge_records(self, archive_model, time_field, cutoff, batch_size):
+        """
+        [メソッド概要]
+          保管期間を過ぎたアーカイブを一定件数ずつ削除する
+        """
+
+        purged = 0
+
+        while True:
+            ids = list(archive_model.objects.filter(
+                **{'%s__lt' % time_field: cutoff}
+            ).order_by(time_field).values_list('pk', flat=True)[:batch_size])
+
+            if len(ids) <= 0:
+                break
+
+            archive_model.objects.filter(pk__in=ids).delete()
+            purged += len(ids)
+
+            if len(ids) < batch_size:
+                break
+
+            time.sleep(self.interval)
+
+        return purged
+
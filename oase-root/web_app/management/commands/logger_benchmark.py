@@ -0,0 +1,107 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  ログ出力ベンチマークコマンド
+
+    DEBUGレベル無効時(LOG_LEVEL=NORMAL相当)のlogic_log呼び出し1回あたりのコストを、
+    従来の呼び出し(メッセージ編集 + 呼び出し元フレーム取得後にレベル判定)と
+    レベル判定後に編集する呼び出し(遅延評価引数あり/なし)で比較する
+    ※ログファイルには出力しない
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import os
+import json
+import inspect
+import time
+import traceback
+from logging import DEBUG, WARNING
+
+from django.core.management.base import BaseCommand
+
+from libs.commonlibs.oase_logger import OaseLogger, LazyLogArg
+from libs.messages.oase_logid import OASELogID
+
+
+class Command(BaseCommand):
+
+    help = 'ログ出力ベンチマークコマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-c', '--count', action='store', default=100000, type=int, dest='count', help='呼び出し回数')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            count = max(options['count'], 1)
+
+            logger = OaseLogger.get_instance()
+            inner_logger = logger._OaseLogger__logger
+            default_level = inner_logger.level
+
+            postdata = {
+                'commands' : [{'insert' : {'object' : {'EVENT_INFO' : ['x' * 100] * 5}}}] * 3 + [{'dispose' : {}}],
+                'lookup'   : 'ksession',
+            }
+
+            def _legacy():
+                log_message = OASELogID.Ary['LOSI02002'].format(
+                    'TraceID', json.dumps(postdata, ensure_ascii=False, indent=4, separators=(',',':'))
+                )
+                caller_frame = inspect.currentframe().f_back
+                srcfilename = os.path.abspath(caller_frame.f_code.co_filename)
+                inner_logger.debug(log_message, extra={'srcfilename' : srcfilename})
+
+            def _gated():
+                logger.system_log('LOSI02002', 'TraceID', json.dumps(postdata, ensure_ascii=False, indent=4, separators=(',',':')))
+
+            def _lazy():
+                logger.system_log('LOSI02002', 'TraceID', LazyLogArg(json.dumps, postdata, ensure_ascii=False, indent=4, separators=(',',':')))
+
+            def _simple():
+                logger.logic_log('LOSI00002', 'TraceID: %s' % 'TraceID')
+
+            print('count=%s' % (count))
+
+            try:
+                inner_logger.setLevel(WARNING)
+                for name, func in (('legacy', _legacy), ('gated', _gated), ('lazy', _lazy), ('simple', _simple)):
+                    start_time = time.perf_counter()
+                    for i in range(count):
+                        func()
+
+                    elapsed = time.perf_counter() - start_time
+                    print('%-6s: elapsed=%.3f[s], per_call=%.3f[us]' % (name, elapsed, elapsed / count * 1000000))
+
+            finally:
+                inner_logger.setLevel(default_level)
+
+        except Exception as e:
+            print(traceback.format_exc())
+
@@ -0,0 +1,191 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  アクション抑止判定ベンチマークコマンド
+
+    指定件数のアクション履歴がある状態で、抑止判定1回あたりの検索時間を、
+    従来の検索(履歴の状態を全件取得 + 件数の再検索)と
+    1回の集計による検索で比較する
+    ※アクション履歴にデータを登録、削除するため、検証環境で実行すること
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import time
+import random
+import datetime
+import traceback
+
+import pytz
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q, Count
+
+from libs.commonlibs.define import *
+from web_app.models.models import ActionHistory
+
+
+# ベンチマーク用のアクション履歴を識別するルール種別ID
+BENCH_RULE_TYPE_ID = -1
+
+
+class Command(BaseCommand):
+
+    help = 'アクション抑止判定ベンチマークコマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-c', '--count',    action='store', default=10000000, type=int, dest='count',    help='登録するアクション履歴の件数')
+        parser.add_argument('-r', '--rules',    action='store', default=1000,     type=int, dest='rules',    help='ルール名の種類数')
+        parser.add_argument('-d', '--days',     action='store', default=365,      type=int, dest='days',     help='アクション履歴を分布させる日数')
+        parser.add_argument('-i', '--interval', action='store', default=3600,     type=int, dest='interval', help='抑止間隔(秒)')
+        parser.add_argument('-n', '--lookups',  action='store', default=100,      type=int, dest='lookups',  help='抑止判定の試行回数')
+        parser.add_argument('--reuse', action='store_true', default=False, dest='reuse', help='登録済みのベンチマーク用データを再利用する')
+        parser.add_argument('--keep',  action='store_true', default=False, dest='keep',  help='ベンチマーク用データを削除しない')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            count    = max(options['count'], 1)
+            rules    = max(options['rules'], 1)
+            days     = max(options['days'], 1)
+            interval = max(options['interval'], 1)
+            lookups  = max(options['lookups'], 1)
+
+            now = datetime.datetime.now(pytz.timezone('UTC'))
+
+            if not options['reuse']:
+                self.cleanup()
+                self.make_data(count, rules, days, now)
+
+            stored = ActionHistory.objects.filter(rule_type_id=BENCH_RULE_TYPE_ID).count()
+            print('stored=%s, rules=%s, days=%s, interval=%s[s], lookups=%s' % (stored, rules, days, interval, lookups))
+
+            random.seed(0)
+            targets = ['bench_rule_%d' % random.randrange(rules) for i in range(lookups)]
+            time_from = now - datetime.timedelta(seconds=interval)
+
+            print(self.make_queryset('bench_rule_0', time_from).explain())
+
+            for name, func in (('legacy', self.run_legacy), ('aggregate', self.run_aggregate)):
+                start_time = time.perf_counter()
+                for rule_name in targets:
+                    func(rule_name, time_from)
+
+                elapsed = time.perf_counter() - start_time
+                print('%-9s: elapsed=%.3f[s], per_lookup=%.3f[ms]' % (name, elapsed, elapsed / lookups * 1000))
+
+            if not options['keep']:
+                self.cleanup()
+
+        except Exception as e:
+            print(traceback.format_exc())
+
+
+    def cleanup(self):
+
+        ActionHistory.objects.filter(rule_type_id=BENCH_RULE_TYPE_ID).delete()
+
+
+    def make_data(self, count, rules, days, now, chunk_size=10000):
+        """
+        [メソッド概要]
+          アクション履歴を登録する(最終更新日時は指定日数内に分布させる)
+        """
+
+        random.seed(0)
+        status_list = [PROCESSED, PROCESSED, PROCESSED, ACTION_HISTORY_STATUS.PREVENT, ACTION_EXEC_ERROR]
+        period = days * 86400
+
+        for offset in range(0, count, chunk_size):
+            data_list = []
+            for i in range(offset, min(offset + chunk_size, count)):
+                timestamp = now - datetime.timedelta(seconds=random.randrange(period))
+                data_list.append(ActionHistory(
+                    response_id           = -(i + 1),
+                    trace_id              = ('TOS_BENCH_%d' % i).ljust(35, '0'),
+                    rule_type_id          = BENCH_RULE_TYPE_ID,
+                    rule_type_name        = 'benchmark',
+                    rule_name             = 'bench_rule_%d' % random.randrange(rules),
+                    execution_order       = 1,
+                    action_start_time     = timestamp,
+                    action_type_id        = 1,
+                    status                = random.choice(status_list),
+                    status_detail         = ACTION_HISTORY_STATUS.DETAIL_STS.NONE,
+                    action_retry_count    = 0,
+                    last_act_user         = 'benchmark',
+                    last_update_timestamp = timestamp,
+                    last_update_user      = 'benchmark',
+                ))
+
+            ActionHistory.objects.bulk_create(data_list)
+
+
+    def make_queryset(self, rule_name, time_from):
+        """
+        [メソッド概要]
+          抑止判定の検索条件
+        """
+
+        return ActionHistory.objects.filter(
+            rule_type_id = BENCH_RULE_TYPE_ID,
+            rule_name = rule_name,
+            last_update_timestamp__gt = time_from,
+        ).exclude(
+            status__in = [ACTION_HISTORY_STATUS.PENDING, ACTION_HISTORY_STATUS.STOP]
+        )
+
+
+    def run_legacy(self, rule_name, time_from):
+        """
+        [メソッド概要]
+          従来の抑止判定(履歴の状態を全件取得し、件数を再検索)
+        """
+
+        history_status_list = self.make_queryset(rule_name, time_from).values_list('status', flat=True)
+        for s in history_status_list:
+            if s in (ACTION_HISTORY_STATUS.RETRY, ACTION_HISTORY_STATUS.EXASTRO_REQUEST, ACTION_HISTORY_STATUS.PROCESSING):
+                return
+
+        history_status_list.count()
+
+
+    def run_aggregate(self, rule_name, time_from):
+        """
+        [メソッド概要]
+          1回の集計による抑止判定
+        """
+
+        self.make_queryset(rule_name, time_from).aggregate(
+            history_count = Count('pk'),
+            waiting_count = Count('pk', filter=Q(status__in=[
+                ACTION_HISTORY_STATUS.RETRY,
+                ACTION_HISTORY_STATUS.EXASTRO_REQUEST,
+                ACTION_HISTORY_STATUS.PROCESSING,
+            ])),
+        )
+
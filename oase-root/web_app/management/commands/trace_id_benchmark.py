@@ -0,0 +1,125 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  トレースID採番ベンチマークコマンド
+
+    複数スレッドから同時にトレースIDを採番し、
+    予約ブロックサイズ毎のスループットを計測する
+    ※カウント管理のカウンタを消費するため、検証環境で実行すること
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import time
+import threading
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from libs.webcommonlibs.events_request import EventsRequestCommon
+
+
+class Command(BaseCommand):
+
+    help = 'トレースID採番ベンチマークコマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('-w', '--workers', action='store', default=10,     type=int, dest='workers', help='同時に採番するスレッド数')
+        parser.add_argument('-c', '--count',   action='store', default=1000,   type=int, dest='count',   help='1スレッドあたりの採番回数')
+        parser.add_argument('-b', '--block',   action='store', default='1,10000', type=str, dest='block', help='計測する予約ブロックサイズ(カンマ区切り)。1は従来の1件毎のロック取得に相当')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            workers = max(options['workers'], 1)
+            count   = max(options['count'], 1)
+            blocks  = [max(int(b), 1) for b in options['block'].split(',') if b.strip()]
+
+            default_block = EventsRequestCommon.TRACE_ID_BLOCK_SIZE
+
+            print('workers=%s, count=%s' % (workers, count))
+            for block_size in blocks:
+                EventsRequestCommon.TRACE_ID_BLOCK_SIZE = block_size
+
+                # 予約済みブロックを破棄して計測開始
+                EventsRequestCommon._trace_id_pid = None
+
+                elapsed, trace_id_list = self.run(workers, count)
+
+                total = workers * count
+                print(
+                    'block=%s, total=%s, unique=%s, elapsed=%.3f[s], throughput=%.1f[ids/s]' % (
+                        block_size, total, len(set(trace_id_list)), elapsed, total / elapsed if elapsed > 0 else 0
+                    )
+                )
+
+            EventsRequestCommon.TRACE_ID_BLOCK_SIZE = default_block
+
+        except Exception as e:
+            print(traceback.format_exc())
+
+
+    def run(self, workers, count):
+        """
+        [メソッド概要]
+          指定スレッド数で同時に採番し、所要時間と採番結果を返す
+        """
+
+        trace_id_list = []
+        list_lock = threading.Lock()
+        start_event = threading.Event()
+
+        def _worker():
+            id_list = []
+            start_event.wait()
+
+            try:
+                for i in range(count):
+                    id_list.extend(EventsRequestCommon.generate_trace_id())
+
+            finally:
+                connection.close()
+
+            with list_lock:
+                trace_id_list.extend(id_list)
+
+        th_list = [threading.Thread(target=_worker) for i in range(workers)]
+        for th in th_list:
+            th.start()
+
+        start_time = time.time()
+        start_event.set()
+
+        for th in th_list:
+            th.join()
+
+        elapsed = time.time() - start_time
+
+        return elapsed, trace_id_list
+
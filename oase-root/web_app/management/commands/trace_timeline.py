@@ -0,0 +1,150 @@
+# Copyright 2019 NEC Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+[概要]
+  トレースタイムライン抽出コマンド
+
+    JSON Lines形式のログ(LOG_JSON_OUTPUT=1)から指定トレースIDのログを抽出し、
+    受付、エージェント、アクションを通した処理の流れを時系列(ミリ秒)で表示する
+    ローテーション済みのファイルはインデックスを参照し、
+    インデックスのないファイルは全行を走査する
+
+[引数]
+
+
+[戻り値]
+
+
+"""
+
+
+
+
+import os
+import glob
+import json
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from libs.commonlibs.oase_logger import JsonLinesRotatingFileHandler
+
+
+class Command(BaseCommand):
+
+    help = 'トレースタイムライン抽出コマンド'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument('trace_id', action='store', type=str, help='抽出するトレースID')
+        parser.add_argument('-d', '--log-dir', action='store', default=None, type=str, dest='log_dir', help='ログディレクトリ(省略時はOASEのlogsディレクトリ)')
+        parser.add_argument('-j', '--json', action='store_true', default=False, dest='json', help='抽出したログをJSON Lines形式で出力する')
+
+
+    def handle(self, *args, **options):
+
+        try:
+            trace_id = options['trace_id']
+            log_dir = options['log_dir'] or os.path.join(settings.BASE_DIR, 'logs')
+
+            record_list = []
+            for log_path in self.get_log_files(log_dir):
+                record_list.extend(self.find_records(log_path, trace_id))
+
+            record_list.sort(key=lambda r: r.get('ts', 0))
+
+            if options['json']:
+                for record in record_list:
+                    print(json.dumps(record, ensure_ascii=False))
+
+                return
+
+            print('trace_id=%s, count=%s' % (trace_id, len(record_list)))
+            if not record_list:
+                return
+
+            start_ts = record_list[0].get('ts', 0)
+            prev_ts = start_ts
+            for record in record_list:
+                ts = record.get('ts', 0)
+                elapsed = '%.3f' % record['elapsed_ms'] if 'elapsed_ms' in record else '-'
+                print(
+                    '%12.3f %10.3f  %s  %-22s %-9s %-6s elapsed_ms=%s  %s' % (
+                        ts - start_ts, ts - prev_ts, record.get('time', ''), record.get('component', ''),
+                        record.get('log_id', ''), record.get('logtype', ''), elapsed, record.get('message', '')
+                    )
+                )
+                prev_ts = ts
+
+        except Exception as e:
+            print(traceback.format_exc())
+
+
+    def get_log_files(self, log_dir):
+        """
+        [メソッド概要]
+          JSON Lines形式のログファイル(ローテーション済みを含む)の一覧を取得する
+        """
+
+        log_files = []
+        for json_dir in glob.glob(os.path.join(log_dir, '**', 'json'), recursive=True):
+            for log_path in glob.glob(os.path.join(json_dir, '*.jsonl*')):
+                if os.path.isfile(log_path):
+                    log_files.append(log_path)
+
+        return sorted(log_files)
+
+
+    def find_records(self, log_path, trace_id):
+        """
+        [メソッド概要]
+          ログファイルから指定トレースIDのログを取得する
+          インデックスがあれば該当行のみを読み込む
+        """
+
+        record_list = []
+
+        index_path = JsonLinesRotatingFileHandler.get_index_path(log_path)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                offset_list = json.load(f).get(trace_id, [])
+
+            with open(log_path, 'rb') as f:
+                for offset in offset_list:
+                    f.seek(offset)
+                    record_list.append(json.loads(f.readline().decode('utf-8', 'replace')))
+
+            return record_list
+
+        # 現行ファイル、またはインデックス作成前のファイルは全行を走査する
+        key = trace_id.encode('utf-8')
+        with open(log_path, 'rb') as f:
+            for line in f:
+                if key not in line:
+                    continue
+
+                try:
+                    record = json.loads(line.decode('utf-8', 'replace'))
+                except ValueError:
+                    continue
+
+                if record.get('trace_id') == trace_id:
+                    record_list.append(record)
+
+        return record_list
+
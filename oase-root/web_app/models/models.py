@@ -24,12 +24,16 @@ DOSL01004:メールアドレス変更管理
 DOSL02001:アクセス権限管理
 DOSL03001:セッション管理
 DOSL04001:リクエスト管理
+DOSL04002:リクエスト管理(アーカイブ)
+DOSL04003:未知事象通知送信待ち管理
 DOSL05001:ルールマッチング結果管理
 DOSL05002:ルールマッチング結果アクション管理
 DOSL05003:ルールマッチング結果コリレーション管理
 DOSL06001:アクション履歴管理
 DOSL06004:アクション履歴ログ管理
 DOSL06005:事前アクション履歴管理
+DOSL06007:アクション履歴管理(アーカイブ)
+DOSL06008:アクション履歴ログ管理(アーカイブ)
 DOSL07003:メールテンプレートマスタ
 DOSL08001:ルールファイル情報管理
 DOSL08002:ルール適用管理
@@ -232,6 +236,12 @@ class EventsRequest(models.Model):
 
     class Meta:
         db_table = 'OASE_T_EVENTS_REQUEST'
+        indexes = [
+            # エージェントの未処理/処理中リクエスト取得(リクエストID順)
+            models.Index(fields=['status', 'request_id']),
+            # ServiceNow通知対象のルール未検出リクエスト取得
+            models.Index(fields=['status', 'request_type_id', 'rule_type_id']),
+        ]
 
     def __str__(self):
         return str(self.request_id)
@@ -254,6 +264,12 @@ class RhdmResponse(models.Model):
 
     class Meta:
         db_table = 'OASE_T_RHDM_RESPONSE'
+        indexes = [
+            # アクションの実行対象取得(ステータス毎、リトライは再開日時で絞り込み)
+            models.Index(fields=['request_type_id', 'status', 'resume_timestamp']),
+            # アクションのリカバリ対象取得(処理中のまま占有期限切れのレコード)
+            models.Index(fields=['status', 'last_update_timestamp']),
+        ]
 
     def __str__(self):
         return "%s(%s)" % (str(self.response_id), self.trace_id)
@@ -345,6 +361,17 @@ class ActionHistory(models.Model):
     class Meta:
         db_table = 'OASE_T_ACTION_HISTORY'
         unique_together = (('response_id', 'execution_order'), )
+        indexes = [
+            # アクション抑止判定(ルール毎の抑止間隔内の履歴検索)
+            models.Index(fields=['rule_type_id', 'rule_name', 'last_update_timestamp']),
+            # アクションの再実行対象取得
+            models.Index(fields=['retry_flag']),
+            # トレースID毎のアクション履歴検索(アーカイブ対象のリクエスト判定)
+            models.Index(fields=['trace_id']),
+            # Exastro実行状況の確認、代入値登録確認の対象取得(ステータス、再実行ステータスのOR条件)
+            models.Index(fields=['status']),
+            models.Index(fields=['retry_status']),
+        ]
 
     def __str__(self):
         return str(self.action_history_id)
@@ -364,6 +391,128 @@ class ActionLog(models.Model):
 
     class Meta:
         db_table = 'OASE_T_ACTION_LOG'
+        indexes = [
+            # アクション履歴画面のログ表示(アクション毎のログ検索)
+            models.Index(fields=['response_id', 'execution_order']),
+        ]
+
+    def __str__(self):
+        return str(self.action_log_id)
+
+
+class EventsRequestArchive(models.Model):
+    """
+    DOSL04002:リクエスト管理(アーカイブ)
+    """
+    request_id = models.IntegerField("リクエストID", primary_key=True)
+    trace_id = models.CharField("トレースID", max_length=35, unique=True, validators=[MinLengthValidator(35)])
+    request_type_id = models.IntegerField("リクエスト種別")
+    rule_type_id = models.IntegerField("ルール種別ID")
+    request_reception_time = models.DateTimeField("リクエスト受信日時")
+    request_user = models.CharField("リクエストユーザ", max_length=128)
+    request_server = models.CharField("リクエストサーバ", max_length=128)
+    event_to_time = models.DateTimeField("イベント発生日時")
+    event_info = models.CharField("イベント情報", max_length=4000)
+    status = models.IntegerField("ステータス")
+    status_update_id = models.CharField("ステータス更新ID", max_length=128, null=True, blank=True)
+    retry_cnt = models.IntegerField("再試行回数", default=0)
+    last_update_timestamp = models.DateTimeField("最終更新日時", default=timezone.now)
+    last_update_user = models.CharField("最終更新者", max_length=64)
+
+    class Meta:
+        db_table = 'OASE_T_EVENTS_REQUEST_ARCHIVE'
+        indexes = [
+            # 保管期間切れのレコード削除
+            models.Index(fields=['request_reception_time']),
+            # ダッシュボードの月別集計
+            models.Index(fields=['request_type_id', 'event_to_time']),
+        ]
+
+    def __str__(self):
+        return str(self.request_id)
+
+
+class UnknownEventNotify(models.Model):
+    """
+    DOSL04003:未知事象通知送信待ち管理
+    ルール未検出のリクエストの状態遷移と同じトランザクションで登録し、送信後に削除する
+    """
+    notify_id = models.AutoField("未知事象通知ID", primary_key=True)
+    trace_id = models.CharField("トレースID", max_length=35, validators=[MinLengthValidator(35)])
+    request_type_id = models.IntegerField("リクエスト種別")
+    rule_type_id = models.IntegerField("ルール種別ID")
+    decision_table_name = models.CharField("ルール種別名称", max_length=128)
+    request_reception_time = models.DateTimeField("リクエスト受信日時")
+    event_to_time = models.DateTimeField("イベント発生日時")
+    event_info = models.CharField("イベント情報", max_length=4000)
+    status_update_id = models.CharField("ステータス更新ID", max_length=128, null=True, blank=True)
+    last_update_timestamp = models.DateTimeField("最終更新日時", default=timezone.now)
+    last_update_user = models.CharField("最終更新者", max_length=64)
+
+    class Meta:
+        db_table = 'OASE_T_UNKNOWN_EVENT_NOTIFY'
+
+    def __str__(self):
+        return str(self.notify_id)
+
+
+class ActionHistoryArchive(models.Model):
+    """
+    DOSL06007:アクション履歴管理(アーカイブ)
+    """
+    action_history_id = models.IntegerField("アクション履歴ID", primary_key=True)
+    response_id = models.IntegerField("レスポンスID")
+    trace_id = models.CharField("トレースID", max_length=35, validators=[MinLengthValidator(35)])
+    rule_type_id = models.IntegerField("ルール種別ID")
+    rule_type_name = models.CharField("ルール種別名", max_length=64)
+    rule_name = models.CharField("ルール名", max_length=64)
+    incident_happened = models.CharField("発生事象", max_length=128, null=True)
+    handling_summary = models.CharField("対処概要", max_length=128, null=True)
+    execution_order = models.IntegerField("アクション実行順")
+    action_start_time = models.DateTimeField("アクション開始日時")
+    action_type_id = models.IntegerField("アクション種別")
+    status = models.IntegerField("ステータス")
+    status_detail = models.SmallIntegerField("詳細ステータス")
+    status_update_id = models.CharField("ステータス更新ID", max_length=128, null=True, blank=True)
+    retry_flag = models.BooleanField("再実行フラグ", default=False)
+    retry_status = models.IntegerField("再実行ステータス", null=True)
+    retry_status_detail = models.SmallIntegerField("再実行詳細ステータス", null=True)
+    action_retry_count = models.IntegerField("アクションリトライ回数", null=True)
+    last_act_user = models.CharField("最終実行者", max_length=64)
+    last_update_timestamp = models.DateTimeField("最終更新日時", default=timezone.now)
+    last_update_user = models.CharField("最終更新者", max_length=64)
+
+    class Meta:
+        db_table = 'OASE_T_ACTION_HISTORY_ARCHIVE'
+        indexes = [
+            # 保管期間切れのレコード削除
+            models.Index(fields=['action_start_time']),
+            models.Index(fields=['trace_id']),
+        ]
+
+    def __str__(self):
+        return str(self.action_history_id)
+
+
+class ActionLogArchive(models.Model):
+    """
+    DOSL06008:アクション履歴ログ管理(アーカイブ)
+    """
+    action_log_id = models.IntegerField("アクション履歴ログID", primary_key=True)
+    response_id = models.IntegerField("レスポンスID")
+    execution_order = models.IntegerField("アクション実行順")
+    trace_id = models.CharField("トレースID", max_length=35, validators=[MinLengthValidator(35)])
+    message_id = models.CharField("メッセージID", max_length=16)
+    message_params = models.CharField("メッセージパラメーター", max_length=512, null=True, blank=True)
+    last_update_timestamp = models.DateTimeField("最終更新日時", default=timezone.now)
+
+    class Meta:
+        db_table = 'OASE_T_ACTION_LOG_ARCHIVE'
+        indexes = [
+            # 保管期間切れのレコード削除
+            models.Index(fields=['last_update_timestamp']),
+            models.Index(fields=['response_id', 'execution_order']),
+        ]
 
     def __str__(self):
         return str(self.action_log_id)
@@ -13,70 +13,326 @@
 # limitations under the License.
 #
 
+import re
 import json
+import datetime
 
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from django.core.validators import MinLengthValidator
 from rest_framework import serializers
 
 from web_app.models.models import EventsRequest
 from libs.commonlibs import define as defs
 
 
+TRACE_ID_LENGTH   = 35
+REQUEST_TYPE_LIST = [defs.PRODUCTION, defs.STAGING, ]
+EVENT_INFO_KEY    = 'EVENT_INFO'
+
+FIELD_LIST = (
+    'trace_id', 'request_type_id', 'rule_type_id',
+    'request_reception_time', 'request_user', 'request_server',
+    'event_to_time', 'event_info', 'status', 'status_update_id',
+    'last_update_timestamp', 'last_update_user'
+)
+
+
+def check_trace_id(trace_id):
+    """
+    [メソッド概要]
+      トレースIDのチェック
+    [戻り値]
+      str : エラーメッセージ(正常時はNone)
+    """
+
+    trace_len = len(trace_id)
+    if trace_len != TRACE_ID_LENGTH:
+        return "イベントシリアルNo.不正 trace_id=%s, req_len=%s, valid_len=%s" % (trace_id, trace_len, TRACE_ID_LENGTH)
+
+    return None
+
+
+def check_request_type_id(request_type_id):
+    """
+    [メソッド概要]
+      リクエスト種別のチェック
+    [戻り値]
+      str : エラーメッセージ(正常時はNone)
+    """
+
+    req_type = int(request_type_id)
+    if req_type not in REQUEST_TYPE_LIST:
+        return "不明なリクエスト種別 req_type=%s" % (request_type_id)
+
+    return None
+
+
+def check_event_info(event_info):
+    """
+    [メソッド概要]
+      イベント情報のチェック
+    [戻り値]
+      str : エラーメッセージ(正常時はNone)
+    """
+
+    value = event_info
+    if isinstance(value, str) == False:
+        return "文字列ではありません val=%s, type=%s" % (value, type(value))
+
+    try:
+        value = json.loads(value)
+    except:
+        return "JSON形式ではありません val=%s" % (value)
+
+    if isinstance(value, dict) == False:
+        return "JSON形式ではありません val=%s" % (value)
+
+    if EVENT_INFO_KEY not in value:
+        return "必要なキーが存在しません json=%s, valid_key=%s" % (value, EVENT_INFO_KEY)
+
+    value = value[EVENT_INFO_KEY]
+    if isinstance(value, list) == False:
+        return "イベント情報が配列ではありません val=%s, type=%s" % (value, type(value))
+
+    return None
+
+
 class EventsRequestSerializer(serializers.ModelSerializer):
 
-    TRACE_ID_LENGTH   = 35
-    REQUEST_TYPE_LIST = [defs.PRODUCTION, defs.STAGING, ]
-    EVENT_INFO_KEY    = 'EVENT_INFO'
+    TRACE_ID_LENGTH   = TRACE_ID_LENGTH
+    REQUEST_TYPE_LIST = REQUEST_TYPE_LIST
+    EVENT_INFO_KEY    = EVENT_INFO_KEY
 
     class Meta:
         model = EventsRequest
-        fields = (
-            'trace_id', 'request_type_id', 'rule_type_id',
-            'request_reception_time', 'request_user', 'request_server',
-            'event_to_time', 'event_info', 'status', 'status_update_id',
-            'last_update_timestamp', 'last_update_user'
-        )
+        fields = FIELD_LIST
 
 
     def validate_trace_id(self, trace_id):
 
-        trace_len = len(trace_id)
-        if trace_len != self.TRACE_ID_LENGTH:
-            raise serializers.ValidationError("イベントシリアルNo.不正 trace_id=%s, req_len=%s, valid_len=%s" % (trace_id, trace_len, self.TRACE_ID_LENGTH))
+        msg = check_trace_id(trace_id)
+        if msg:
+            raise serializers.ValidationError(msg)
 
         return trace_id
 
 
     def validate_request_type_id(self, request_type_id):
 
-        req_type = int(request_type_id)
-        if req_type not in self.REQUEST_TYPE_LIST:
-            raise serializers.ValidationError("不明なリクエスト種別 req_type=%s" % (request_type_id))
+        msg = check_request_type_id(request_type_id)
+        if msg:
+            raise serializers.ValidationError(msg)
 
         return request_type_id
 
 
     def validate_event_info(self, event_info):
 
-        value = event_info
-        if isinstance(value, str) == False:
-            raise serializers.ValidationError("文字列ではありません val=%s, type=%s" % (value, type(value)))
+        msg = check_event_info(event_info)
+        if msg:
+            raise serializers.ValidationError(msg)
+
+        return event_info
+
+
+class EventsRequestValidator:
+    """
+    [クラス概要]
+      イベントリクエストの軽量バリデーション
+      EventsRequestSerializer と同じ項目、同じエラーメッセージでチェックする。
+      チェック内容はモデル定義から初回使用時に1度だけ組み立て、以降は使い回す。
+      ※トレースIDの重複はDBの一意制約で検出する(メッセージ毎の重複確認クエリは発行しない)
+    """
+
+    # エラーメッセージ(REST frameworkと同じメッセージIDで翻訳される)
+    MSG_REQUIRED      = _('This field is required.')
+    MSG_NULL          = _('This field may not be null.')
+    MSG_BLANK         = _('This field may not be blank.')
+    MSG_STR_INVALID   = _('Not a valid string.')
+    MSG_MAX_LENGTH    = _('Ensure this field has no more than {max_length} characters.')
+    MSG_MIN_LENGTH    = _('Ensure this field has at least {min_length} characters.')
+    MSG_NULL_CHAR     = _('Null characters are not allowed.')
+    MSG_SURROGATE     = _('Surrogate characters are not allowed: U+{code_point:X}.')
+    MSG_INT_INVALID   = _('A valid integer is required.')
+    MSG_INT_MAX_VALUE = _('Ensure this value is less than or equal to {max_value}.')
+    MSG_INT_MIN_VALUE = _('Ensure this value is greater than or equal to {min_value}.')
+    MSG_INT_MAX_STR   = _('String value too large.')
+    MSG_DT_INVALID    = _('Datetime has wrong format. Use one of these formats instead: {format}.')
+    MSG_DT_DATE       = _('Expected a datetime but got a date.')
+
+    DT_FORMAT      = 'YYYY-MM-DDThh:mm[:ss[.uuuuuu]][+HH:MM|-HH:MM|Z]'
+    MAX_STRING_LEN = 1000
+    RE_DECIMAL     = re.compile(r'\.0*\s*$')
+    RE_SURROGATE   = re.compile(r'[\ud800-\udfff]')
+
+    # 項目毎の追加チェック
+    EXTRA_CHECK = {
+        'trace_id'        : check_trace_id,
+        'request_type_id' : check_request_type_id,
+        'event_info'      : check_event_info,
+    }
+
+    _schema = None
+
+
+    @classmethod
+    def compile(cls):
+        """
+        [メソッド概要]
+          モデル定義からチェック内容を組み立てる
+        [戻り値]
+          list : (項目名, 型, 必須, NULL許可, 空文字許可, 最小, 最大, 追加チェック)
+        """
+
+        if cls._schema is not None:
+            return cls._schema
+
+        schema = []
+        for name in FIELD_LIST:
+            field = EventsRequest._meta.get_field(name)
+            kind  = field.get_internal_type()
+            min_v = None
+            max_v = None
+
+            if kind == 'CharField':
+                max_v = field.max_length
+                min_v = next((v.limit_value for v in field.validators if isinstance(v, MinLengthValidator)), None)
+
+            elif kind == 'IntegerField':
+                for v in field.validators:
+                    if v.code == 'min_value':
+                        min_v = v.limit_value
+                    elif v.code == 'max_value':
+                        max_v = v.limit_value
+
+            required = not (field.has_default() or field.null or field.blank)
+            schema.append((name, kind, required, field.null, field.blank, min_v, max_v, cls.EXTRA_CHECK.get(name)))
+
+        cls._schema = schema
+
+        return schema
+
+
+    @classmethod
+    def validate(cls, data):
+        """
+        [メソッド概要]
+          バリデーションチェック
+        [戻り値]
+          dict : チェック済みのデータ
+          dict : 項目毎のエラーメッセージのリスト(正常時は空)
+        """
+
+        validated = {}
+        errors    = {}
+
+        for name, kind, required, allow_null, allow_blank, min_v, max_v, extra_check in cls.compile():
+            if name not in data:
+                if required:
+                    errors[name] = [str(cls.MSG_REQUIRED)]
+                continue
+
+            value = data[name]
+            if value is None:
+                if not allow_null:
+                    errors[name] = [str(cls.MSG_NULL)]
+                else:
+                    validated[name] = None
+                continue
+
+            if kind == 'CharField':
+                value, msg_list = cls._validate_str(value, allow_blank, min_v, max_v)
+            elif kind == 'IntegerField':
+                value, msg_list = cls._validate_int(value, min_v, max_v)
+            elif kind == 'DateTimeField':
+                value, msg_list = cls._validate_datetime(value)
+            else:
+                msg_list = []
+
+            if not msg_list and extra_check:
+                msg = extra_check(value)
+                if msg:
+                    msg_list = [msg]
+
+            if msg_list:
+                errors[name] = msg_list
+                continue
+
+            validated[name] = value
+
+        return validated, errors
+
+
+    @classmethod
+    def _validate_str(cls, value, allow_blank, min_length, max_length):
+
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            return value, [str(cls.MSG_STR_INVALID)]
+
+        value = str(value).strip()
+        if value == '':
+            return value, [] if allow_blank else [str(cls.MSG_BLANK)]
+
+        msg_list = []
+        if max_length is not None and len(value) > max_length:
+            msg_list.append(cls.MSG_MAX_LENGTH.format(max_length=max_length))
+
+        if min_length is not None and len(value) < min_length:
+            msg_list.append(cls.MSG_MIN_LENGTH.format(min_length=min_length))
+
+        if '\x00' in value:
+            msg_list.append(str(cls.MSG_NULL_CHAR))
+
+        match = cls.RE_SURROGATE.search(value)
+        if match:
+            msg_list.append(cls.MSG_SURROGATE.format(code_point=ord(match.group())))
+
+        return value, msg_list
+
+
+    @classmethod
+    def _validate_int(cls, value, min_value, max_value):
+
+        if isinstance(value, str) and len(value) > cls.MAX_STRING_LEN:
+            return value, [str(cls.MSG_INT_MAX_STR)]
 
         try:
-            value = json.loads(value)
-        except:
-            raise serializers.ValidationError("JSON形式ではありません val=%s" % (value))
+            value = int(cls.RE_DECIMAL.sub('', str(value)))
+        except (ValueError, TypeError):
+            return value, [str(cls.MSG_INT_INVALID)]
 
-        if isinstance(value, dict) == False:
-            raise serializers.ValidationError("JSON形式ではありません val=%s" % (value))
+        msg_list = []
+        if max_value is not None and value > max_value:
+            msg_list.append(cls.MSG_INT_MAX_VALUE.format(max_value=max_value))
 
-        if self.EVENT_INFO_KEY not in value:
-            raise serializers.ValidationError("必要なキーが存在しません json=%s, valid_key=%s" % (value, self.EVENT_INFO_KEY))
+        if min_value is not None and value < min_value:
+            msg_list.append(cls.MSG_INT_MIN_VALUE.format(min_value=min_value))
 
-        value = value[self.EVENT_INFO_KEY]
-        if isinstance(value, list) == False:
-            raise serializers.ValidationError("イベント情報が配列ではありません val=%s, type=%s" % (value, type(value)))
+        return value, msg_list
 
 
-        return event_info
+    @classmethod
+    def _validate_datetime(cls, value):
+
+        if isinstance(value, datetime.datetime):
+            dt = value
+
+        elif isinstance(value, datetime.date):
+            return value, [str(cls.MSG_DT_DATE)]
+
+        else:
+            try:
+                dt = parse_datetime(str(value))
+            except ValueError:
+                dt = None
+
+            if dt is None:
+                return value, [cls.MSG_DT_INVALID.format(format=cls.DT_FORMAT)]
 
+        if settings.USE_TZ and timezone.is_naive(dt):
+            dt = timezone.make_aware(dt, timezone.get_current_timezone())
 
+        return dt, []
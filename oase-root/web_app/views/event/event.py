@@ -43,14 +43,13 @@ from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.dispatch import receiver
-from retry import retry
 
 from web_app.models.models import User, EventsRequest, DataObject, RuleType
-from web_app.serializers.events_request import EventsRequestSerializer
+from web_app.serializers.events_request import EventsRequestValidator
 from libs.commonlibs import define as defs
 from libs.commonlibs.oase_logger import OaseLogger
-from libs.commonlibs.rabbitmq import RabbitMQ
-from libs.webcommonlibs.events_request import EventsRequestCommon
+from libs.commonlibs.rabbitmq import RabbitMQPublisher
+from libs.webcommonlibs.events_request import EventsRequestCommon, RuleTypeNameCache
 from libs.webcommonlibs.event_token import OASEEventToken
 from libs.webcommonlibs.common import TimeConversion
 
@@ -64,16 +63,6 @@ if cls_evtoken:
     cls_evtoken.initialize()
 
 
-# 設定情報読み込み
-_mq_settings = None
-
-# RabbitMQ接続
-_channel    = None
-_connection = None
-_properties = None
-
-
-mq_lock = multiprocessing.Lock()
 ################################################
 @csrf_exempt
 def eventsrequest(request):
@@ -112,9 +101,6 @@ def eventsrequest(request):
             raise Exception(msg)
 
         # tokenチェック
-        if not cls_evtoken.init_flag:
-            cls_evtoken.load_data()
-
         stscode, msg = cls_evtoken.check_request_token(request)
 
         logger.logic_log('LOSI13027', trace_id, stscode, msg)
@@ -129,13 +115,8 @@ def eventsrequest(request):
             json_str['traceid'] = trace_id
             json_str = json.dumps(json_str)
 
-            # 初回の設定読込で落ちるのめんどくさいのでここに置いとく
-            _rabbitMQ_conf()
-
             # RabbitMQへ送信
-            mq_lock.acquire()
-            _produce(json_str)
-            mq_lock.release()
+            _produce([json_str])
 
             result = True
             msg = 'Accept request.'
@@ -168,7 +149,11 @@ def eventsrequest(request):
             # ルール情報の取得
             reqtypeid     = json_str[EventsRequestCommon.KEY_REQTYPE]
             ruletablename = json_str[EventsRequestCommon.KEY_RULETYPE]
-            ruletypeid    = RuleType.objects.get(rule_type_name=ruletablename).rule_type_id
+            ruletype_info = RuleTypeNameCache.get(ruletablename)
+            if not ruletype_info:
+                raise Exception()
+
+            ruletypeid    = ruletype_info[0]
             evinfo_length = DataObject.objects.filter(rule_type_id=ruletypeid).values('label').distinct().count()
             eventinfo     = json_str[EventsRequestCommon.KEY_EVENTINFO]
 
@@ -220,17 +205,16 @@ def eventsrequest(request):
             }
 
             # バリデーションチェック
-            oters = EventsRequestSerializer(data=json_data)
-            result_valid = oters.is_valid()
+            validated_data, errors = EventsRequestValidator.validate(json_data)
 
             # バリデーションエラー
-            if result_valid == False:
-                msg = '%s' % oters.errors
+            if errors:
+                msg = '%s' % errors
                 logger.user_log('LOSM13004', trace_id, msg)
 
             # 正常の場合はDB保存
             else:
-                oters.save()
+                EventsRequest.objects.create(**validated_data)
                 result = True
                 msg = 'Accept request.'
 
@@ -270,18 +254,73 @@ def eventsrequest(request):
     return resp
 
 
+################################################
+def _check_bulk_event(data):
+    """
+    [メソッド概要]
+      一括リクエストのイベント1件分をチェックする
+    [戻り値]
+      str : エラー理由(正常時は空文字)
+    """
+
+    if not isinstance(data, dict):
+        logger.system_log('LOSM13027', EventsRequestCommon.KEY_RULETYPE)
+        return 'Invalid request.'
+
+    # キーのチェック
+    err_code = EventsRequestCommon.check_events_request_key(data)
+    if err_code != EventsRequestCommon.REQUEST_OK:
+        err_keyname = ''
+        if err_code == EventsRequestCommon.REQUEST_ERR_RULETYPE_KEY:
+            err_keyname = EventsRequestCommon.KEY_RULETYPE
+
+        elif err_code == EventsRequestCommon.REQUEST_ERR_REQTYPE_KEY:
+            err_keyname = EventsRequestCommon.KEY_REQTYPE
+
+        elif err_code == EventsRequestCommon.REQUEST_ERR_DATETIME_KEY:
+            err_keyname = EventsRequestCommon.KEY_EVENTTIME
+
+        elif err_code == EventsRequestCommon.REQUEST_ERR_EVINFO_KEY:
+            err_keyname = EventsRequestCommon.KEY_EVENTINFO
+
+        logger.system_log('LOSM13027', err_keyname)
+        return 'Invalid request.'
+
+    # ルール情報の取得
+    ruletypeid    = 0
+    evinfo_length = 0
+    ruletype_info = RuleTypeNameCache.get(data[EventsRequestCommon.KEY_RULETYPE])
+    if ruletype_info:
+        ruletypeid, evinfo_length = ruletype_info
+
+    # イベント情報のチェック
+    err_code = EventsRequestCommon.check_events_request_len(data, evinfo_length)
+    if err_code != EventsRequestCommon.REQUEST_OK:
+        if err_code == EventsRequestCommon.REQUEST_ERR_EVINFO_LENGTH and isinstance(data[EventsRequestCommon.KEY_EVENTINFO], list):
+            logger.system_log('LOSM13028', ruletypeid, len(data[EventsRequestCommon.KEY_EVENTINFO]), evinfo_length)
+
+        else:
+            logger.system_log('LOSM13028', ruletypeid, 0, evinfo_length)
+
+        return 'Unmatch, Number of event information elements.'
+
+    return ''
+
+
 ################################################
 @csrf_exempt
 def bulk_eventsrequest(request):
     """
     [メソッド概要]
       一括用のリクエストを処理する
+      全イベントをチェックしてから、正常なイベント分のトレースIDをまとめて採番し、まとめて送信する
+      応答にはイベント毎の受付結果(トレースID、エラー理由)を返す
     """
 
-    resp_json         = {}
-    result            = False
-    rule_type_id_list = {}
-    label_count_list  = {}
+    resp_json   = {}
+    result      = False
+    msg         = ''
+    event_list  = []
 
     logger.system_log('LOSI13023')
 
@@ -291,87 +330,83 @@ def bulk_eventsrequest(request):
         #########################################
         # メソッドのチェック
         if not request or request.method == 'GET':
+            msg = 'Invalid request. Must be POST. Not GET.'
             logger.system_log('LOSM13025')
-            raise Exception()
+            raise Exception(msg)
 
         # フォーマットのチェック
         try:
             json_str = json.loads(request.body.decode('UTF-8'))
-        except json.JSONDecodeError:
-            logger.system_log('LOSM13026')
-            raise Exception()
-
-        for data in json_str['request']:
-
-            # キーのチェック
-            err_code = EventsRequestCommon.check_events_request_key(data)
-            if err_code != EventsRequestCommon.REQUEST_OK:
-                err_keyname = ''
-                if err_code == EventsRequestCommon.REQUEST_ERR_RULETYPE_KEY:
-                    err_keyname = EventsRequestCommon.KEY_RULETYPE
-
-                elif err_code == EventsRequestCommon.REQUEST_ERR_REQTYPE_KEY:
-                    err_keyname = EventsRequestCommon.KEY_REQTYPE
-
-                elif err_code == EventsRequestCommon.REQUEST_ERR_DATETIME_KEY:
-                    err_keyname = EventsRequestCommon.KEY_EVENTTIME
-
-                elif err_code == EventsRequestCommon.REQUEST_ERR_EVINFO_KEY:
-                    err_keyname = EventsRequestCommon.KEY_EVENTINFO
-
-                logger.system_log('LOSM13027', err_keyname)
-                raise Exception()
-
-            # ルール情報の取得
-            reqtypeid  = data[EventsRequestCommon.KEY_REQTYPE]
-            ruletablename = data[EventsRequestCommon.KEY_RULETYPE]
+            request_list = json_str['request']
+            if not isinstance(request_list, list):
+                raise TypeError()
 
-            if ruletablename not in rule_type_id_list:
-                rule_type_id_list.update({ruletablename:0})
-                label_count_list.update({ruletablename:0})
+        except (json.JSONDecodeError, KeyError, TypeError):
+            msg = 'Invalid request format. Must be JSON.'
+            logger.system_log('LOSM13026')
+            raise Exception(msg)
 
-                rset = RuleType.objects.filter(rule_type_name=ruletablename).values('rule_type_id', 'rule_type_name', 'label_count')
-                for rs in rset:
-                    rule_type_id_list.update({rs['rule_type_name']:rs['rule_type_id']})
-                    label_count_list.update({rs['rule_type_name']:rs['label_count']})
+        # 全イベントのチェック
+        valid_list = []
+        for i, data in enumerate(request_list):
+            err_msg = _check_bulk_event(data)
+            event_list.append({'result' : False, 'trace_id' : '', 'msg' : err_msg})
+            if not err_msg:
+                valid_list.append(i)
+
+        if valid_list:
+            # トレースIDをまとめて採番
+            trace_id_list = EventsRequestCommon.generate_trace_id(req=len(valid_list))
+            if len(trace_id_list) != len(valid_list):
+                msg = 'Failed to generate trace ID.'
+                raise Exception(msg)
 
-            if ruletablename in rule_type_id_list:
-                ruletypeid    = rule_type_id_list[ruletablename]
-                evinfo_length = label_count_list[ruletablename]
+            publish_list = []
+            for i, trace_id in zip(valid_list, trace_id_list):
+                request_list[i]['traceid'] = trace_id
+                event_list[i]['trace_id'] = trace_id
+                publish_list.append(json.dumps(request_list[i]))
 
-            # イベント情報のチェック
-            err_code = EventsRequestCommon.check_events_request_len(data, evinfo_length)
-            if err_code != EventsRequestCommon.REQUEST_OK:
-                if err_code == EventsRequestCommon.REQUEST_ERR_EVINFO_TYPE:
-                    logger.system_log('LOSM13028', ruletypeid, 0, evinfo_length)
-                    raise Exception()
+            # RabbitMQへまとめて送信
+            # 途中で失敗した場合も、送信済み(ブローカーが受理済み)のイベントは受付済みとする
+            sent = 0
+            try:
+                _produce(publish_list)
+                sent = len(publish_list)
 
-                elif err_code == EventsRequestCommon.REQUEST_ERR_EVINFO_LENGTH:
-                    logger.system_log('LOSM13028', ruletypeid, len(data[EventsRequestCommon.KEY_EVENTINFO]), evinfo_length)
-                    raise Exception()
+            except Exception as e:
+                sent = getattr(e, 'sent', 0)
+                raise
 
-                raise Exception()
+            finally:
+                for n, i in enumerate(valid_list):
+                    if n < sent:
+                        event_list[i]['result'] = True
+                        event_list[i]['msg'] = 'Accept request.'
 
-            trace_id  = EventsRequestCommon.generate_trace_id()
-            data['traceid'] = trace_id
-            data = json.dumps(data)
+                    else:
+                        event_list[i]['trace_id'] = ''
 
-            _rabbitMQ_conf()
+        result = len(valid_list) == len(request_list)
+        msg = 'Accept request.' if result else 'Some events are not accepted.'
 
-            # RabbitMQへ送信
-            mq_lock.acquire()
-            _produce(data)
-            mq_lock.release()
+    except Exception as e:
+        if not msg:
+            msg = 'Unexpected error.'
 
-        result = True
+        # 送信前、送信中のエラーは、送信済みでないイベントを未受付とする
+        for ev in event_list:
+            if not ev['msg']:
+                ev['msg'] = msg
 
-    except Exception as e:
         logger.system_log('LOSM13029', traceback.format_exc())
 
 
     # レスポンス情報の作成
     resp_json = {
         'result' : result,
+        'msg'    : msg,
+        'events' : event_list,
     }
 
     resp_json = json.dumps(resp_json, ensure_ascii=False)
@@ -382,66 +417,15 @@ def bulk_eventsrequest(request):
     return HttpResponse(resp_json)
 
 
-@retry(tries=3, delay=0.5)
-def _produce(json_str):
-    """
-    [概要]
-        RabbitMQへの接続
-        retryデコレータにより、接続エラーが発生した場合はdelay秒間隔でtries回数、再接続を試みる
-        tries回数試行しても繋がらなかった場合は呼び元のexceptに飛ぶ
-    """
-    try:
-        global _channel
-        global _connection
-        global _mq_settings
-        global _properties
-
-        _channel.queue_bind(exchange='amq.direct', queue=_mq_settings['queuename'], routing_key=_mq_settings['queuename'])
-
-        _channel.basic_publish(exchange='amq.direct',
-            routing_key=_mq_settings['queuename'],
-            body=json_str,
-            properties=_properties)
-
-    except pika.exceptions.AMQPConnectionError:
-        _channel = None
-        _rabbitMQ_conf()
-
-        #continue
-        raise Exception
-
-    except Exception as e:
-        raise
-
-
-def _rabbitMQ_conf():
+def _produce(json_list):
     """
     [概要]
-        RabbitMQ接続に関しての設定を行う
+        RabbitMQへの送信
+        スレッド毎の接続を使い、まとめて送信する
+        再接続を試みても送信できなかった場合は呼び元のexceptに飛ぶ
     """
-    global _channel
-    global _connection
-    global _mq_settings
-    global _properties
-
-    try:
-        if _channel is None:
-            # 設定情報読み込み
-            _mq_settings = RabbitMQ.settings()
-
-            # RabbitMQ接続
-            _channel, _connection = RabbitMQ.connect(_mq_settings)
-
-            # キューに接続
-            _channel.queue_declare(queue=_mq_settings['queuename'], durable=True)
 
-            _properties = pika.BasicProperties(
-                content_type='application/json',
-                content_encoding='utf-8',
-                delivery_mode=2)
-
-    except Exception as e:
-        logger.system_log('LOSM13024', traceback.format_exc())
+    RabbitMQPublisher.publish(json_list)
 
 
 class SigToken(object):
@@ -454,6 +438,6 @@ class SigToken(object):
 @receiver(sig_reload_token, sender=SigToken)
 def _reload_evetoken(sender, *args, **kwargs):
 
-    cls_evtoken.load_data()
+    cls_evtoken.notify_change()
 
 
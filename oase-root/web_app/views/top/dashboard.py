@@ -640,6 +640,12 @@ class WidgetData(object):
             param_list.append(defs.PRODUCTION)
 
             # SQL文を作成
+            # 保存期間を過ぎたリクエストはアーカイブへ移動されるため、アーカイブも合わせて集計する
+            events_request_union = (
+                "SELECT status, event_to_time, rule_type_id, request_type_id FROM OASE_T_EVENTS_REQUEST "
+                "UNION ALL "
+                "SELECT status, event_to_time, rule_type_id, request_type_id FROM OASE_T_EVENTS_REQUEST_ARCHIVE"
+            )
             query = (
                 "SELECT t1.yyyymm, IFNULL(known.cnt, 0) cnt, IFNULL(unknown.cnt, 0) uncnt "
                 "FROM ("
@@ -658,7 +664,7 @@ class WidgetData(object):
                 ") t1 "
                 "LEFT OUTER JOIN ("
                 "  SELECT DATE_FORMAT(event_to_time + INTERVAL %s HOUR, '%%Y-%%m') yyyymm, COUNT(*) cnt "
-                "  FROM OASE_T_EVENTS_REQUEST "
+                "  FROM (" + events_request_union + ") er "
                 "  WHERE status in (%s, %s) "
                 "  AND event_to_time>=%s AND event_to_time<%s "
                 "  AND rule_type_id in (" + ("%s," * len(rule_ids)).strip(',') + ") "
@@ -668,7 +674,7 @@ class WidgetData(object):
                 "ON t1.yyyymm=known.yyyymm "
                 "LEFT OUTER JOIN ("
                 "  SELECT DATE_FORMAT(event_to_time + INTERVAL %s HOUR, '%%Y-%%m') yyyymm, COUNT(*) cnt "
-                "  FROM OASE_T_EVENTS_REQUEST "
+                "  FROM (" + events_request_union + ") er "
                 "  WHERE status in (%s, %s, %s) "
                 "  AND event_to_time>=%s AND event_to_time<%s "
                 "  AND rule_type_id in (" + ("%s," * len(rule_ids)).strip(',') + ") "
@@ -31,13 +31,13 @@ from django.urls import reverse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST
 from django.db import transaction
-from django.db.models.aggregates import Count
 from django.conf import settings
 
 from libs.commonlibs import define as defs
 from libs.commonlibs.oase_logger import OaseLogger
 
 from libs.webcommonlibs.common import Common, set_wild_iterate
+from libs.webcommonlibs.ip_address_list import IPAddressList
 
 from web_app.models.models import BlackListIPAddress
 from web_app.templatetags.common import get_message
@@ -60,16 +60,8 @@ def black_list(request):
     if not has_permission_user_auth(request):
         return HttpResponseRedirect(reverse('web_app:top:notpermitted'))
 
-    black_ipaddr_list = BlackListIPAddress.objects.all().values_list(
-        'ipaddr', flat=True).annotate(cnt=Count("*"))
-
-    black_list = []
-    for b_ip in black_ipaddr_list:
-        recent_record = list(BlackListIPAddress.objects.filter(
-            ipaddr=b_ip).order_by('black_list_id').reverse()[:1])[0]
-
-        if recent_record.release_timestamp == None:
-            black_list.append(recent_record)
+    # IPアドレス毎の最新レコードが有効なものを取得
+    black_list = list(IPAddressList.active_black_list().order_by('ipaddr'))
 
     disabled_flag = getattr(settings, 'DISABLE_WHITE_BLACK_LIST', False)
 
@@ -261,6 +253,9 @@ def modify(request):
                 blacklist = ip_address_list_reg[0]
                 blacklist.save(force_insert=True)
 
+        # 全プロセスのブラックリストを再読込
+        IPAddressList.notify_change()
+
     except BlackListIPAddress.DoesNotExist:
         error_flag = True
         logger.logic_log('LOSM19006', traceback.format_exc(), request=request)
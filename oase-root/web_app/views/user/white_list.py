@@ -37,6 +37,7 @@ from libs.commonlibs import define as defs
 from libs.commonlibs.oase_logger import OaseLogger
 
 from libs.webcommonlibs.common import Common, set_wild_iterate
+from libs.webcommonlibs.ip_address_list import IPAddressList
 
 from web_app.models.models import WhiteListIPAddress
 from web_app.templatetags.common import get_message
@@ -220,6 +221,9 @@ def modify(request):
             if len(ip_address_list_del) > 0:
                 WhiteListIPAddress.objects.filter(pk__in=ip_address_list_del).delete()
 
+        # 全プロセスのホワイトリストを再読込
+        IPAddressList.notify_change()
+
     except WhiteListIPAddress.DoesNotExist:
         error_flag = True
         logger.logic_log('LOSM20007',traceback.format_exc() ,request=request)
@@ -101,11 +101,15 @@ OASE_ACTION_SERVICE=${OASE_BACKYARDS_DIR}/action_driver/oase-action.service
 OASE_AGENT_SERVICE=${OASE_BACKYARDS_DIR}/agent_driver/oase-agent.service
 OASE_APPLY_SERVICE=${OASE_BACKYARDS_DIR}/apply_driver/oase-apply.service
 OASE_ACCEPT_SERVICE=${OASE_BACKYARDS_DIR}/accept_driver/oase-accept.service
+OASE_ARCHIVE_SERVICE=${OASE_BACKYARDS_DIR}/common/oase-archive-history.service
+OASE_ARCHIVE_TIMER=${OASE_BACKYARDS_DIR}/common/oase-archive-history.timer
 SERVICE_FILE_DIR=/usr/lib/systemd/system
 SERVICE_ACTION_SERVICE=${SERVICE_FILE_DIR}/oase-action.service
 SERVICE_AGENT_SERVICE=${SERVICE_FILE_DIR}/oase-agent.service
 SERVICE_APPLY_SERVICE=${SERVICE_FILE_DIR}/oase-apply.service
 SERVICE_ACCEPT_SERVICE=${SERVICE_FILE_DIR}/oase-accept.service
+SERVICE_ARCHIVE_SERVICE=${SERVICE_FILE_DIR}/oase-archive-history.service
+SERVICE_ARCHIVE_TIMER=${SERVICE_FILE_DIR}/oase-archive-history.timer
 
 
 # OASE環境設定ファイルのリンク作成
@@ -204,6 +208,29 @@ if [ ! -e "$SERVICE_ACCEPT_SERVICE" ]; then
     exit 1
 fi
 
+
+# oase-archive-history.service、oase-archive-history.timerの登録
+for _unit_file in "$OASE_ARCHIVE_SERVICE" "$OASE_ARCHIVE_TIMER"; do
+    if [ ! -e "$_unit_file" ]; then
+        log "ERROR : $_unit_file not exists."
+        log "INFO : Abort installation."
+        exit 1
+    fi
+done
+
+log "INFO : set service file $SERVICE_ARCHIVE_SERVICE."
+cp -fp "$OASE_ARCHIVE_SERVICE" "$SERVICE_ARCHIVE_SERVICE"
+log "INFO : set service file $SERVICE_ARCHIVE_TIMER."
+cp -fp "$OASE_ARCHIVE_TIMER" "$SERVICE_ARCHIVE_TIMER"
+
+for _unit_file in "$SERVICE_ARCHIVE_SERVICE" "$SERVICE_ARCHIVE_TIMER"; do
+    if [ ! -e "$_unit_file" ]; then
+        log "ERROR : $_unit_file not exists."
+        log "INFO : Abort installation."
+        exit 1
+    fi
+done
+
 # start services
 log "INFO : Start OASE service"
 run_systemctl httpd.service
@@ -211,6 +238,7 @@ run_systemctl oase-action.service
 run_systemctl oase-agent.service
 run_systemctl oase-apply.service
 run_systemctl oase-accept.service
+run_systemctl oase-archive-history.timer
 
 # jboss-eap-rhel service start
 if [ "${rules_engine}" == "drools" ]; then
@@ -281,6 +281,23 @@ function delete_oase_service() {
         _error_flag=true
     fi
 
+    # アーカイブの定期実行(timer)を停止して削除
+    disable_service 'oase-archive-history.timer'
+    if [ $? -gt 0 ]; then
+        _error_flag=true
+    fi
+
+    /bin/rm -f /usr/lib/systemd/system/oase-archive-history.timer
+    if [ $? -gt 0 ]; then
+        log "ERROR : Failed to remove oase-archive-history.timer"
+        _error_flag=true
+    fi
+
+    delete_service '/usr/lib/systemd/system' 'oase-archive-history'
+    if [ $? -gt 0 ]; then
+        _error_flag=true
+    fi
+
     if ${_error_flag}; then
         log "ERROR : Failed to delete oase service"
         return 1